@@ -1,10 +1,20 @@
 # %%
-import json
 import os
+import time
 
-from openai import AzureOpenAI
 from pydantic import BaseModel, Field
 
+import kb_vectors
+from answer_cache import create_answer_cache_from_env
+from direct_answer import create_direct_answer_from_env
+from kb_ingest import ShardedIndex
+from knowledge_base import KnowledgeBase
+from llm_clients import create_client
+from response_cache import normalize_text
+from token_budget import fit_records
+from tool_cache import cached_tool, tool_cache_stats
+from tool_registry import ToolRegistry
+
 """
 docs: https://platform.openai.com/docs/guides/function-calling
 """
@@ -16,31 +26,64 @@ api_key = os.getenv("AZURE_API_KEY")
 
 
 # Initialize Azure OpenAI client with key-based authentication
-client = AzureOpenAI(
-    azure_endpoint=endpoint,
-    api_key=api_key,
-    api_version="2025-01-01-preview",
-)
+client = create_client(endpoint=endpoint, api_key=api_key)
 
 
 # --------------------------------------------------------------
 # Define the knowledge base retrieval tool
 # --------------------------------------------------------------
 
+# Build the indexes once; each tool call only scores the query's terms.
+# KB_SEARCH=vector or hybrid adds an embedding index (kb.vectors.npy),
+# memory-mapped if it is up to date and only re-embedded for changed records.
+kb_search_mode = os.getenv("KB_SEARCH", "bm25").lower()
+kb_embedder = kb_vectors.create_embedder_from_env(client) if kb_search_mode != "bm25" else None
+kb_top_k = int(os.getenv("KB_TOP_K", "3"))
+# Tool results go back into the prompt; cap what search_kb may add to it
+kb_token_budget = int(os.getenv("KB_TOOL_TOKEN_BUDGET", "600")) or None
+
+if os.getenv("KB_INDEX_DIR"):
+    # Very large KBs: sharded on-disk index built by `python kb_ingest.py build`
+    kb = ShardedIndex(os.getenv("KB_INDEX_DIR"), mode=kb_search_mode, embedder=kb_embedder)
+else:
+    kb = KnowledgeBase(
+        "kb.json",
+        mode=kb_search_mode,
+        embedder=kb_embedder,
+        vector_dtype=os.getenv("KB_VECTOR_DTYPE", "float32"),
+    )
+    # Edits to kb.json are applied as deltas in the background
+    kb_watch_seconds = float(os.getenv("KB_WATCH_SECONDS", "2"))
+    if kb_watch_seconds > 0:
+        kb.watch(kb_watch_seconds)
 
 
+# Tools the model may call; all calls of one turn run concurrently
+tools = ToolRegistry(max_workers=int(os.getenv("TOOL_MAX_WORKERS", "8")))
 
+
+# Repeat questions skip the search; keys include the KB version, so edits to
+# kb.json are never answered from a stale result (TOOL_CACHE, TOOL_CACHE_TTL_SEARCH_KB)
+@tools.tool()
+@cached_tool(
+    ttl=600,
+    version=lambda: (kb.version, kb_search_mode, kb_top_k, kb_token_budget),
+    normalize=lambda args: {"question": normalize_text(args["question"])},
+)
 def search_kb(question: str):
     """
-    Load the whole knowledge base from the JSON file.
-    (This is a mock function for demonstration purposes, we don't search)
+    Search the knowledge base and return the best matching records
+    (id, question, answer, score), best first, trimmed to the token budget.
     """
-    with open("kb.json", "r") as f:
-        return json.load(f)
+    records, report = fit_records(kb.search(question, k=kb_top_k), question, kb_token_budget)
+    if report["tokens_saved"]:
+        print(f"✂️ search_kb result: {report['tokens_before']} -> {report['tokens_after']} tokens "
+              f"(saved {report['tokens_saved']}, {report['snippeted']} snippeted, {report['dropped']} dropped)")
+    return {"records": records}
 
 
 # --------------------------------------------------------------
-# Step 1: Call model with search_kb tool defined
+# Tool schema and prompt for the model
 # --------------------------------------------------------------
 # %%
 
@@ -65,87 +108,106 @@ kbtools = [
 # %%
 system_prompt = "You are a helpful assistant that answers questions from the knowledge base about our e-commerce store."
 
-messages = [
-    {"role": "system", "content": system_prompt},
-    {"role": "user", "content": "What is the return policy?"},
-]
 
-# %%
-completion = client.chat.completions.create(
-    model=deployment,
-    messages=messages, # type: ignore
-    tools=kbtools, # type: ignore
-)
+class KBResponse(BaseModel):
+    answer: str = Field(description="The answer to the user's question.")
+    source: int = Field(description="The record id of the answer.")
 
 
+def ask_llm(question):
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": question},
+    ]
 
-print("First time, LLM didn't call tool:", completion.choices[0].message.content)
-print("Print model dump information:", completion.model_dump())
+    # --------------------------------------------------------------
+    # Step 1: Call model with search_kb tool defined
+    # --------------------------------------------------------------
+    completion = client.chat.completions.create(
+        model=deployment,
+        messages=messages, # type: ignore
+        tools=kbtools, # type: ignore
+    )
 
-# %%
+    print("First time, LLM didn't call tool:", completion.choices[0].message.content)
+    print("Print model dump information:", completion.model_dump())
+
+    # --------------------------------------------------------------
+    # Step 2: Model decides to call function(s)
+    # --------------------------------------------------------------
+
+    # --------------------------------------------------------------
+    # Step 3: Execute the requested tools (search_kb), concurrently
+    # --------------------------------------------------------------
+
+    # 先追加一次助手消息（包含全部 tool_calls），再并发执行所有工具调用，
+    # 工具结果按 tool_calls 的顺序追加到 messages 列表
+    message = completion.choices[0].message
+    messages.append(message) # type: ignore
+    tool_messages = tools.run_tool_calls(message.tool_calls)
+    messages.extend(tool_messages) # type: ignore
+
+    for tool_message in tool_messages:
+        print("print information read from KB", tool_message["content"])
+
+    # --------------------------------------------------------------
+    # Step 4: Supply result and call model again
+    # --------------------------------------------------------------
+    completion_2 = client.beta.chat.completions.parse(
+        model=deployment,
+        messages=messages, # type: ignore
+        tools=kbtools, # type: ignore
+        response_format=KBResponse,
+    )
 
-# --------------------------------------------------------------
-# Step 2: Model decides to call function(s)
-# --------------------------------------------------------------
+    # --------------------------------------------------------------
+    # Step 5: Check model response
+    # --------------------------------------------------------------
+    return completion_2.choices[0].message.parsed
 
-# %%
 
 # --------------------------------------------------------------
-# Step 3: Execute search_kb function
+# Step 0: Answer straight from the record when the question matches it
+# almost verbatim, skipping both LLM calls. Off unless
+# KB_DIRECT_ANSWER_THRESHOLD is set (e.g. 0.95), so Steps 1-5 run by default
 # --------------------------------------------------------------
+# %%
 
+kb_direct = create_direct_answer_from_env(kb)
+# Final answers of earlier questions, dropped when their source record changes (KB_ANSWER_CACHE)
+kb_answers = create_answer_cache_from_env(kb, scope=(deployment, system_prompt))
 
-def call_function(name, args):
-    if name == "search_kb":
-        return search_kb(**args)
-
-
-# 遍历 completion.choices[0].message.tool_calls 中的每个工具调用
-for tool_call in completion.choices[0].message.tool_calls: # type: ignore
-    # 获取工具调用的函数名
-    name = tool_call.function.name
-    # 解析工具调用的参数（JSON字符串转为Python对象）
-    args = json.loads(tool_call.function.arguments)
-    # 将当前消息追加到 messages 列表
-    messages.append(completion.choices[0].message) # type: ignore
-
-    # 调用对应的函数，并获取结果
-    result = call_function(name, args)
-    # 将工具调用的结果以特定格式追加到 messages 列表
-    messages.append(
-        {
-            "role": "tool",  # 标记为工具角色
-            "tool_call_id": tool_call.id,  # 工具调用的唯一标识
-            "content": json.dumps(result)  # 结果序列化为 JSON 字符串
-        }
-    )
-
-print("print information read from KB", json.dumps(result)) # type: ignore
-# --------------------------------------------------------------
-# Step 4: Supply result and call model again
-# --------------------------------------------------------------
-# %%
 
-class KBResponse(BaseModel):
-    answer: str = Field(description="The answer to the user's question.")
-    source: int = Field(description="The record id of the answer.")
+def answer_question(question):
+    if kb_answers is not None:
+        start = time.perf_counter()
+        cached = kb_answers.get(question)
+        if cached is not None:
+            print(f"⚡ Cached answer from record {cached['source']} in {(time.perf_counter() - start) * 1000:.1f} ms")
+            return KBResponse(**cached)
 
+    direct = kb_direct.match(question) if kb_direct is not None else None
+    if direct is not None:
+        hit, similarity = direct
+        print(f"⚡ Direct answer from record {hit['id']} (similarity {similarity:.2f}), no LLM call")
+        return KBResponse(answer=hit["answer"], source=hit["id"])
 
-completion_2 = client.beta.chat.completions.parse(
-    model=deployment,
-    messages=messages, # type: ignore
-    tools=kbtools, # type: ignore
-    response_format=KBResponse,
-)
+    response = ask_llm(question)
+    if kb_answers is not None and response is not None:
+        kb_answers.set(question, response.answer, response.source)
+    return response
 
-# --------------------------------------------------------------
-# Step 5: Check model response
-# --------------------------------------------------------------
 
-final_response = completion_2.choices[0].message.parsed
+final_response = answer_question("What is the return policy?")
 final_response.answer # type: ignore
 final_response.source # type: ignore
 print("final answer:", final_response)
+if kb_direct is not None:
+    print("direct answer stats:", kb_direct.stats())
+if kb_answers is not None:
+    print("answer cache stats:", kb_answers.stats())
+print("tool stats:", tools.stats())
+print("tool cache stats:", tool_cache_stats())
 # %%
 # --------------------------------------------------------------
 # Question that doesn't trigger the tool
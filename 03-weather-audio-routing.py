@@ -1,21 +1,14 @@
-from openai import AzureOpenAI
 import json
 from openai.types.chat import ChatCompletionUserMessageParam, ChatCompletionSystemMessageParam
 import os
-import base64
 import requests
-import azure.cognitiveservices.speech as speechsdk
-import pygame
-import io
-import tempfile
 import re
-import time
 from dotenv import load_dotenv
-import re
-import time
-from pydub import AudioSegment
-from pydub.playback import play
-import pyglet
+
+from gazetteer import create_gazetteer_from_env
+from llm_clients import create_client
+from tts_pipeline import DEFAULT_VOICE, VOICES, create_tts_pipeline_from_env
+from weather_client import create_weather_client_from_env, create_weather_refresher_from_env
 
 # Load environment variables
 load_dotenv()
@@ -40,27 +33,25 @@ def send_reply(message: str, enable_speech=True):
     
     return message
 
-def get_weather(latitude, longitude):
+# Sentence-pipelined speech output, created on first use
+tts_pipeline = None
+
+# Pooled session, trimmed request, timeouts/retries and a TTL cache on rounded coordinates
+weather_client = create_weather_client_from_env()
+# Keeps the most requested locations warm and serves the last good result when the API is down
+weather_refresher = create_weather_refresher_from_env(weather_client)
+# Well-known cities are resolved offline; only unknown or ambiguous places go to the model
+gazetteer = create_gazetteer_from_env()
+
+
+def get_weather_many(locations):
     """
-    从Open-Meteo API获取天气数据
+    一次请求获取多个 (纬度, 经度) 的天气数据, 顺序与输入一致
+    相同(四舍五入后的)坐标在 WEATHER_CACHE_TTL 内直接返回缓存结果
+    请求失败时已缓存或有旧数据的地点照常返回, 其余为 None; 全部没有时返回 None
     """
     try:
-        response = requests.get(
-            f"https://api.open-meteo.com/v1/forecast"
-            f"?latitude={latitude}&longitude={longitude}"
-            f"&current=temperature_2m,wind_speed_10m,relative_humidity_2m,weather_code"
-            f"&hourly=temperature_2m,relative_humidity_2m,wind_speed_10m"
-        )
-        response.raise_for_status()
-        data = response.json()
-        
-        current = data['current']
-        return {
-            'temperature': current['temperature_2m'],
-            'wind_speed': current['wind_speed_10m'],
-            'humidity': current.get('relative_humidity_2m', 'N/A'),
-            'weather_code': current.get('weather_code', 0)
-        }
+        return weather_client.current_many(locations)
     except requests.RequestException as e:
         print(f"❌ Error fetching weather data: {e}")
         return None
@@ -79,10 +70,55 @@ def detect_language(text):
     chinese_ratio = chinese_chars / total_chars
     return "zh-CN" if chinese_ratio > 0.1 else "en-US"
 
+def weather_details(weather_data, chinese):
+    """
+    温度、湿度、风速的描述
+    """
+    if chinese:
+        details = f"温度 {weather_data['temperature']}°C"
+        if weather_data['humidity'] != 'N/A':
+            details += f"，湿度 {weather_data['humidity']}%"
+        return details + f"，风速 {weather_data['wind_speed']} km/h"
+    details = f"{weather_data['temperature']}°C"
+    if weather_data['humidity'] != 'N/A':
+        details += f", humidity {weather_data['humidity']}%"
+    return details + f", wind speed {weather_data['wind_speed']} km/h"
+
+def weather_report(reports, chinese):
+    """
+    把 [(地点, 天气数据)] 组合成一段回复, 与查询语言一致
+    多个地点时逐个列出, 并指出最暖和的地点
+    天气数据为 None (获取失败且没有旧数据) 的地点单独说明
+    """
+    available = [(location, weather_data) for location, weather_data in reports if weather_data is not None]
+    unavailable = [location for location, weather_data in reports if weather_data is None]
+    if chinese:
+        missing = f"暂时无法获取{'、'.join(unavailable)}的天气。" if unavailable else ""
+    else:
+        missing = f"Sorry, I couldn't get the weather for {', '.join(unavailable)}." if unavailable else ""
+
+    if len(available) == 1:
+        location, weather_data = available[0]
+        if chinese:
+            report = f"{location}的当前天气：{weather_details(weather_data, True)}。"
+        else:
+            report = f"Current weather in {location}: {weather_details(weather_data, False)}."
+        return report + ("\n" + missing if missing else "")
+
+    warmest = max(available, key=lambda item: item[1]['temperature'])[0]
+    if chinese:
+        lines = [f"{location}：{weather_details(weather_data, True)}；" for location, weather_data in available]
+        lines.append(f"其中{warmest}最暖和。")
+        return "当前天气：\n" + "\n".join(lines + ([missing] if missing else []))
+    lines = [f"{location}: {weather_details(weather_data, False)};" for location, weather_data in available]
+    lines.append(f"{warmest} is the warmest.")
+    return "Current weather:\n" + "\n".join(lines + ([missing] if missing else []))
+
 def text_to_speech(text, language=None):
     """
     将文本转换为语音并播放
     支持中英文语音合成，自动语言检测
+    逐句合成与播放: 播放第 N 句时合成第 N+1 句, 音频只在内存中传递
     
     Args:
         text (str): 要转换的文本
@@ -91,72 +127,27 @@ def text_to_speech(text, language=None):
     Returns:
         bool: 成功返回True，失败返回False
     """
-    # Azure Speech Service 配置
-    speech_key = os.getenv("AZURE_SPEECH_KEY")
-    speech_region = os.getenv("AZURE_SPEECH_REGION", "eastus2")
-    
-    if not speech_key:
-        print("❌ Azure Speech Service key not found. Please set AZURE_SPEECH_KEY environment variable.")
-        print("📝 You can get a key from: https://portal.azure.com -> Cognitive Services -> Speech")
-        print("💡 Copy .env.template to .env and add your Speech Service key")
-        return False
-    
-    # 自动检测语言或使用指定语言
-    if language is None:
-        language = detect_language(text)
-    
+    global tts_pipeline
     try:
-        # 根据语言选择语音
-        voice_map = {
-            "zh-CN": "zh-CN-XiaoxiaoNeural",  # 中文女声 (温柔)
-            "en-US": "en-US-JennyNeural",     # 英文女声 (友好)
-            "en-GB": "en-GB-SoniaNeural",     # 英式英语女声
-        }
-        
-        voice_name = voice_map.get(language, "en-US-JennyNeural")
-        
-        # 配置语音服务
-        speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=speech_region)
-        speech_config.speech_synthesis_voice_name = voice_name
-        speech_config.set_speech_synthesis_output_format(
-            speechsdk.SpeechSynthesisOutputFormat.Riff16Khz16BitMonoPcm
-        )
-        
-        # 创建临时文件存储音频
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-            temp_filename = temp_file.name
-            temp_file.close()
-        
-        # 配置音频输出到文件
-        audio_config = speechsdk.audio.AudioOutputConfig(filename=temp_filename)
-        synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=audio_config)
-        
+        if tts_pipeline is None:
+            tts_pipeline = create_tts_pipeline_from_env()
+        if tts_pipeline is None:
+            print("❌ Azure Speech Service key not found. Please set AZURE_SPEECH_KEY environment variable.")
+            print("📝 You can get a key from: https://portal.azure.com -> Cognitive Services -> Speech")
+            print("💡 Copy .env.template to .env and add your Speech Service key, or set TTS_SYNTHESIZER=stub")
+            return False
+
+        # 自动检测语言或使用指定语言
+        if language is None:
+            language = detect_language(text)
+
         print(f"🔊 Converting text to speech: {text[:50]}{'...' if len(text) > 50 else ''}")
-        print(f"🎵 Language: {language}, Voice: {voice_name}")
-        
-        # 合成语音
-        try:
-            result = synthesizer.speak_text_async(text).get()
-
-            if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted: # type: ignore
-                print("✅ Speech synthesis completed successfully!")
-                audio_stream = speechsdk.AudioDataStream(result)
-                audio_stream.save_to_wav_file("C:\\Users\\OneDrive - Microsoft\\Technical\\Copilot\\file.wav")
-
-                p = pyglet.media.Player()
-                source = pyglet.media.load("C:\\Users\\OneDrive - Microsoft\\Technical\\Copilot\\file.wav")
-                p.queue(source)
-                p.play()
-                pyglet.app.run()
-            else:
-                print("Speech synthesis failed.")
-            return True
-        finally:
-            # 清理临时文件
-            try:
-                os.unlink(temp_filename)
-            except OSError:
-                pass
+        print(f"🎵 Language: {language}, Voice: {VOICES.get(language, DEFAULT_VOICE)}")
+
+        timings = tts_pipeline.speak(text, language)
+        print(f"✅ Spoke {timings['chunks']} sentence(s): first audio after {timings['first_audio_ms']} ms, "
+              f"total {timings['total_ms']} ms")
+        return True
 
     except Exception as e:
         print(f"❌ Error in text-to-speech: {e}")
@@ -170,11 +161,7 @@ deployment = os.getenv("DEPLOYMENT_NAME", "gpt-4.1")
 api_key = os.getenv("AZURE_API_KEY")
 
 # Initialize Azure OpenAI client with key-based authentication
-client = AzureOpenAI(
-    azure_endpoint=endpoint,
-    api_key=api_key,
-    api_version="2025-01-01-preview",
-)
+client = create_client(endpoint=endpoint, api_key=api_key)
 
 # --------------------------------------------------------------
 # Structured output example using function calling
@@ -201,23 +188,35 @@ def main():
     function_name = "get_weather"
 
     # 定义用于获取指定经纬度天气的函数
+    # 查询多个地点时, 模型可以一次返回多个 tool call, 也可以在一个调用里列出多个地点
     tools = [{
         "type": "function",
         "function": {
             "name": "get_weather",
-            "description": "获取所提供坐标的当前天气信息，包括温度、湿度、风速等。",
+            "description": "获取所提供坐标的当前天气信息，包括温度、湿度、风速等。查询涉及多个地点时，请列出全部地点。",
             "parameters": {
                 "type": "object",
                 "properties": {
-                    "latitude": {"type": "number", "description": "纬度"},
-                    "longitude": {"type": "number", "description": "经度"},
-                    "location": {
-                        "type": "string",
-                        "description": "地点名称，例如城市或地区",
-                        "example": "Shanghai"
+                    "locations": {
+                        "type": "array",
+                        "description": "要查询的地点列表",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "latitude": {"type": "number", "description": "纬度"},
+                                "longitude": {"type": "number", "description": "经度"},
+                                "location": {
+                                    "type": "string",
+                                    "description": "地点名称，例如城市或地区，与用户查询的语言一致",
+                                    "example": "Shanghai"
+                                }
+                            },
+                            "required": ["latitude", "longitude", "location"],
+                            "additionalProperties": False
+                        }
                     }
                 },
-                "required": ["latitude", "longitude", "location"],
+                "required": ["locations"],
                 "additionalProperties": False
             }
         }
@@ -235,53 +234,66 @@ def main():
     ]
 
     try:
-        print("🤖 Calling OpenAI API...")
-        response = client.chat.completions.create(
-            model=deployment,
-            messages=messages,
-            tools=tools, # type: ignore
-            tool_choice={"type": "function", "function": {"name": function_name}},
-        )
+        resolved = gazetteer.resolve_all(query) if gazetteer is not None else None
+        if resolved is not None:
+            # 查询提到的每个地点都在地名表中且没有歧义, 直接使用其坐标, 无需调用模型
+            # 只要有一个地点不在表中(或带限定词, 如 "Paris, Texas"), resolve_all 返回 None
+            for match in resolved:
+                print(f"📚 Gazetteer: {match.text} -> {match.place.name}, {match.place.country} (no LLM call)")
+            locations = [
+                {"latitude": m.place.latitude, "longitude": m.place.longitude, "location": m.label}
+                for m in resolved
+            ]
+        else:
+            print("🤖 Calling OpenAI API...")
+            response = client.chat.completions.create(
+                model=deployment,
+                messages=messages,
+                tools=tools, # type: ignore
+                tool_choice="required",
+                parallel_tool_calls=True,
+            )
 
-        if not response.choices[0].message.tool_calls:
-            print("❌ No tool calls received from API")
-            return
+            tool_calls = response.choices[0].message.tool_calls
+            if not tool_calls:
+                print("❌ No tool calls received from API")
+                return
+
+            # 汇总所有 tool call 中的地点
+            locations = []
+            for tool_call in tool_calls:
+                if tool_call.function.name == function_name:
+                    locations.extend(json.loads(tool_call.function.arguments)["locations"])
+            if not locations:
+                print("❌ No locations received from API")
+                return
+
+        for location in locations:
+            print(f"📍 Location: {location['location']} ({location['latitude']}, {location['longitude']})")
+
+        # 所有地点的天气一次请求获取
+        print(f"🌤️  Fetching weather data for {len(locations)} location(s)...")
+        weather_data = get_weather_many([(l["latitude"], l["longitude"]) for l in locations])
 
-        tool_call = response.choices[0].message.tool_calls[0]
-        function_args = json.loads(tool_call.function.arguments)
-        
-        print(f"📍 Location: {function_args['location']}")
-        print(f"🌐 Coordinates: {function_args['latitude']}, {function_args['longitude']}")
-        
-        # 获取天气数据
-        print("🌤️  Fetching weather data...")
-        weather_data = get_weather(function_args["latitude"], function_args["longitude"])
-        
         if weather_data is None:
-            error_msg = f"Sorry, I couldn't get the weather data for {function_args['location']}. Please try again later."
+            names = ", ".join(l["location"] for l in locations)
+            error_msg = f"Sorry, I couldn't get the weather data for {names}. Please try again later."
             send_reply(error_msg, enable_speech)
             return
-        
-        location = function_args['location']
-        
-        # 构建详细的天气报告
-        if "中" in query or detect_language(query) == "zh-CN":
-            # 中文回复
-            weather_report = f"{location}的当前天气：温度 {weather_data['temperature']}°C"
-            if weather_data['humidity'] != 'N/A':
-                weather_report += f"，湿度 {weather_data['humidity']}%"
-            weather_report += f"，风速 {weather_data['wind_speed']} km/h。"
-        else:
-            # 英文回复
-            weather_report = f"Current weather in {location}: {weather_data['temperature']}°C"
-            if weather_data['humidity'] != 'N/A':
-                weather_report += f", humidity {weather_data['humidity']}%"
-            weather_report += f", wind speed {weather_data['wind_speed']} km/h."
-        
+
+        # 构建天气报告, 多个地点时合并为一段
+        chinese = "中" in query or detect_language(query) == "zh-CN"
+        weather_report_text = weather_report(
+            [(location["location"], data) for location, data in zip(locations, weather_data)], chinese
+        )
+
         # 发送回复并播放语音
-        send_reply(weather_report, enable_speech)
+        send_reply(weather_report_text, enable_speech)
         
         print("\n✅ Weather query completed successfully!")
+        print(f"📊 Weather client: {weather_client.stats()}")
+        if weather_refresher is not None:
+            print(f"📊 Weather refresher: {weather_refresher.stats()}")
         
     except json.JSONDecodeError as e:
         error_msg = f"Error parsing function arguments: {e}"
@@ -1,9 +1,10 @@
 from typing import List, Dict
 from pydantic import BaseModel, Field
-from openai import AzureOpenAI
 import os
 import logging
 
+from llm_clients import create_client
+
 endpoint = os.getenv("ENDPOINT_URL", "https://ai-<endpoint>.openai.azure.com/")
 deployment = os.getenv("DEPLOYMENT_NAME", "gpt-4.1")
 api_key = os.getenv("AZURE_API_KEY")
@@ -17,11 +18,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-client = AzureOpenAI(
-    azure_endpoint=endpoint,
-    api_key=api_key,
-    api_version="2025-01-01-preview",
-)
+client = create_client(endpoint=endpoint, api_key=api_key)
 
 # --------------------------------------------------------------
 # Step 1: Define the data models
@@ -0,0 +1,99 @@
+"""
+Question-level cache of final KB answers.
+
+A repeat question otherwise goes through the whole tool-calling path again:
+the first completion, search_kb and the structured-output completion. The
+answer cache stores the final {answer, source} under the normalised question
+and returns it in milliseconds.
+
+Every entry records the content hash of the record it cites (`source`). On
+a hit that hash is compared with the record's current one, so editing or
+deleting the record invalidates exactly the answers built from it and
+leaves the rest of the cache alone. Indexes without per-record hashes
+(ShardedIndex) are compared by their overall version instead.
+"""
+import threading
+
+from response_cache import create_cache_from_env, make_key, normalize_text
+
+
+class AnswerCache:
+    """
+    Cache of answers for `kb`. `scope` is anything else an answer depends on
+    (deployment, system prompt) and is part of the key.
+    """
+
+    def __init__(self, kb, cache, scope=None):
+        self.kb = kb
+        self.cache = cache
+        self.scope = scope
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "invalidated": 0, "stored": 0, "not_stored": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def key(self, question):
+        return make_key("kb-answer", self.scope, normalize_text(question))
+
+    def _stamp(self, source):
+        """
+        What must still match for an answer citing `source` to be valid
+        """
+        record_hash = getattr(self.kb, "record_hash", None)
+        if record_hash is not None:
+            return record_hash(source)
+        return self.kb.version
+
+    def get(self, question):
+        """
+        {"answer", "source"} for a question answered before, if the cited
+        record has not changed since; otherwise None
+        """
+        key = self.key(question)
+        entry = self.cache.get(key)
+        if entry is None:
+            self._count("misses")
+            return None
+        if entry["stamp"] is None or entry["stamp"] != self._stamp(entry["source"]):
+            self.cache.delete(key)
+            self._count("invalidated")
+            self._count("misses")
+            return None
+        self._count("hits")
+        return {"answer": entry["answer"], "source": entry["source"]}
+
+    def set(self, question, answer, source):
+        """
+        Store an answer; skipped when `source` is not a record in the KB
+        """
+        stamp = self._stamp(source)
+        if stamp is None:
+            self._count("not_stored")
+            return False
+        self.cache.set(self.key(question), {"answer": answer, "source": source, "stamp": stamp})
+        self._count("stored")
+        return True
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_ratio": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+                "cache": self.cache.stats(),
+            }
+
+
+def create_answer_cache_from_env(kb, scope=None):
+    """
+    AnswerCache over KB_ANSWER_CACHE (memory by default, sqlite or off),
+    KB_ANSWER_CACHE_TTL (default 3600), _MAX_ENTRIES, _MAX_BYTES and _PATH.
+    None when it is off.
+    """
+    cache = create_cache_from_env("KB_ANSWER_CACHE", "kb_answer_cache.sqlite3", default_backend="memory",
+                                  default_ttl=3600.0)
+    if cache is None:
+        return None
+    return AnswerCache(kb, cache, scope)
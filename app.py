@@ -1,114 +1,122 @@
-from flask import Flask, render_template, request, jsonify
-from openai import AzureOpenAI
-import json
-from openai.types.chat import ChatCompletionUserMessageParam, ChatCompletionSystemMessageParam, ChatCompletionToolParam
-import os
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+import os
+
+from customer_care import (
+    BATCH_CONCURRENCY,
+    NDJSON_MIMETYPE,
+    SSE_HEADERS,
+    SSE_MIMETYPE,
+    ClassificationStream,
+    build_batch_request,
+    build_request,
+    cache_key,
+    error_result,
+    final_event,
+    log_classification,
+    ndjson_line,
+    parse_batch_response,
+    parse_response,
+    replay_events,
+    validate_batch_payload,
+    validate_classify_payload,
+    wants_ndjson,
+)
+from fast_classifier import create_fast_path_from_env
+from llm_clients import azure_settings, backend_stats, create_client, governor_stats, hedge_stats
+from micro_batch import MicroBatcher
+from response_cache import create_cache_from_env
+from singleflight import SingleFlight
 
 app = Flask(__name__)
 
 # Initialize Azure OpenAI client
-endpoint = os.getenv("ENDPOINT_URL", "https://ai-<endpoint>.openai.azure.com/")
-deployment = os.getenv("DEPLOYMENT_NAME", "gpt-4")
-api_key = os.getenv("AZURE_API_KEY")
+settings = azure_settings()
+endpoint = settings["endpoint"]
+deployment = settings["deployment"]
+api_key = settings["api_key"]
 
 if not api_key:
     print("Warning: AZURE_API_KEY environment variable not set!")
     print("Please set your Azure OpenAI API key in the environment variables.")
 
-client = AzureOpenAI(
-    azure_endpoint=endpoint,
-    api_key=api_key,
-    api_version="2025-01-01-preview",
-)
+client = create_client()
+
+# Optional response cache (CLASSIFY_CACHE=memory|sqlite), off by default
+cache = create_cache_from_env()
+
+# Optional local classifier that answers confident tickets without the LLM
+fast_path = create_fast_path_from_env()
+
+# Concurrent identical classifications share one upstream call
+inflight = SingleFlight() if os.getenv("CLASSIFY_COALESCE", "true").lower() == "true" else None
 
 def classify_and_respond(query, language="English"):
     """
     Classify user query and generate response using function calling
     """
-    function_name = "chat"
-    
-    # Adjust descriptions based on language
-    if language.lower() == "chinese":
-        content_description = "你给予客户的回复."
-        category_description = "工单的类型."
-        system_content = "You're a helpful customer care assistant that can classify incoming messages and create a response. Answer the questions in Chinese."
+    key = cache_key(query, language, deployment)
+    result = _answer_without_llm(key, query, language)
+    if result is not None:
+        return result
+
+    if inflight is None:
+        return _classify_and_store(key, query, language)
+    return inflight.do(key, lambda: _classify_and_store(key, query, language))
+
+def _answer_without_llm(key, query, language):
+    """
+    Cached or local fast-path answer, or None when the LLM is needed
+    """
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return {**cached, "cached": True}
+
+    if fast_path is not None:
+        return fast_path.classify(query, language)
+    return None
+
+def _classify_and_store(key, query, language):
+    if batcher is not None:
+        result = batcher.submit(query, language)
     else:
-        content_description = "Your reply that we send to the customer."
-        category_description = "Category of the ticket."
-        system_content = "You're a helpful customer care assistant that can classify incoming messages and create a response."
-    
-    tools = [
-        ChatCompletionToolParam(
-            type="function",
-            function={
-                "name": function_name,
-                "description": "Function to respond to a customer query.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "content": {
-                            "type": "string",
-                            "description": content_description,
-                        },
-                        "category": {
-                            "type": "string",
-                            "enum": ["advisory", "break-fix", "billing"],
-                            "description": category_description,
-                        },
-                    },
-                    "required": ["content", "category"],
-                },
-            },
-        )
-    ]
-
-    messages = [
-        ChatCompletionSystemMessageParam(
-            role="system",
-            content=system_content
-        ),
-        ChatCompletionUserMessageParam(
-            role="user",
-            content=query
-        ),
-    ]
+        result = _classify_uncached(query, language)
+    return _store(key, query, language, result)
+
+def _store(key, query, language, result):
+    if result["success"]:
+        log_classification(query, language, result)
+        if cache is not None:
+            cache.set(key, result)
+    return result
 
+def _classify_uncached(query, language):
     try:
         response = client.chat.completions.create(
             model=deployment,
-            messages=messages,
-            tools=tools,
-            tool_choice={"type": "function", "function": {"name": function_name}},
+            **build_request(query, language),
         )
+        return parse_response(response)
 
-        if response.choices[0].message.tool_calls:
-            tool_call = response.choices[0].message.tool_calls[0]
-            function_args = json.loads(tool_call.function.arguments)
-            
-            return {
-                "success": True,
-                "content": function_args["content"],
-                "category": function_args["category"],
-                "raw_response": tool_call.function.arguments,
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-        else:
-            return {
-                "success": False,
-                "error": "No tool calls found in response"
-            }
-            
-    except json.JSONDecodeError as e:
-        return {
-            "success": False,
-            "error": f"JSON decode error: {e}"
-        }
     except Exception as e:
-        return {
-            "success": False,
-            "error": f"Error: {e}"
-        }
+        return error_result(f"Error: {e}")
+
+def _classify_batch_uncached(queries, language):
+    response = client.chat.completions.create(
+        model=deployment,
+        **build_batch_request(queries, language),
+    )
+    return parse_batch_response(response, len(queries))
+
+# Optional micro-batching: tickets arriving together share one completion
+batcher = MicroBatcher(
+    _classify_batch_uncached,
+    _classify_uncached,
+    max_items=int(os.getenv("CLASSIFY_MICROBATCH_MAX_ITEMS", "8")),
+    max_wait_ms=float(os.getenv("CLASSIFY_MICROBATCH_WAIT_MS", "20")),
+) if os.getenv("CLASSIFY_MICROBATCH", "false").lower() == "true" else None
 
 @app.route('/')
 def index():
@@ -118,21 +126,112 @@ def index():
 def classify():
     data = request.get_json()
     
-    if not data or 'query' not in data:
-        return jsonify({"error": "No query provided"}), 400
-    
-    query = data['query']
-    language = data.get('language', 'English')
-    
-    if not query.strip():
-        return jsonify({"error": "Query cannot be empty"}), 400
+    query, language, error = validate_classify_payload(data)
+    if error:
+        return jsonify({"error": error}), 400
     
     result = classify_and_respond(query, language)
     return jsonify(result)
 
+def stream_classification(query, language):
+    """
+    Yield SSE events: category as soon as it is decoded, then content deltas
+    """
+    key = cache_key(query, language, deployment)
+    result = _answer_without_llm(key, query, language)
+    if result is not None:
+        yield from replay_events(result)
+        return
+
+    stream = ClassificationStream()
+    try:
+        response = client.chat.completions.create(
+            model=deployment,
+            stream=True,
+            **build_request(query, language),
+        )
+        for chunk in response:
+            yield from stream.feed(chunk)
+        result = stream.finish()
+
+    except Exception as e:
+        result = error_result(f"Error: {e}")
+
+    yield final_event(_store(key, query, language, result))
+
+@app.route('/api/classify/stream', methods=['POST'])
+def classify_stream():
+    data = request.get_json()
+
+    query, language, error = validate_classify_payload(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    return Response(
+        stream_with_context(stream_classification(query, language)),
+        mimetype=SSE_MIMETYPE,
+        headers=SSE_HEADERS,
+    )
+
+def classify_item(item):
+    """
+    Classify one batch item, turning validation problems and unexpected
+    failures into a per-item error
+    """
+    query, language, error = validate_classify_payload(item)
+    if error:
+        return error_result(error)
+    try:
+        return classify_and_respond(query, language)
+    except Exception as e:
+        return error_result(f"Error: {e}")
+
+@app.route('/api/classify/batch', methods=['POST'])
+def classify_batch():
+    data = request.get_json()
+
+    items, stream, error = validate_batch_payload(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    workers = min(BATCH_CONCURRENCY, len(items))
+
+    if wants_ndjson(stream, request.headers.get('Accept')):
+        def generate():
+            # Lines are emitted in completion order; each carries its input index
+            pool = ThreadPoolExecutor(max_workers=workers)
+            try:
+                futures = {pool.submit(classify_item, item): i for i, item in enumerate(items)}
+                for future in as_completed(futures):
+                    yield ndjson_line(futures[future], future.result())
+            finally:
+                # Drop queued items if the client disconnects mid-stream
+                pool.shutdown(wait=False, cancel_futures=True)
+
+        return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(classify_item, items))
+    return jsonify({"results": results, "count": len(results)})
+
 @app.route('/health')
 def health():
-    return jsonify({"status": "healthy", "timestamp": datetime.now().isoformat()})
+    status = {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    if cache is not None:
+        status["cache"] = cache.stats()
+    if inflight is not None:
+        status["coalescing"] = inflight.stats()
+    if fast_path is not None:
+        status["fast_path"] = fast_path.stats()
+    if governor_stats() is not None:
+        status["governor"] = governor_stats()
+    if batcher is not None:
+        status["micro_batching"] = batcher.stats()
+    if backend_stats(client) is not None:
+        status["backends"] = backend_stats(client)
+    if hedge_stats() is not None:
+        status["hedging"] = hedge_stats()
+    return jsonify(status)
 
 if __name__ == '__main__':
     print("🚀 Starting AI Customer Care Assistant Web Interface...")
@@ -0,0 +1,309 @@
+"""
+Async (ASGI) serving mode for the customer care assistant.
+
+Same routes and JSON contract as app.py, but classifications run on an
+AsyncAzureOpenAI client, so a single process can keep hundreds of requests
+in flight instead of one per worker thread.
+
+Run with:
+    uvicorn app_asgi:app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+from starlette.templating import Jinja2Templates
+
+from customer_care import (
+    BATCH_CONCURRENCY,
+    NDJSON_MIMETYPE,
+    SSE_HEADERS,
+    SSE_MIMETYPE,
+    ClassificationStream,
+    build_batch_request,
+    build_request,
+    cache_key,
+    error_result,
+    final_event,
+    log_classification,
+    ndjson_line,
+    parse_batch_response,
+    parse_response,
+    replay_events,
+    validate_batch_payload,
+    validate_classify_payload,
+    wants_ndjson,
+)
+from fast_classifier import create_fast_path_from_env
+from llm_clients import azure_settings, backend_stats, create_async_client, governor_stats, hedge_stats
+from micro_batch import AsyncMicroBatcher
+from response_cache import SQLiteCache, create_cache_from_env
+from singleflight import AsyncSingleFlight
+
+settings = azure_settings()
+endpoint = settings["endpoint"]
+deployment = settings["deployment"]
+api_key = settings["api_key"]
+
+templates = Jinja2Templates(directory="templates")
+
+# Created on startup so the connection pool is bound to the serving event loop
+client = None
+
+# Optional response cache (CLASSIFY_CACHE=memory|sqlite), off by default
+cache = create_cache_from_env()
+# sqlite3 calls block, so with CLASSIFY_CACHE=sqlite they run on a worker thread
+cache_blocks = isinstance(cache, SQLiteCache)
+
+# Optional local classifier that answers confident tickets without the LLM
+fast_path = create_fast_path_from_env()
+
+# Concurrent identical classifications share one upstream call
+inflight = AsyncSingleFlight() if os.getenv("CLASSIFY_COALESCE", "true").lower() == "true" else None
+
+
+async def classify_and_respond(query, language="English"):
+    """
+    Classify user query and generate response using function calling
+    """
+    key = cache_key(query, language, deployment)
+    result = await _answer_without_llm(key, query, language)
+    if result is not None:
+        return result
+
+    if inflight is None:
+        return await _classify_and_store(key, query, language)
+    return await inflight.do(key, lambda: _classify_and_store(key, query, language))
+
+
+async def _answer_without_llm(key, query, language):
+    """
+    Cached or local fast-path answer, or None when the LLM is needed
+    """
+    if cache is not None:
+        cached = await asyncio.to_thread(cache.get, key) if cache_blocks else cache.get(key)
+        if cached is not None:
+            return {**cached, "cached": True}
+
+    if fast_path is not None:
+        return fast_path.classify(query, language)
+    return None
+
+
+async def _classify_and_store(key, query, language):
+    if batcher is not None:
+        result = await batcher.submit(query, language)
+    else:
+        result = await _classify_uncached(query, language)
+    return await _store(key, query, language, result)
+
+
+async def _store(key, query, language, result):
+    if result["success"]:
+        log_classification(query, language, result)
+        if cache_blocks:
+            await asyncio.to_thread(cache.set, key, result)
+        elif cache is not None:
+            cache.set(key, result)
+    return result
+
+
+async def _classify_uncached(query, language):
+    try:
+        response = await client.chat.completions.create(
+            model=deployment,
+            **build_request(query, language),
+        )
+        return parse_response(response)
+
+    except Exception as e:
+        return error_result(f"Error: {e}")
+
+
+async def _classify_batch_uncached(queries, language):
+    response = await client.chat.completions.create(
+        model=deployment,
+        **build_batch_request(queries, language),
+    )
+    return parse_batch_response(response, len(queries))
+
+
+# Optional micro-batching: tickets arriving together share one completion
+batcher = AsyncMicroBatcher(
+    _classify_batch_uncached,
+    _classify_uncached,
+    max_items=int(os.getenv("CLASSIFY_MICROBATCH_MAX_ITEMS", "8")),
+    max_wait_ms=float(os.getenv("CLASSIFY_MICROBATCH_WAIT_MS", "20")),
+) if os.getenv("CLASSIFY_MICROBATCH", "false").lower() == "true" else None
+
+
+async def index(request):
+    return templates.TemplateResponse(request, "index.html")
+
+
+async def classify(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+
+    query, language, error = validate_classify_payload(data)
+    if error:
+        return JSONResponse({"error": error}, status_code=400)
+
+    result = await classify_and_respond(query, language)
+    return JSONResponse(result)
+
+
+async def stream_classification(query, language):
+    """
+    Yield SSE events: category as soon as it is decoded, then content deltas
+    """
+    key = cache_key(query, language, deployment)
+    result = await _answer_without_llm(key, query, language)
+    if result is not None:
+        for event in replay_events(result):
+            yield event
+        return
+
+    stream = ClassificationStream()
+    try:
+        response = await client.chat.completions.create(
+            model=deployment,
+            stream=True,
+            **build_request(query, language),
+        )
+        async for chunk in response:
+            for event in stream.feed(chunk):
+                yield event
+        result = stream.finish()
+
+    except Exception as e:
+        result = error_result(f"Error: {e}")
+
+    yield final_event(await _store(key, query, language, result))
+
+
+async def classify_stream(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+
+    query, language, error = validate_classify_payload(data)
+    if error:
+        return JSONResponse({"error": error}, status_code=400)
+
+    return StreamingResponse(
+        stream_classification(query, language),
+        media_type=SSE_MIMETYPE,
+        headers=SSE_HEADERS,
+    )
+
+
+async def classify_item(item):
+    """
+    Classify one batch item, turning validation problems and unexpected
+    failures into a per-item error
+    """
+    query, language, error = validate_classify_payload(item)
+    if error:
+        return error_result(error)
+    try:
+        return await classify_and_respond(query, language)
+    except Exception as e:
+        return error_result(f"Error: {e}")
+
+
+async def classify_batch(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+
+    items, stream, error = validate_batch_payload(data)
+    if error:
+        return JSONResponse({"error": error}, status_code=400)
+
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def bounded(index, item):
+        async with semaphore:
+            return index, await classify_item(item)
+
+    if wants_ndjson(stream, request.headers.get("accept")):
+        async def generate():
+            # Lines are emitted in completion order; each carries its input index
+            tasks = [asyncio.create_task(bounded(i, item)) for i, item in enumerate(items)]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    index, result = await next_done
+                    yield ndjson_line(index, result)
+            finally:
+                # Stop outstanding calls if the client disconnects mid-stream
+                for task in tasks:
+                    task.cancel()
+
+        return StreamingResponse(generate(), media_type=NDJSON_MIMETYPE)
+
+    results = await asyncio.gather(*(bounded(i, item) for i, item in enumerate(items)))
+    return JSONResponse({"results": [result for _, result in results], "count": len(results)})
+
+
+async def health(request):
+    status = {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    if cache is not None:
+        # SQLiteCache.stats() runs COUNT(*), so keep it off the event loop
+        status["cache"] = await asyncio.to_thread(cache.stats) if cache_blocks else cache.stats()
+    if inflight is not None:
+        status["coalescing"] = inflight.stats()
+    if fast_path is not None:
+        status["fast_path"] = fast_path.stats()
+    if governor_stats() is not None:
+        status["governor"] = governor_stats()
+    if batcher is not None:
+        status["micro_batching"] = batcher.stats()
+    if backend_stats(client) is not None:
+        status["backends"] = backend_stats(client)
+    if hedge_stats() is not None:
+        status["hedging"] = hedge_stats()
+    return JSONResponse(status)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global client
+    client = create_async_client()
+    try:
+        yield
+    finally:
+        await client.close()
+
+
+app = Starlette(
+    routes=[
+        Route("/", index),
+        Route("/api/classify", classify, methods=["POST"]),
+        Route("/api/classify/stream", classify_stream, methods=["POST"]),
+        Route("/api/classify/batch", classify_batch, methods=["POST"]),
+        Route("/health", health),
+    ],
+    lifespan=lifespan,
+)
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print("🚀 Starting AI Customer Care Assistant (async mode)...")
+    print(f"📡 Endpoint: {endpoint}")
+    print(f"🤖 Model: {deployment}")
+    print(f"🔑 API Key: {'✅ Set' if api_key else '❌ Not Set'}")
+    print("🌐 Server will be available at: http://localhost:5000")
+    print("💡 Press Ctrl+C to stop the server")
+    print("-" * 50)
+
+    uvicorn.run(app, host='0.0.0.0', port=5000)
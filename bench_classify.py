@@ -0,0 +1,109 @@
+"""
+Throughput comparison: Flask (app.py) vs async ASGI (app_asgi.py).
+
+Both apps are driven through their /api/classify handlers against the local
+mock completion server, so the numbers reflect the serving model rather than
+Azure latency. The Flask path is capped at --workers concurrent requests,
+mirroring N sync gunicorn workers; the ASGI path runs in one event loop.
+
+Request coalescing (CLASSIFY_COALESCE) is off for the main runs and every
+request carries a unique query, so each one makes its own upstream call.
+A second pair of runs turns coalescing on over a handful of repeated
+queries and is reported separately: it measures how many calls were
+merged, not serving throughput.
+
+    python bench_classify.py --requests 500 --workers 8 --concurrency 256
+"""
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+import mock_openai_server
+from singleflight import AsyncSingleFlight, SingleFlight
+
+QUERIES = [
+    "I have a question about my bill",
+    "My router is broken and keeps restarting",
+    "Can you recommend a plan for a small office?",
+    "我的账单金额不对",
+]
+
+
+def payload(i, repeated=False):
+    query = QUERIES[i % len(QUERIES)]
+    return {"query": query if repeated else f"{query} (ticket {i})", "language": "English"}
+
+
+def report(name, total, elapsed, failures):
+    print(f"{name:<15} {total:>6} req  {elapsed:>7.2f} s  {total / elapsed:>8.1f} req/s  failures={failures}")
+
+
+def bench_flask(total, workers, coalesce=False):
+    import app
+
+    app.inflight = SingleFlight() if coalesce else None
+    flask_client = app.app.test_client()
+
+    def one(i):
+        return flask_client.post("/api/classify", json=payload(i, repeated=coalesce)).get_json()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+    report("flask+coalesce" if coalesce else "flask", total, elapsed, sum(not r.get("success") for r in results))
+
+
+async def bench_asgi(total, concurrency, coalesce=False):
+    import app_asgi
+    import llm_clients
+
+    app_asgi.inflight = AsyncSingleFlight() if coalesce else None
+    app_asgi.client = llm_clients.create_async_client()
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app_asgi.app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://asgi") as http:
+        async def one(i):
+            async with semaphore:
+                response = await http.post("/api/classify", json=payload(i, repeated=coalesce))
+                return response.json()
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+
+    await app_asgi.client.close()
+    report("asgi+coalesce" if coalesce else "asgi", total, elapsed, sum(not r.get("success") for r in results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=8, help="Flask concurrency (sync workers)")
+    parser.add_argument("--concurrency", type=int, default=256, help="ASGI in-flight requests")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="mock completion latency")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+
+    # The apps read their configuration at import time
+    os.environ["ENDPOINT_URL"] = f"http://127.0.0.1:{args.port}/"
+    os.environ["AZURE_API_KEY"] = "mock"
+    os.environ["CLASSIFY_COALESCE"] = "false"
+    os.environ.setdefault("LLM_MAX_CONNECTIONS", str(max(args.concurrency, args.workers)))
+
+    server = mock_openai_server.serve_in_thread(args.port, latency_ms=args.latency_ms)
+    print(f"🧪 Mock completion latency: {args.latency_ms:.0f} ms")
+    print("-" * 50)
+    try:
+        bench_flask(args.requests, args.workers)
+        asyncio.run(bench_asgi(args.requests, args.concurrency))
+        print(f"-- with coalescing, {len(QUERIES)} repeated queries (merged calls, not serving throughput)")
+        bench_flask(args.requests, args.workers, coalesce=True)
+        asyncio.run(bench_asgi(args.requests, args.concurrency, coalesce=True))
+    finally:
+        server.should_exit = True
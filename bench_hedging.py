@@ -0,0 +1,90 @@
+"""
+Tail latency of classification calls with and without hedging.
+
+The mock completion server slows down --tail-probability of its requests by
+--tail-ms. Each mode sends the same sequence of classification calls from
+--concurrency async callers and reports p50/p95/p99 plus the hedge counters.
+Before measuring, --warmup calls go through the hedged client so connections
+are open and the hedger has a full latency window; its counters are then
+reset, so the reported hedge rate covers the measured calls only.
+
+    python bench_hedging.py --requests 1000 --tail-probability 0.03 --tail-ms 2000
+"""
+import argparse
+import asyncio
+import time
+
+import mock_openai_server
+from bench_classify import QUERIES
+from customer_care import build_request, parse_response
+from hedging import AsyncHedgedClient, Hedger
+
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+async def run(name, client, total, concurrency, quiet=False):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.chat.completions.create(
+                model="mock", **build_request(QUERIES[i % len(QUERIES)], "English")
+            )
+            latencies.append(time.perf_counter() - start)
+            return parse_response(response)
+
+    results = await asyncio.gather(*(one(i) for i in range(total)))
+    if quiet:
+        return
+    latencies.sort()
+    failures = sum(not r["success"] for r in results)
+    print(f"{name:<8} {percentile(latencies, 50) * 1000:>8.0f} {percentile(latencies, 95) * 1000:>8.0f} "
+          f"{percentile(latencies, 99) * 1000:>8.0f} {latencies[-1] * 1000:>8.0f}  failures={failures}")
+
+
+async def main(args):
+    from llm_clients import create_async_client
+
+    client = create_async_client(endpoint=f"http://127.0.0.1:{args.port}/", api_key="mock")
+    hedger = Hedger(percentile=args.percentile)
+    print(f"🧪 {args.requests} calls, {args.tail_probability:.0%} slowed by {args.tail_ms:.0f} ms")
+    print("mode     p50 (ms) p95 (ms) p99 (ms) max (ms)")
+    try:
+        hedged = AsyncHedgedClient(client, hedger)
+        await run("warm-up", hedged, args.warmup, args.concurrency, quiet=True)
+        hedger.reset_stats()
+        await run("plain", client, args.requests, args.concurrency)
+        await run("hedged", hedged, args.requests, args.concurrency)
+    finally:
+        await client.close()
+    print(hedger.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=200, help="unmeasured calls before the runs")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--percentile", type=float, default=95.0, help="hedge after this latency percentile")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="mock completion latency")
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--tail-probability", type=float, default=0.03)
+    parser.add_argument("--tail-ms", type=float, default=2000.0)
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+
+    server = mock_openai_server.serve_in_thread(
+        args.port,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        tail_probability=args.tail_probability,
+        tail_ms=args.tail_ms,
+    )
+    try:
+        asyncio.run(main(args))
+    finally:
+        server.should_exit = True
@@ -0,0 +1,90 @@
+"""
+Memory and time of loading a large KB in one piece vs streaming it into shards.
+
+Writes a synthetic JSONL export of --records records, then runs each phase
+in its own Python process so peak RSS is measured per phase:
+
+    in-memory   json-load every record and build one BM25Index (the old path)
+    ingest      kb_ingest.ingest(): stream into --shard-size shards on disk
+    query       open the ShardedIndex (mmap) and run --queries searches
+
+    python bench_ingest.py --records 500000 --shard-size 50000
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_retrieval import iter_synthetic_kb, paraphrase, peak_rss_mb
+
+
+def phase(name, source, directory, shard_size, queries):
+    start = time.perf_counter()
+    result = {}
+    if name == "in-memory":
+        from kb_search import BM25Index, load_records
+
+        BM25Index(load_records(source))
+    elif name == "ingest":
+        from kb_ingest import ingest
+
+        ingest(source, directory, shard_size)
+    elif name == "query":
+        from kb_ingest import ShardedIndex
+
+        index = ShardedIndex(directory)
+        result["open_s"] = round(time.perf_counter() - start, 3)
+        rng = random.Random(1)
+        with open(source, "r", encoding="utf-8") as f:
+            sample = [json.loads(line) for _, line in zip(range(5000), f)]
+        latencies = []
+        for _ in range(queries):
+            query = paraphrase(rng.choice(sample), rng)
+            t = time.perf_counter()
+            index.search(query, k=3)
+            latencies.append(time.perf_counter() - t)
+        latencies.sort()
+        result["p50_ms"] = round(latencies[len(latencies) // 2] * 1000, 2)
+        result["p99_ms"] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2)
+    result["seconds"] = round(time.perf_counter() - start, 2)
+    peak = peak_rss_mb()
+    result["peak_rss_mb"] = round(peak, 1) if peak is not None else None
+    print(json.dumps(result))
+
+
+def run_phase(name, args, source, directory):
+    output = subprocess.run(
+        [sys.executable, __file__, "--phase", name, "--source", source, "--out", directory,
+         "--shard-size", str(args.shard_size), "--queries", str(args.queries)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=500000)
+    parser.add_argument("--shard-size", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--phase", help=argparse.SUPPRESS)
+    parser.add_argument("--source", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.phase:
+        phase(args.phase, args.source, args.out, args.shard_size, args.queries)
+        sys.exit()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "kb_export.jsonl")
+        with open(source, "w", encoding="utf-8") as f:
+            for record in iter_synthetic_kb(args.records):
+                f.write(json.dumps(record) + "\n")
+        size_mb = os.path.getsize(source) / (1024 * 1024)
+        print(f"🧪 {args.records} records ({size_mb:.0f} MB JSONL), shards of {args.shard_size}")
+        for name in ("in-memory", "ingest", "query"):
+            print(f"{name:<10} {run_phase(name, args, source, os.path.join(tmp, 'kb_index'))}")
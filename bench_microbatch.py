@@ -0,0 +1,87 @@
+"""
+Tokens and latency per ticket at different micro-batch sizes.
+
+Runs the same ticket load through MicroBatcher at each --batch-sizes value
+against the local mock completion server and reports prompt/completion
+tokens per ticket (from the mock's usage accounting) plus per-ticket latency.
+
+    python bench_microbatch.py --tickets 256 --concurrency 64 --batch-sizes 1,2,4,8,16
+"""
+import argparse
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import mock_openai_server
+from bench_classify import QUERIES
+from customer_care import build_batch_request, build_request, error_result, parse_batch_response, parse_response
+from micro_batch import MicroBatcher
+
+
+def make_calls(client, deployment):
+    def single(query, language):
+        try:
+            return parse_response(client.chat.completions.create(model=deployment, **build_request(query, language)))
+        except Exception as e:
+            return error_result(f"Error: {e}")
+
+    def batch(queries, language):
+        response = client.chat.completions.create(model=deployment, **build_batch_request(queries, language))
+        return parse_batch_response(response, len(queries))
+
+    return single, batch
+
+
+def run(batch_size, tickets, concurrency, wait_ms, client, stats):
+    single, batch = make_calls(client, "mock")
+    batcher = MicroBatcher(batch, single, max_items=batch_size, max_wait_ms=wait_ms if batch_size > 1 else 0)
+    before = dict(stats)
+    latencies = []
+
+    def one(i):
+        start = time.perf_counter()
+        result = batcher.submit(f"{QUERIES[i % len(QUERIES)]} (#{i})", "English")
+        latencies.append(time.perf_counter() - start)
+        return result
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(tickets)))
+    elapsed = time.perf_counter() - start
+
+    prompt = (stats["prompt_tokens"] - before["prompt_tokens"]) / tickets
+    completion = (stats["completion_tokens"] - before["completion_tokens"]) / tickets
+    calls = stats["requests"] - before["requests"]
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    failures = sum(not r["success"] for r in results)
+    print(f"{batch_size:>5}  {calls:>6}  {prompt:>13.1f}  {completion:>17.1f}  "
+          f"{statistics.median(latencies) * 1000:>8.0f}  {p95 * 1000:>8.0f}  {tickets / elapsed:>8.1f}  {failures:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=64, help="concurrent callers")
+    parser.add_argument("--batch-sizes", default="1,2,4,8,16")
+    parser.add_argument("--wait-ms", type=float, default=20.0, help="max time a ticket waits for its batch")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="mock time to first token")
+    parser.add_argument("--output-token-ms", type=float, default=2.0, help="mock time per generated token")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+
+    os.environ["LLM_MAX_CONNECTIONS"] = str(args.concurrency)
+    from llm_clients import create_client
+
+    server = mock_openai_server.serve_in_thread(
+        args.port, latency_ms=args.latency_ms, output_token_ms=args.output_token_ms
+    )
+    client = create_client(endpoint=f"http://127.0.0.1:{args.port}/", api_key="mock")
+    print(f"🧪 {args.tickets} tickets, {args.concurrency} concurrent callers, wait {args.wait_ms:.0f} ms")
+    print("batch   calls  prompt tok/tkt  completion tok/tkt  p50 (ms)  p95 (ms)  tickets/s  failures")
+    try:
+        for size in (int(s) for s in args.batch_sizes.split(",")):
+            run(size, args.tickets, args.concurrency, args.wait_ms, client, server.config.app.state.stats)
+    finally:
+        server.should_exit = True
@@ -0,0 +1,288 @@
+"""
+Retrieval quality and speed of every search_kb backend as the KB grows.
+
+For each --sizes value a synthetic e-commerce KB is written in the kb.json
+shape, together with a query set whose target record is known:
+
+    shuffle   a shuffled subset of the target question's words
+    synonym   the same, with the action, subject and product words swapped
+              for synonyms the KB never uses (needs more than keywords)
+    mixed     half of each (default)
+
+Each backend is then built and queried in its own Python process, so peak
+RSS is measured per backend, and the table reports index build time, peak
+memory, p50/p99 query latency, recall@k and MRR@10:
+
+    scan      no index: word overlap against every record (the baseline)
+    bm25      KnowledgeBase, KB_SEARCH=bm25
+    vector    KnowledgeBase, KB_SEARCH=vector with the offline hashing embedder
+    hybrid    KnowledgeBase, KB_SEARCH=hybrid (BM25 + vector, RRF)
+    sharded   kb_ingest: sharded on-disk BM25 (KB_INDEX_DIR)
+
+Everything runs offline.
+
+    python bench_retrieval.py
+    python bench_retrieval.py --sizes 1000,10000 --backends bm25,hybrid --query-set synonym
+    python bench_retrieval.py --sizes 1000000 --backends bm25,sharded --queries 200 --write kbs/
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SUBJECTS = [
+    "order", "refund", "return", "shipment", "package", "invoice", "account", "password", "coupon",
+    "gift card", "subscription", "warranty", "exchange", "delivery", "payment", "receipt", "discount",
+    "membership", "cart", "checkout", "size chart", "store credit", "pre-order", "price match",
+]
+PRODUCTS = [
+    "laptop", "headphones", "sofa", "jacket", "sneakers", "camera", "blender", "monitor", "backpack",
+    "watch", "tablet", "mattress", "printer", "router", "lamp", "desk", "phone case", "keyboard",
+]
+ACTIONS = [
+    "cancel", "track", "change", "update", "apply", "extend", "split", "combine", "transfer", "verify",
+    "reset", "download", "redeem", "schedule", "expedite", "dispute", "confirm", "renew",
+]
+QUALIFIERS = [
+    "internationally", "after 30 days", "without a receipt", "for a business account", "in store",
+    "on the mobile app", "during a sale", "as a guest", "for a gift", "with two addresses",
+    "outside business hours", "before it ships", "after delivery", "with a promo code",
+]
+SYNONYMS = {
+    "cancel": "stop", "track": "follow", "change": "modify", "update": "edit", "apply": "use",
+    "extend": "prolong", "split": "divide", "combine": "merge", "transfer": "move", "verify": "validate",
+    "reset": "restore", "download": "save", "redeem": "claim", "schedule": "book", "expedite": "rush",
+    "dispute": "contest", "confirm": "approve", "renew": "continue",
+    "order": "purchase", "refund": "reimbursement", "shipment": "consignment", "package": "parcel",
+    "invoice": "bill", "account": "profile", "password": "passcode", "coupon": "voucher",
+    "delivery": "drop-off", "payment": "charge", "receipt": "proof", "discount": "markdown",
+    "cart": "basket", "checkout": "till",
+    "laptop": "notebook", "headphones": "earphones", "sofa": "couch", "jacket": "coat",
+    "sneakers": "trainers", "blender": "mixer", "monitor": "display", "backpack": "rucksack",
+    "tablet": "ipad", "mattress": "bed", "lamp": "light", "desk": "workstation",
+}
+
+BACKENDS = ("scan", "bm25", "vector", "hybrid", "sharded")
+QUERY_SETS = ("shuffle", "synonym", "mixed")
+MRR_DEPTH = 10
+
+
+def iter_synthetic_kb(size, seed=0):
+    rng = random.Random(seed)
+    for i in range(size):
+        subject, product = rng.choice(SUBJECTS), rng.choice(PRODUCTS)
+        action, qualifier = rng.choice(ACTIONS), rng.choice(QUALIFIERS)
+        tag = f"sku{rng.randrange(size * 4)}"
+        yield {
+            "id": i + 1,
+            "question": f"How do I {action} the {subject} for my {product} {tag} {qualifier}?",
+            "answer": f"To {action} the {subject} for a {product} {qualifier}, open Orders, choose {tag} "
+                      f"and select {action.title()}. Changes to a {subject} are confirmed by email.",
+        }
+
+
+def synthetic_kb(size, seed=0):
+    return list(iter_synthetic_kb(size, seed))
+
+
+def paraphrase(record, rng):
+    words = record["question"].rstrip("?").split()[3:]
+    rng.shuffle(words)
+    return " ".join(words[: max(3, len(words) * 2 // 3)])
+
+
+def paraphrase_synonyms(record, rng):
+    words = [SYNONYMS.get(w, w) for w in record["question"].rstrip("?").split()[3:]]
+    rng.shuffle(words)
+    return " ".join(words[: max(3, len(words) * 2 // 3)])
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / 1024 if sys.platform != "darwin" else peak / (1024 * 1024)
+
+
+def write_kb(path, size):
+    """
+    Stream a synthetic KB to `path` in the kb.json {"records": [...]} shape
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"records": [\n')
+        for i, record in enumerate(iter_synthetic_kb(size)):
+            f.write(("" if i == 0 else ",\n") + json.dumps(record, ensure_ascii=False))
+        f.write("\n]}\n")
+
+
+def make_queries(size, count, query_set, seed=1):
+    """
+    [(query, target id)] for `count` random records of the synthetic KB
+    """
+    rng = random.Random(seed)
+    targets = set(rng.sample(range(1, size + 1), min(count, size)))
+    queries = []
+    for record in iter_synthetic_kb(size):
+        if record["id"] not in targets:
+            continue
+        kind = query_set if query_set != "mixed" else ("shuffle", "synonym")[len(queries) % 2]
+        query = paraphrase(record, rng) if kind == "shuffle" else paraphrase_synonyms(record, rng)
+        queries.append((query, record["id"]))
+    rng.shuffle(queries)
+    return queries
+
+
+class ScanIndex:
+    """
+    No index: every query is compared with every record's words
+    """
+
+    def __init__(self, records):
+        from kb_search import tokenize
+
+        self.tokenize = tokenize
+        self.records = records
+        self.terms = [frozenset(tokenize(r["question"] + " " + r["answer"])) for r in records]
+
+    def search(self, query, k=3):
+        query_terms = set(self.tokenize(query))
+        scored = [(len(query_terms & terms), i) for i, terms in enumerate(self.terms)]
+        best = sorted((item for item in scored if item[0]), key=lambda item: -item[0])[:k]
+        return [{**self.records[i], "score": float(score)} for score, i in best]
+
+
+def build_backend(name, path, work_dir, dim, dtype, shard_size):
+    if name == "scan":
+        from kb_search import load_records
+
+        return ScanIndex(load_records(path))
+    if name == "sharded":
+        from kb_ingest import ShardedIndex, ingest
+
+        ingest(path, os.path.join(work_dir, "shards"), shard_size)
+        return ShardedIndex(os.path.join(work_dir, "shards"))
+
+    from kb_vectors import HashingEmbedder
+    from knowledge_base import KnowledgeBase
+
+    embedder = HashingEmbedder(dim) if name != "bm25" else None
+    return KnowledgeBase(path, mode=name, embedder=embedder, vector_dtype=dtype)
+
+
+def measure(name, path, queries_path, k, dim, dtype, shard_size):
+    """
+    Build one backend and run the query set; the result as a dict
+    """
+    with open(queries_path, "r", encoding="utf-8") as f:
+        queries = json.load(f)
+    with tempfile.TemporaryDirectory() as work_dir:
+        start = time.perf_counter()
+        index = build_backend(name, path, work_dir, dim, dtype, shard_size)
+        build = time.perf_counter() - start
+
+        latencies, hits, reciprocal_ranks = [], 0, 0.0
+        for query, target in queries:
+            start = time.perf_counter()
+            results = index.search(query, k=max(k, MRR_DEPTH))
+            latencies.append(time.perf_counter() - start)
+            ids = [r["id"] for r in results]
+            hits += target in ids[:k]
+            if target in ids:
+                reciprocal_ranks += 1.0 / (ids.index(target) + 1)
+    latencies.sort()
+    return {
+        "build_s": round(build, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1) if resource is not None else None,
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2),
+        "recall": round(hits / len(queries), 4),
+        "mrr": round(reciprocal_ranks / len(queries), 4),
+    }
+
+
+def run_backend(name, path, queries_path, args):
+    # Vector sidecars from an earlier backend would turn this build into a load
+    base = os.path.splitext(path)[0]
+    for sidecar in glob.glob(f"{base}.vectors.*") + glob.glob(f"{base}.scales.npy"):
+        os.remove(sidecar)
+    if not args.isolate:
+        return measure(name, path, queries_path, args.k, args.dim, args.dtype, args.shard_size)
+    output = subprocess.run(
+        [sys.executable, __file__, "--backend-run", name, "--kb", path, "--query-file", queries_path,
+         "-k", str(args.k), "--dim", str(args.dim), "--dtype", args.dtype, "--shard-size", str(args.shard_size)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(size, args, tmp):
+    path = os.path.join(tmp, f"kb-{size}.json")
+    start = time.perf_counter()
+    write_kb(path, size)
+    queries_path = os.path.join(tmp, f"queries-{size}.json")
+    with open(queries_path, "w", encoding="utf-8") as f:
+        json.dump(make_queries(size, args.queries, args.query_set), f, ensure_ascii=False)
+    print(f"📚 {size} records ({os.path.getsize(path) / (1024 * 1024):.1f} MB) "
+          f"generated in {time.perf_counter() - start:.1f} s")
+    if args.write:
+        os.makedirs(args.write, exist_ok=True)
+        shutil.copy(path, os.path.join(args.write, f"kb-{size}.json"))
+        shutil.copy(queries_path, os.path.join(args.write, f"queries-{size}.json"))
+
+    for name in args.backends.split(","):
+        if name == "scan" and size > args.scan_max:
+            print(f"{size:>9}  {name:<8}  skipped (> --scan-max {args.scan_max})")
+            continue
+        result = run_backend(name, path, queries_path, args)
+        rss = f"{result['peak_rss_mb']:>9.0f}" if result["peak_rss_mb"] is not None else f"{'-':>9}"
+        print(f"{size:>9}  {name:<8}  {result['build_s']:>9.2f}  {rss}  {result['p50_ms']:>8.2f}  "
+              f"{result['p99_ms']:>8.2f}  {result['recall']:>8.1%}  {result['mrr']:>6.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help=f"comma-separated: {', '.join(BACKENDS)}")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--query-set", choices=QUERY_SETS, default="mixed")
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--dim", type=int, default=512, help="hashing embedder dimensions")
+    parser.add_argument("--dtype", choices=("float32", "int8"), default="float32")
+    parser.add_argument("--shard-size", type=int, default=50000)
+    parser.add_argument("--scan-max", type=int, default=100000, help="largest KB to run the scan baseline on")
+    parser.add_argument("--write", help="also keep the generated KBs and query sets in this directory")
+    parser.add_argument("--no-isolate", dest="isolate", action="store_false",
+                        help="run backends in this process (faster; peak RSS is then cumulative)")
+    parser.add_argument("--backend-run", help=argparse.SUPPRESS)
+    parser.add_argument("--kb", help=argparse.SUPPRESS)
+    parser.add_argument("--query-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.backend_run:
+        print(json.dumps(measure(args.backend_run, args.kb, args.query_file, args.k, args.dim, args.dtype,
+                                 args.shard_size)))
+        sys.exit()
+
+    unknown = set(args.backends.split(",")) - set(BACKENDS)
+    if unknown:
+        parser.error(f"unknown backends: {', '.join(sorted(unknown))}")
+
+    print(f"🧪 {args.queries} {args.query_set} queries per KB, recall@{args.k}, MRR@{MRR_DEPTH}")
+    print(f"{'records':>9}  {'backend':<8}  {'build (s)':>9}  {'peak MB':>9}  {'p50 (ms)':>8}  "
+          f"{'p99 (ms)':>8}  {'recall@k':>8}  {'MRR':>6}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (int(s) for s in args.sizes.split(",")):
+            run(size, args, tmp)
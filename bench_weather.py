@@ -0,0 +1,122 @@
+"""
+Latency and upstream traffic of get_weather lookups.
+
+Replays --lookups weather lookups for --cities locations against the mock
+Open-Meteo server. A few cities get most of the traffic, and each lookup
+jitters the coordinates in the 3rd-4th decimal, the way the model writes
+them slightly differently every time. Each mode reports per-lookup latency,
+upstream requests and bytes received:
+
+    baseline  requests.get per lookup, current + hourly (the old get_weather)
+    pooled    WeatherClient without cache: one session, current fields only
+    cached    WeatherClient with its TTL cache on rounded coordinates
+
+Then multi-city queries ("Beijing, Shanghai and Tokyo") of --batch
+locations each, without cache, reporting per-query latency:
+
+    one-by-one  current() per location
+    batched     current_many(): one request with comma-separated coordinates
+
+Finally the lookups are replayed one every --pace-ms with a short cache
+TTL (--short-ttl seconds), so entries expire during the run:
+
+    expiring       WeatherClient cache only: hot cities miss on every expiry
+    refresh-ahead  plus WeatherRefresher keeping the --top-n hottest warm
+
+    python bench_weather.py --lookups 500 --cities 30 --latency-ms 80 --batch 3
+"""
+import argparse
+import random
+import statistics
+import time
+
+import requests
+
+import mock_open_meteo
+from weather_client import WeatherClient, WeatherRefresher
+
+BASELINE_QUERY = (
+    "?latitude={latitude}&longitude={longitude}"
+    "&current=temperature_2m,wind_speed_10m,relative_humidity_2m,weather_code"
+    "&hourly=temperature_2m,relative_humidity_2m,wind_speed_10m"
+)
+
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def workload(lookups, cities, seed=0):
+    rng = random.Random(seed)
+    locations = [(rng.uniform(-60, 70), rng.uniform(-180, 180)) for _ in range(cities)]
+    weights = [1 / (rank + 1) for rank in range(cities)]  # Zipf-like popularity
+    return [
+        (round(lat + rng.uniform(-0.004, 0.004), 4), round(lon + rng.uniform(-0.004, 0.004), 4))
+        for lat, lon in rng.choices(locations, weights, k=lookups)
+    ]
+
+
+def baseline_lookup(url, latitude, longitude):
+    response = requests.get(url + BASELINE_QUERY.format(latitude=latitude, longitude=longitude))
+    response.raise_for_status()
+    return response.json()["current"]
+
+
+def run(name, lookup, lookups, stats, pace=0.0, width=10):
+    before = dict(stats)
+    latencies = []
+    for item in lookups:
+        start = time.perf_counter()
+        lookup(*item)
+        latencies.append(time.perf_counter() - start)
+        time.sleep(pace)
+    latencies.sort()
+    print(f"{name:<{width}} {statistics.mean(latencies) * 1000:>9.1f} {percentile(latencies, 50) * 1000:>8.1f} "
+          f"{percentile(latencies, 99) * 1000:>8.1f} {stats['requests'] - before['requests']:>9} "
+          f"{(stats['bytes'] - before['bytes']) / 1024:>11.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lookups", type=int, default=500)
+    parser.add_argument("--cities", type=int, default=30)
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="mock upstream latency")
+    parser.add_argument("--batch", type=int, default=3, help="locations per multi-city query")
+    parser.add_argument("--short-ttl", type=float, default=2.0, help="cache TTL of the refresh-ahead runs")
+    parser.add_argument("--pace-ms", type=float, default=10.0, help="time between lookups of the refresh-ahead runs")
+    parser.add_argument("--top-n", type=int, default=10, help="locations kept warm by the refresher")
+    parser.add_argument("--port", type=int, default=8092)
+    args = parser.parse_args()
+
+    server = mock_open_meteo.serve_in_thread(args.port, latency_ms=args.latency_ms)
+    stats = server.config.app.state.stats
+    url = f"http://127.0.0.1:{args.port}/v1/forecast"
+    lookups = workload(args.lookups, args.cities)
+    print(f"🧪 {args.lookups} lookups over {args.cities} cities, upstream latency {args.latency_ms:.0f} ms")
+    print(f"{'mode':<10} {'mean (ms)':>9} {'p50 (ms)':>8} {'p99 (ms)':>8} {'upstream':>9} {'received KB':>11}")
+    try:
+        run("baseline", lambda lat, lon: baseline_lookup(url, lat, lon), lookups, stats)
+        pooled = WeatherClient(base_url=url, cache_ttl=0)
+        run("pooled", pooled.current, lookups, stats)
+        cached = WeatherClient(base_url=url)
+        run("cached", cached.current, lookups, stats)
+        print(cached.stats())
+
+        queries = [(lookups[i:i + args.batch],) for i in range(0, len(lookups) - args.batch + 1, args.batch)]
+        print(f"\n🧪 {len(queries)} queries of {args.batch} locations each")
+        print(f"{'mode':<10} {'mean (ms)':>9} {'p50 (ms)':>8} {'p99 (ms)':>8} {'upstream':>9} {'received KB':>11}")
+        run("one-by-one", lambda locations: [pooled.current(*location) for location in locations], queries, stats)
+        run("batched", pooled.current_many, queries, stats)
+
+        print(f"\n🧪 one lookup every {args.pace_ms:.0f} ms, cache TTL {args.short_ttl:.0f} s")
+        print(f"{'mode':<13} {'mean (ms)':>9} {'p50 (ms)':>8} {'p99 (ms)':>8} {'upstream':>9} {'received KB':>11}")
+        expiring = WeatherClient(base_url=url, cache_ttl=args.short_ttl)
+        run("expiring", expiring.current, lookups, stats, args.pace_ms / 1000, width=13)
+        warm = WeatherClient(base_url=url, cache_ttl=args.short_ttl)
+        refresher = WeatherRefresher(warm, top_n=args.top_n, ahead=args.short_ttl / 4,
+                                     interval=args.short_ttl / 10).start()
+        run("refresh-ahead", warm.current, lookups, stats, args.pace_ms / 1000, width=13)
+        refresher.stop()
+        print(refresher.stats())
+    finally:
+        server.should_exit = True
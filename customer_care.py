@@ -0,0 +1,500 @@
+"""
+Shared request/response handling for the customer care classifier.
+
+Both serving modes (Flask in app.py, ASGI in app_asgi.py) build the same
+tool-calling request and turn the completion into the same JSON result, so
+the logic lives here and the apps only decide how the call is made.
+"""
+import json
+import os
+import threading
+from datetime import datetime
+
+from openai.types.chat import (
+    ChatCompletionSystemMessageParam,
+    ChatCompletionToolParam,
+    ChatCompletionUserMessageParam,
+)
+
+from response_cache import make_key, normalize_text
+
+FUNCTION_NAME = "chat"
+BATCH_FUNCTION_NAME = "chat_batch"
+CATEGORIES = ["advisory", "break-fix", "billing"]
+
+# /api/classify/batch limits
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+NDJSON_MIMETYPE = "application/x-ndjson"
+SSE_MIMETYPE = "text/event-stream"
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+# JSONL log of LLM classifications, used to train the local fast path
+CLASSIFY_LOG_PATH = os.getenv("CLASSIFY_LOG_PATH")
+_log_lock = threading.Lock()
+
+# Canned replies sent when the local classifier answers without the LLM
+LOCAL_REPLIES = {
+    "english": {
+        "advisory": "Thanks for your question. A member of our advisory team will follow up with you shortly.",
+        "break-fix": "Sorry you're having trouble. We've logged this as a technical issue and an engineer will get back to you shortly.",
+        "billing": "Thanks for reaching out about billing. Our billing team will review your account and get back to you shortly.",
+    },
+    "chinese": {
+        "advisory": "感谢您的咨询，我们的顾问团队会尽快与您联系。",
+        "break-fix": "很抱歉给您带来不便，我们已将此问题记录为技术故障，工程师会尽快与您联系。",
+        "billing": "感谢您关于账单的反馈，我们的账务团队会核查您的账户并尽快回复您。",
+    },
+}
+
+
+def build_tools(language="English"):
+    """
+    Build the `chat` tool schema, with descriptions in the requested language
+    """
+    if language.lower() == "chinese":
+        content_description = "你给予客户的回复."
+        category_description = "工单的类型."
+    else:
+        content_description = "Your reply that we send to the customer."
+        category_description = "Category of the ticket."
+
+    return [
+        ChatCompletionToolParam(
+            type="function",
+            function={
+                "name": FUNCTION_NAME,
+                "description": "Function to respond to a customer query.",
+                "parameters": {
+                    "type": "object",
+                    # category first: models emit arguments in schema order,
+                    # so a streamed response can show the category early
+                    "properties": {
+                        "category": {
+                            "type": "string",
+                            "enum": CATEGORIES,
+                            "description": category_description,
+                        },
+                        "content": {
+                            "type": "string",
+                            "description": content_description,
+                        },
+                    },
+                    "required": ["category", "content"],
+                },
+            },
+        )
+    ]
+
+
+def system_prompt(language="English"):
+    if language.lower() == "chinese":
+        return "You're a helpful customer care assistant that can classify incoming messages and create a response. Answer the questions in Chinese."
+    return "You're a helpful customer care assistant that can classify incoming messages and create a response."
+
+
+def build_messages(query, language="English"):
+    """
+    Build the system + user messages for a customer query
+    """
+    return [
+        ChatCompletionSystemMessageParam(
+            role="system",
+            content=system_prompt(language)
+        ),
+        ChatCompletionUserMessageParam(
+            role="user",
+            content=query
+        ),
+    ]
+
+
+def build_request(query, language="English"):
+    """
+    Keyword arguments for `chat.completions.create` (everything except `model`)
+    """
+    return {
+        "messages": build_messages(query, language),
+        "tools": build_tools(language),
+        "tool_choice": {"type": "function", "function": {"name": FUNCTION_NAME}},
+    }
+
+
+def cache_key(query, language, deployment):
+    """
+    Cache key for a classification.
+
+    Besides the normalized query and language it covers the deployment and
+    the exact prompt + tool schema, so changing either never serves stale
+    answers produced under the old contract.
+    """
+    fingerprint = [build_messages("", language)[0], build_tools(language)]
+    return make_key(normalize_text(query), language.lower(), deployment, fingerprint)
+
+
+def build_batch_request(queries, language="English"):
+    """
+    One completion for several tickets: the tickets go in as a JSON list and
+    the `chat_batch` tool returns one {id, category, content} per ticket
+    """
+    ticket_schema = build_tools(language)[0]["function"]["parameters"]
+    tools = [
+        ChatCompletionToolParam(
+            type="function",
+            function={
+                "name": BATCH_FUNCTION_NAME,
+                "description": "Function to respond to several customer queries at once.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "tickets": {
+                            "type": "array",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "id": {"type": "integer", "description": "Id of the ticket being answered."},
+                                    **ticket_schema["properties"],
+                                },
+                                "required": ["id", *ticket_schema["required"]],
+                            },
+                        },
+                    },
+                    "required": ["tickets"],
+                },
+            },
+        )
+    ]
+    tickets = [{"id": i, "query": query} for i, query in enumerate(queries)]
+    messages = [
+        ChatCompletionSystemMessageParam(
+            role="system",
+            content=system_prompt(language)
+            + " You will receive a JSON list of independent tickets. Answer every ticket separately"
+            + f" and call {BATCH_FUNCTION_NAME} once with one entry per ticket id.",
+        ),
+        ChatCompletionUserMessageParam(
+            role="user",
+            content=json.dumps(tickets, ensure_ascii=False),
+        ),
+    ]
+    return {
+        "messages": messages,
+        "tools": tools,
+        "tool_choice": {"type": "function", "function": {"name": BATCH_FUNCTION_NAME}},
+    }
+
+
+def parse_batch_response(response, count):
+    """
+    Split a `chat_batch` completion into per-ticket results, in ticket order.
+
+    Raises ValueError when the answer does not cover exactly the tickets that
+    were sent, so the caller can fall back to single calls.
+    """
+    tool_calls = response.choices[0].message.tool_calls
+    if not tool_calls:
+        raise ValueError("No tool calls found in batch response")
+    try:
+        tickets = json.loads(tool_calls[0].function.arguments)["tickets"]
+        by_id = {int(ticket["id"]): ticket for ticket in tickets}
+        answers = [by_id[i] for i in range(count)]
+    except (KeyError, TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Malformed batch response: {e}") from e
+    if len(by_id) != count or any(
+        a.get("category") not in CATEGORIES or not isinstance(a.get("content"), str) for a in answers
+    ):
+        raise ValueError("Batch response does not match the tickets sent")
+
+    return [
+        success_result(json.dumps(
+            {"category": a["category"], "content": a["content"]}, ensure_ascii=False
+        ))
+        for a in answers
+    ]
+
+
+def success_result(arguments):
+    """
+    Result dict for a successfully decoded `chat` tool call
+    """
+    function_args = json.loads(arguments)
+    return {
+        "success": True,
+        "content": function_args["content"],
+        "category": function_args["category"],
+        "raw_response": arguments,
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+
+def local_result(category, confidence, language="English"):
+    """
+    Result dict for a ticket answered by the local fast-path classifier
+    """
+    replies = LOCAL_REPLIES.get(language.lower(), LOCAL_REPLIES["english"])
+    arguments = json.dumps({"content": replies[category], "category": category}, ensure_ascii=False)
+    return {
+        **success_result(arguments),
+        "source": "local",
+        "confidence": round(confidence, 4),
+    }
+
+
+def log_classification(query, language, result):
+    """
+    Append an LLM classification to CLASSIFY_LOG_PATH (no-op when unset)
+    """
+    if not CLASSIFY_LOG_PATH:
+        return
+    record = {
+        "query": query,
+        "language": language,
+        "category": result["category"],
+        "raw_response": result["raw_response"],
+        "timestamp": result["timestamp"],
+    }
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    with _log_lock, open(CLASSIFY_LOG_PATH, "a", encoding="utf-8") as f:
+        f.write(line)
+
+
+def error_result(error):
+    return {
+        "success": False,
+        "error": error
+    }
+
+
+def parse_response(response):
+    """
+    Turn a chat completion into the JSON result returned by /api/classify
+    """
+    try:
+        if response.choices[0].message.tool_calls:
+            tool_call = response.choices[0].message.tool_calls[0]
+            return success_result(tool_call.function.arguments)
+        return error_result("No tool calls found in response")
+    except json.JSONDecodeError as e:
+        return error_result(f"JSON decode error: {e}")
+
+
+def validate_classify_payload(data):
+    """
+    Validate an /api/classify body.
+
+    Returns (query, language, error); error is None when the payload is valid.
+    """
+    if not isinstance(data, dict) or 'query' not in data:
+        return None, None, "No query provided"
+
+    query = data['query']
+    # An empty or missing language means English, as it always has
+    language = data.get('language') or 'English'
+
+    if not isinstance(query, str) or not query.strip():
+        return None, None, "Query cannot be empty"
+
+    if not isinstance(language, str):
+        return None, None, "Language must be a string"
+    language = language.strip() or 'English'
+
+    return query, language, None
+
+
+def validate_batch_payload(data):
+    """
+    Validate an /api/classify/batch body.
+
+    Accepts either a bare list of {query, language} items or
+    {"items": [...], "stream": bool}. Individual items are validated later
+    so one bad item becomes a per-item error instead of failing the batch.
+
+    Returns (items, stream, error); error is None when the payload is valid.
+    """
+    stream = False
+    if isinstance(data, dict):
+        stream = bool(data.get("stream", False))
+        data = data.get("items")
+
+    if not isinstance(data, list) or not data:
+        return None, stream, "No items provided"
+    if len(data) > BATCH_MAX_ITEMS:
+        return None, stream, f"Too many items: {len(data)} (max {BATCH_MAX_ITEMS})"
+
+    return data, stream, None
+
+
+def wants_ndjson(stream, accept_header):
+    return stream or NDJSON_MIMETYPE in (accept_header or "")
+
+
+def ndjson_line(index, result):
+    """
+    One streamed batch result; `index` is the item's position in the request
+    """
+    return json.dumps({"index": index, **result}, ensure_ascii=False) + "\n"
+
+
+class ToolArgumentsParser:
+    """
+    Incremental parser for streamed tool-call arguments.
+
+    The `chat` tool's arguments are a flat JSON object of string values that
+    arrives in arbitrary fragments. feed() returns (key, text, done) events:
+    decoded text for a string value as soon as it is available, and done=True
+    once the value's closing quote has been seen. Non-string values are
+    skipped without being decoded.
+    """
+
+    _WHITESPACE = " \t\r\n"
+
+    def __init__(self):
+        self.values = {}
+        self._state = "start"
+        self._buffer = []
+        self._key = None
+        self._escape = ""
+        self._depth = 0
+
+    def _decode_escape(self):
+        """
+        Decoded text for the pending escape, or None while it is incomplete
+        """
+        escape = self._escape
+        if len(escape) < 2 or (escape[1] == "u" and len(escape) < 6):
+            return None
+        if escape[1] == "u":
+            high = int(escape[2:6], 16)
+            # A UTF-16 high surrogate must be decoded together with its pair
+            if 0xD800 <= high < 0xDC00 and len(escape) < 12:
+                return None
+        return json.loads(f'"{escape}"')
+
+    def feed(self, fragment):
+        events = []
+        pending = []
+
+        def flush(done=False):
+            if pending or done:
+                text = "".join(pending)
+                self.values[self._key] += text
+                events.append((self._key, text, done))
+                pending.clear()
+
+        for ch in fragment:
+            state = self._state
+            if state == "string":
+                if self._escape:
+                    self._escape += ch
+                    decoded = self._decode_escape()
+                    if decoded is not None:
+                        pending.append(decoded)
+                        self._escape = ""
+                elif ch == "\\":
+                    self._escape = ch
+                elif ch == '"':
+                    flush(done=True)
+                    self._state = "comma_or_end"
+                else:
+                    pending.append(ch)
+            elif state == "key":
+                if self._escape:
+                    self._escape += ch
+                    decoded = self._decode_escape()
+                    if decoded is not None:
+                        self._buffer.append(decoded)
+                        self._escape = ""
+                elif ch == "\\":
+                    self._escape = ch
+                elif ch == '"':
+                    self._key = "".join(self._buffer)
+                    self._state = "colon"
+                else:
+                    self._buffer.append(ch)
+            elif state == "scalar":
+                if ch in "[{":
+                    self._depth += 1
+                elif ch in "]}" and self._depth:
+                    self._depth -= 1
+                elif ch in ",}" and not self._depth:
+                    self._state = "key_or_end" if ch == "," else "end"
+            elif ch in self._WHITESPACE:
+                continue
+            elif state == "start" and ch == "{":
+                self._state = "key_or_end"
+            elif state == "key_or_end" and ch == '"':
+                self._buffer = []
+                self._state = "key"
+            elif state in ("key_or_end", "comma_or_end") and ch == "}":
+                self._state = "end"
+            elif state == "colon" and ch == ":":
+                self._state = "value"
+            elif state == "value":
+                if ch == '"':
+                    self.values[self._key] = ""
+                    self._state = "string"
+                else:
+                    self._depth = 1 if ch in "[{" else 0
+                    self._state = "scalar"
+            elif state == "comma_or_end" and ch == ",":
+                self._state = "key_or_end"
+
+        if self._state == "string":
+            flush()
+        return events
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class ClassificationStream:
+    """
+    Turns streamed completion chunks into SSE events for /api/classify/stream:
+    `category` as soon as it is decoded, `content` deltas as they arrive, and
+    a final `done` (full result) or `error` event from finish().
+    """
+
+    def __init__(self):
+        self._parser = ToolArgumentsParser()
+        self._arguments = []
+
+    def feed(self, chunk):
+        # Azure sends chunks without choices (e.g. content filter results)
+        if not chunk.choices or not chunk.choices[0].delta.tool_calls:
+            return []
+        function = chunk.choices[0].delta.tool_calls[0].function
+        fragment = (function.arguments if function else None) or ""
+        self._arguments.append(fragment)
+
+        events = []
+        for key, text, done in self._parser.feed(fragment):
+            if key == "content" and text:
+                events.append(sse_event("content", {"delta": text}))
+            elif key == "category" and done:
+                events.append(sse_event("category", {"category": self._parser.values[key]}))
+        return events
+
+    def finish(self):
+        arguments = "".join(self._arguments)
+        if not arguments:
+            return error_result("No tool calls found in response")
+        try:
+            return success_result(arguments)
+        except json.JSONDecodeError as e:
+            return error_result(f"JSON decode error: {e}")
+
+
+def replay_events(result):
+    """
+    SSE events for a result that was available without streaming (cache/local)
+    """
+    return [
+        sse_event("category", {"category": result["category"]}),
+        sse_event("content", {"delta": result["content"]}),
+        sse_event("done", result),
+    ]
+
+
+def final_event(result):
+    return sse_event("done" if result["success"] else "error", result)
@@ -0,0 +1,106 @@
+"""
+Direct answers for questions that match a KB record almost verbatim.
+
+"What is the return policy?" does not need the model to pick a tool and
+then restate the record. DirectAnswer searches the KB, compares the user's
+question with the stored question of each hit, and above `threshold`
+answers from the record without any LLM call. Below it, it returns None and
+the caller takes the normal tool-calling path.
+
+Tune the threshold with eval_direct_answer.py.
+"""
+import math
+import os
+import re
+import threading
+import unicodedata
+
+from kb_search import tokenize
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]", re.UNICODE)
+
+
+def _trigrams(text):
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = " ".join(_PUNCTUATION_RE.sub(" ", text).split())
+    padded = f" {text} "
+    counts = {}
+    for i in range(len(padded) - 2):
+        gram = padded[i:i + 3]
+        counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+def question_similarity(a, b):
+    """
+    1.0 for the same question up to case, punctuation and spacing.
+
+    The lower of two scores: cosine of character trigram counts (robust to
+    typos and inflection, works for Chinese) and Dice overlap of the content
+    words. The word score is what keeps "cancel my order" away from
+    "track my order", which share most of their trigrams.
+    """
+    x, y = _trigrams(a), _trigrams(b)
+    dot = sum(count * y.get(gram, 0) for gram, count in x.items())
+    norm = math.sqrt(sum(c * c for c in x.values()) * sum(c * c for c in y.values()))
+    trigram = dot / norm if norm else 0.0
+    terms_a, terms_b = set(tokenize(a)), set(tokenize(b))
+    if not terms_a or not terms_b:
+        return trigram
+    return min(trigram, 2 * len(terms_a & terms_b) / (len(terms_a) + len(terms_b)))
+
+
+class DirectAnswer:
+    """
+    Pre-LLM matcher over anything with search(query, k) returning KB hits
+    (KnowledgeBase, ShardedIndex, BM25Index)
+    """
+
+    def __init__(self, kb, threshold=0.95, candidates=5):
+        self.kb = kb
+        self.threshold = threshold
+        self.candidates = candidates
+        self._lock = threading.Lock()
+        self._counters = {"answered": 0, "fell_through": 0}
+
+    def best_match(self, question):
+        """
+        (hit, similarity) of the KB question closest to `question`, or (None, 0.0)
+        """
+        best, best_similarity = None, 0.0
+        for hit in self.kb.search(question, k=self.candidates):
+            similarity = question_similarity(question, hit["question"])
+            if similarity > best_similarity:
+                best, best_similarity = hit, similarity
+        return best, best_similarity
+
+    def match(self, question):
+        """
+        (hit, similarity) when the question is close enough to answer
+        directly, otherwise None
+        """
+        hit, similarity = self.best_match(question)
+        answered = hit is not None and similarity >= self.threshold
+        with self._lock:
+            self._counters["answered" if answered else "fell_through"] += 1
+        return (hit, similarity) if answered else None
+
+    def stats(self):
+        with self._lock:
+            total = self._counters["answered"] + self._counters["fell_through"]
+            return {
+                **self._counters,
+                "threshold": self.threshold,
+                "shortcut_rate": round(self._counters["answered"] / total, 4) if total else 0.0,
+            }
+
+
+def create_direct_answer_from_env(kb):
+    """
+    DirectAnswer with KB_DIRECT_ANSWER_THRESHOLD, or None while it is unset
+    or 0 (the default; 0.95 is a good start)
+    """
+    threshold = float(os.getenv("KB_DIRECT_ANSWER_THRESHOLD", "0"))
+    if threshold <= 0:
+        return None
+    return DirectAnswer(kb, threshold)
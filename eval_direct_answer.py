@@ -0,0 +1,102 @@
+"""
+Tune the direct-answer threshold.
+
+Runs DirectAnswer over labelled questions and reports, per similarity
+threshold, how many questions would skip the LLM and how many of those
+shortcuts return the wrong record. Labels come from --labels (JSONL lines
+{"question": ..., "id": <record id or null>}) or, by default, are generated
+from the KB:
+
+    exact       a record's question with different casing/punctuation   -> that record
+    paraphrase  the same question with words dropped and reordered      -> that record
+    near miss   the question with one key word swapped for another      -> null
+    unrelated   questions the KB does not cover                         -> null
+
+A shortcut is only acceptable for exact matches, so for the generated set
+"wrong" counts any shortcut on a paraphrase or near miss that does not
+return the labelled record.
+
+    python eval_direct_answer.py --kb kb.json
+    python eval_direct_answer.py --synthetic 20000 --thresholds 0.7,0.8,0.85,0.9,0.95
+"""
+import argparse
+import json
+import random
+import time
+
+from bench_retrieval import paraphrase, synthetic_kb
+from direct_answer import DirectAnswer
+from kb_search import BM25Index, load_records
+
+UNRELATED = [
+    "What is the weather in Tokyo?",
+    "Who won the football match yesterday?",
+    "Can you write me a poem about autumn?",
+    "How tall is Mount Everest?",
+    "Translate good morning into French",
+    "明天北京天气怎么样？",
+]
+
+
+def _swap_word(question, rng, vocabulary):
+    words = question.rstrip("?").split()
+    candidates = [i for i, w in enumerate(words) if len(w) > 3]
+    i = rng.choice(candidates)
+    words[i] = rng.choice([w for w in vocabulary if w != words[i]])
+    return " ".join(words) + "?"
+
+
+def generate_examples(records, count, seed=0):
+    rng = random.Random(seed)
+    vocabulary = sorted({w for r in records for w in r["question"].rstrip("?").split() if len(w) > 3})
+    examples = []
+    for record in rng.sample(records, min(count, len(records))):
+        question = record["question"]
+        examples.append(("exact", question.lower().rstrip("?") + " ?", record["id"]))
+        examples.append(("paraphrase", paraphrase(record, rng), record["id"]))
+        examples.append(("near miss", _swap_word(question, rng, vocabulary), None))
+    examples += [("unrelated", q, None) for q in UNRELATED]
+    return examples
+
+
+def load_labels(path):
+    examples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                examples.append(("labelled", row["question"], row.get("id")))
+    return examples
+
+
+def evaluate(matcher, examples, thresholds):
+    start = time.perf_counter()
+    matches = [(kind, label, *matcher.best_match(question)) for kind, question, label in examples]
+    per_question_ms = (time.perf_counter() - start) / len(examples) * 1000
+    kinds = sorted({kind for kind, _, _, _ in matches})
+    print(f"Questions: {len(examples)} ({', '.join(f'{k}: {sum(m[0] == k for m in matches)}' for k in kinds)})   "
+          f"match: {per_question_ms:.2f} ms/question")
+    print("-" * 72)
+    print(f"{'threshold':>9}  {'shortcut':>9}  {'wrong':>7}  " + "  ".join(f"{k:>10}" for k in kinds))
+    for threshold in thresholds:
+        taken = [(kind, label, hit) for kind, label, hit, similarity in matches if hit and similarity >= threshold]
+        wrong = sum(hit["id"] != label for _, label, hit in taken)
+        per_kind = [sum(kind == k for kind, _, _ in taken) / max(1, sum(m[0] == k for m in matches)) for k in kinds]
+        print(f"{threshold:>9.2f}  {len(taken) / len(matches):>9.1%}  {wrong:>7}  "
+              + "  ".join(f"{rate:>10.1%}" for rate in per_kind))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kb", default="kb.json")
+    parser.add_argument("--synthetic", type=int, help="use a synthetic KB of this many records instead of --kb")
+    parser.add_argument("--labels", help="JSONL of {question, id} to evaluate instead of generated questions")
+    parser.add_argument("--questions", type=int, default=500, help="records to generate questions from")
+    parser.add_argument("--thresholds", default="0.6,0.7,0.8,0.85,0.9,0.95")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    records = synthetic_kb(args.synthetic) if args.synthetic else load_records(args.kb)
+    examples = load_labels(args.labels) if args.labels else generate_examples(records, args.questions, args.seed)
+    print(f"📚 {len(records)} KB records")
+    evaluate(DirectAnswer(BM25Index(records)), examples, [float(t) for t in args.thresholds.split(",")])
@@ -0,0 +1,61 @@
+"""
+Offline evaluation of the local fast-path classifier against LLM labels.
+
+Holds out part of the classification log, trains on the rest (or evaluates
+an existing --model on the whole log) and reports, per confidence threshold,
+how much traffic would be answered locally and how often those local answers
+agree with the LLM.
+
+    python eval_fast_classifier.py --log classify_log.jsonl
+"""
+import argparse
+import random
+import time
+
+from customer_care import CATEGORIES
+from fast_classifier import DEFAULT_DIM, FastClassifier, load_log, train_from_examples
+
+
+def evaluate(model, examples, thresholds):
+    predictions = []
+    start = time.perf_counter()
+    for query, language, _ in examples:
+        predictions.append(model.predict(query, language))
+    per_call_us = (time.perf_counter() - start) / len(examples) * 1e6
+
+    correct = sum(pred == label for (pred, _), (_, _, label) in zip(predictions, examples))
+    print(f"Examples: {len(examples)}   accuracy vs LLM (all): {correct / len(examples):.2%}   "
+          f"predict: {per_call_us:.1f} µs/ticket")
+    print("-" * 60)
+    print(f"{'threshold':>9}  {'offloaded':>9}  {'accuracy on offloaded':>22}")
+    for threshold in thresholds:
+        offloaded = [
+            pred == label
+            for (pred, confidence), (_, _, label) in zip(predictions, examples)
+            if confidence >= threshold
+        ]
+        accuracy = f"{sum(offloaded) / len(offloaded):.2%}" if offloaded else "-"
+        print(f"{threshold:>9.2f}  {len(offloaded) / len(examples):>9.2%}  {accuracy:>22}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", default="classify_log.jsonl")
+    parser.add_argument("--model", help="evaluate an existing model instead of training on a split")
+    parser.add_argument("--test-fraction", type=float, default=0.2)
+    parser.add_argument("--thresholds", default="0.5,0.6,0.7,0.8,0.9,0.95,0.99")
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    examples = load_log(args.log)
+    thresholds = [float(t) for t in args.thresholds.split(",")]
+
+    if args.model:
+        evaluate(FastClassifier.load(args.model), examples, thresholds)
+    else:
+        random.Random(args.seed).shuffle(examples)
+        split = int(len(examples) * (1 - args.test_fraction))
+        train, test = examples[:split], examples[split:]
+        print(f"📚 Training on {len(train)}, evaluating on {len(test)} held-out classifications")
+        evaluate(train_from_examples(train, CATEGORIES, dim=args.dim), test, thresholds)
@@ -0,0 +1,74 @@
+"""
+Check which weather queries the gazetteer answers offline.
+
+Each case is a query and the places resolve_all() must return, in order,
+or None when the query has to go to the model: unknown places, ambiguous
+names and qualified names ("Paris, Texas") must never be resolved to a
+partial or wrong set of cities. Prints every case and exits with status 1
+when any of them fails.
+
+    python eval_gazetteer.py
+    python eval_gazetteer.py --path my_gazetteer.tsv
+"""
+import argparse
+import sys
+import time
+
+from gazetteer import DEFAULT_PATH, Gazetteer
+
+CASES = [
+    # Every place is known: resolved offline, as written in CJK queries
+    ("今天的北京的天气如何?", ["北京"]),
+    ("香港和澳门今天天气怎么样?", ["香港", "澳门"]),
+    ("北京、上海和东京的天气怎么样？", ["北京", "上海", "东京"]),
+    ("東京の天気は？", ["東京"]),
+    ("서울 날씨 어때?", ["서울"]),
+    ("What's the weather like in New York today?", ["New York"]),
+    ("Weather in Tokyo, Paris and London?", ["Tokyo", "Paris", "London"]),
+    ("Beijing or Shanghai: which is warmer?", ["Beijing", "Shanghai"]),
+    ("Portland Oregon weather", ["Portland"]),
+    ("weather in paris, please", ["Paris"]),
+    ("weather in beijing and tokyo", ["Beijing", "Tokyo"]),
+    ("is it going to rain in london tomorrow", ["London"]),
+    # A place the table does not know: the model must see the whole query
+    ("Weather in Beijing and Timbuktu", None),
+    ("Compare Tokyo with Kyoto and Nara", None),
+    ("from London to Cambridge", None),
+    ("北京和喀什的天气怎么样", None),
+    # ... also when written in lowercase, as voice input usually is
+    ("weather in beijing and timbuktu", None),
+    ("compare tokyo with kyoto and nara", None),
+    ("what's the weather like in london, ontario", None),
+    ("比较东京、京都和奈良的天气", None),
+    # Qualified or ambiguous names
+    ("weather in Paris, Texas", None),
+    ("Is it raining in Paris, France?", None),
+    ("How is the weather in Portland?", None),
+    ("Springfield weather", None),
+    # No place at all
+    ("What's the weather like?", None),
+]
+
+
+def evaluate(gazetteer, cases):
+    failures = 0
+    start = time.perf_counter()
+    for query, expected in cases:
+        matches = gazetteer.resolve_all(query)
+        got = [m.label for m in matches] if matches is not None else None
+        ok = got == expected
+        failures += not ok
+        uncovered = gazetteer.uncovered(query, gazetteer.find(query)) if matches is None else None
+        note = f"  (not in the table: {uncovered!r})" if uncovered else ""
+        print(f"{'✅' if ok else '❌'} {query!r:<52} -> {got}{'' if ok else f', expected {expected}'}{note}")
+    per_query_ms = (time.perf_counter() - start) / len(cases) * 1000
+    print(f"{len(cases) - failures}/{len(cases)} cases passed, {per_query_ms:.2f} ms per query")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=DEFAULT_PATH, help="gazetteer TSV")
+    args = parser.parse_args()
+
+    sys.exit(1 if evaluate(Gazetteer(args.path), CASES) else 0)
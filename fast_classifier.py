@@ -0,0 +1,220 @@
+"""
+Local fast-path ticket classifier.
+
+A softmax linear model over hashed n-gram features, trained from the
+classifications the LLM already produced (the JSONL log written when
+CLASSIFY_LOG_PATH is set). At serving time it answers in microseconds; the
+apps only trust it above a confidence threshold and fall through to the LLM
+otherwise.
+
+    python fast_classifier.py train --log classify_log.jsonl --out fast_classifier.npz
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from customer_care import CATEGORIES, local_result
+
+DEFAULT_DIM = 2 ** 18
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokens(text, language="English"):
+    """
+    Word unigrams/bigrams plus character trigrams (which also cover Chinese,
+    where there are no spaces), and the language as its own feature
+    """
+    text = " ".join(text.casefold().split())
+    words = _WORD_RE.findall(text)
+    features = [f"w:{w}" for w in words]
+    features += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    padded = f" {text} "
+    features += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    features.append(f"lang:{language.lower()}")
+    return features
+
+
+def featurize(text, language="English", dim=DEFAULT_DIM):
+    """
+    Hashed, L2-normalized sparse features as (indices, values)
+    """
+    counts = {}
+    for feature in tokens(text, language):
+        index = zlib.crc32(feature.encode("utf-8")) % dim
+        counts[index] = counts.get(index, 0.0) + 1.0
+    indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    values /= np.linalg.norm(values) or 1.0
+    return indices, values
+
+
+def _stack(samples):
+    """
+    Concatenate per-sample sparse features into flat arrays + row ids
+    """
+    indices = np.concatenate([s[0] for s in samples])
+    values = np.concatenate([s[1] for s in samples])
+    rows = np.repeat(np.arange(len(samples)), [len(s[0]) for s in samples])
+    return indices, values, rows
+
+
+class FastClassifier:
+    def __init__(self, categories, dim=DEFAULT_DIM, weights=None, bias=None):
+        self.categories = list(categories)
+        self.dim = dim
+        self.weights = weights if weights is not None else np.zeros((dim, len(self.categories)), np.float32)
+        self.bias = bias if bias is not None else np.zeros(len(self.categories), np.float32)
+
+    def _scores(self, indices, values, rows, n):
+        scores = np.zeros((n, len(self.categories)), np.float32)
+        np.add.at(scores, rows, self.weights[indices] * values[:, None])
+        return scores + self.bias
+
+    @staticmethod
+    def _softmax(scores):
+        scores = scores - scores.max(axis=1, keepdims=True)
+        exp = np.exp(scores)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def fit(self, texts, languages, labels, epochs=200, learning_rate=2.0, l2=1e-4):
+        """
+        Full-batch gradient descent on the cross-entropy loss
+        """
+        samples = [featurize(t, l, self.dim) for t, l in zip(texts, languages)]
+        indices, values, rows = _stack(samples)
+        n = len(samples)
+        y = np.zeros((n, len(self.categories)), np.float32)
+        y[np.arange(n), [self.categories.index(label) for label in labels]] = 1.0
+
+        for _ in range(epochs):
+            probs = self._softmax(self._scores(indices, values, rows, n))
+            delta = (probs - y) / n
+            grad = np.zeros_like(self.weights)
+            np.add.at(grad, indices, values[:, None] * delta[rows])
+            self.weights -= learning_rate * (grad + l2 * self.weights)
+            self.bias -= learning_rate * delta.sum(axis=0)
+        return self
+
+    def predict_proba(self, text, language="English"):
+        indices, values = featurize(text, language, self.dim)
+        scores = values @ self.weights[indices] + self.bias
+        return self._softmax(scores[None, :])[0]
+
+    def predict(self, text, language="English"):
+        """
+        Returns (category, confidence)
+        """
+        probs = self.predict_proba(text, language)
+        best = int(probs.argmax())
+        return self.categories[best], float(probs[best])
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez_compressed(
+                f,
+                weights=self.weights,
+                bias=self.bias,
+                categories=np.array(self.categories),
+                dim=np.array(self.dim),
+            )
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(
+            categories=[str(c) for c in data["categories"]],
+            dim=int(data["dim"]),
+            weights=data["weights"],
+            bias=data["bias"],
+        )
+
+
+def load_log(path):
+    """
+    Read (query, language, category) examples from a classification log.
+
+    The label comes from the logged `raw_response`, i.e. what the LLM's tool
+    call actually returned.
+    """
+    examples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            try:
+                category = json.loads(record["raw_response"])["category"]
+            except (KeyError, TypeError, json.JSONDecodeError):
+                continue
+            examples.append((record["query"], record.get("language", "English"), category))
+    return examples
+
+
+def train_from_examples(examples, categories, dim=DEFAULT_DIM, epochs=200):
+    texts, languages, labels = zip(*examples)
+    return FastClassifier(categories, dim=dim).fit(texts, languages, labels, epochs=epochs)
+
+
+class FastPath:
+    """
+    Serving-time wrapper: answers locally above `threshold`, otherwise
+    returns None so the caller falls through to the LLM
+    """
+
+    def __init__(self, model, threshold=0.9):
+        self.model = model
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._counters = {"answered": 0, "fell_through": 0}
+
+    def classify(self, query, language="English"):
+        category, confidence = self.model.predict(query, language)
+        answered = confidence >= self.threshold
+        with self._lock:
+            self._counters["answered" if answered else "fell_through"] += 1
+        if not answered:
+            return None
+        return local_result(category, confidence, language)
+
+    def stats(self):
+        with self._lock:
+            total = self._counters["answered"] + self._counters["fell_through"]
+            return {
+                **self._counters,
+                "threshold": self.threshold,
+                "offload_ratio": round(self._counters["answered"] / total, 4) if total else 0.0,
+            }
+
+
+def create_fast_path_from_env():
+    """
+    FastPath from FAST_CLASSIFIER_MODEL / FAST_CLASSIFIER_THRESHOLD, or None
+    """
+    path = os.getenv("FAST_CLASSIFIER_MODEL")
+    if not path:
+        return None
+    threshold = float(os.getenv("FAST_CLASSIFIER_THRESHOLD", "0.9"))
+    return FastPath(FastClassifier.load(path), threshold)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the local fast-path classifier")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train = subparsers.add_parser("train", help="train from a classification log")
+    train.add_argument("--log", default="classify_log.jsonl")
+    train.add_argument("--out", default="fast_classifier.npz")
+    train.add_argument("--dim", type=int, default=DEFAULT_DIM)
+    train.add_argument("--epochs", type=int, default=200)
+    args = parser.parse_args()
+
+    examples = load_log(args.log)
+    print(f"📚 Training on {len(examples)} logged classifications...")
+    model = train_from_examples(examples, CATEGORIES, dim=args.dim, epochs=args.epochs)
+    model.save(args.out)
+    print(f"✅ Saved model to {args.out}")
@@ -0,0 +1,283 @@
+"""
+Offline gazetteer: city coordinates without an LLM round trip.
+
+The weather flow used to force a get_weather tool call just so the model
+could write down the latitude/longitude of "北京" or "Shanghai". Well-known
+cities are constants. This module looks them up in gazetteer.tsv, a
+compact table of world cities with Chinese, Japanese, Korean and local
+names, and leaves only unknown or ambiguous locations to the model.
+
+The table is read on first use. Names are indexed twice:
+
+- a dict from normalised name to places, for exact lookups
+- a sorted list of names, for prefix lookups by bisection
+
+find() spots the names mentioned in free text. CJK text has no spaces, so
+it is matched by substring against the CJK names, longest first. Other
+scripts are matched on runs of up to four words.
+
+resolve_all() only answers when the matches cover every place the query
+could be naming. A word that is neither a match nor an ordinary query
+word ("Timbuktu", "nara", whatever its case), CJK text left over once the
+matches and common query words are removed, or a match followed by a
+comma qualifier ("Paris, Texas") sends the query to the model instead.
+
+    gazetteer = Gazetteer()
+    gazetteer.resolve("今天的北京的天气如何?")
+    -> Match(text="北京", places=[Place(name="Beijing", ...)])
+"""
+import bisect
+import os
+import re
+import threading
+import unicodedata
+from typing import NamedTuple
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gazetteer.tsv")
+
+_WORD_RE = re.compile(r"[^\W_]+(?:['’.-][^\W_]+)*", re.UNICODE)
+_CJK_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]")
+_CJK_RUN_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]+")
+MAX_WORDS = 4
+# A name shared by several places resolves to the biggest one only when it
+# is this many times bigger than the next (Paris, not Paris, Texas)
+DOMINANCE = 10
+# Names that are also everyday words only count when written capitalised
+COMMON_WORDS = frozenset(["nice", "rio", "lima", "perth", "reading", "mobile", "bath", "split", "vegas"])
+# Words a weather query uses around place names. Any other word, in any case
+# (voice input is often all lowercase), may be a place the table does not know.
+QUERY_WORDS = frozenset("""
+    a about am an and any are as at be between both but by can check colder compare comparing could current currently
+    day days degrees do does for forecast from get give hello hey hi hot hotter how how's humidity i i'm in
+    is it it's its like me morning afternoon evening night now of ok okay on or please rain raining right
+    show snow sunny tell temperature temperatures than thanks the there this to today tomorrow tonight
+    versus vs warm warmer warmest was weather weekend what what's whats which will wind windy with would you
+    cold cloudy humid nice going gonna expected know let let's look looks my need out outside see should
+    so umbrella up wear we week
+    monday tuesday wednesday thursday friday saturday sunday celsius fahrenheit
+""".split())
+# Same for CJK queries; removed from the text left over after matching
+CJK_QUERY_WORDS = sorted("""
+    今天 明天 后天 昨天 现在 目前 当前 今日 明日 今晚 周末 早上 上午 下午 晚上 天气 气温 温度 湿度 风速 预报 情况
+    怎么样 怎样 如何 怎么 多少 哪个 哪里 哪儿 还是 比较 对比 相比 一下 看看 查询 告诉 知道 以及 还有 或者 暖和 凉快
+    下雨 下雪 天氣 氣溫 溫度 濕度 預報 現在 怎麼樣 怎麼 比較 還是 告訴
+    的 和 与 跟 及 或 更 最 热 冷 暖 会 晴 阴 吗 呢 吧 啊 呀 请 帮 我 查 想 那 这 里 度 是 在 个 熱 會 與 嗎 請 這 個
+    天気 気温 今日 明日 どう です ですか 教えて の は と か を
+    날씨 오늘 내일 기온 어때 어때요 알려줘 의 와 과 은 는
+""".split(), key=len, reverse=True)
+_CJK_QUERY_WORDS_RE = re.compile("|".join(map(re.escape, CJK_QUERY_WORDS)))
+_QUALIFIER_RE = re.compile(r"\s*,\s*([^\W\d_]+)")
+
+
+class Place(NamedTuple):
+    name: str
+    country: str
+    latitude: float
+    longitude: float
+    population: int
+
+
+class Match(NamedTuple):
+    text: str  # as written in the query
+    start: int
+    end: int
+    places: tuple
+
+    @property
+    def place(self):
+        """
+        The place meant, or None when the name is ambiguous
+        """
+        if len(self.places) == 1:
+            return self.places[0]
+        first, second = sorted(self.places, key=lambda p: -p.population)[:2]
+        return first if first.population >= DOMINANCE * second.population else None
+
+    @property
+    def label(self):
+        """
+        How to name the place in a reply: as the user wrote it, unless that
+        was a Latin-script spelling, then the canonical name
+        """
+        return self.text if _CJK_RE.search(self.text) else self.place.name
+
+
+def _fold(word):
+    word = unicodedata.normalize("NFKD", unicodedata.normalize("NFKC", word).casefold())
+    return "".join(c for c in word if not unicodedata.combining(c)).replace("’", "'")
+
+
+def normalize_name(text):
+    """
+    Index key of a name: case-folded words without accents or punctuation
+    """
+    text = unicodedata.normalize("NFKC", text)
+    if _CJK_RE.search(text):
+        return "".join(text.split())
+    return " ".join(_fold(word) for word in _WORD_RE.findall(text))
+
+
+class Gazetteer:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._places = None
+        self._index = None  # normalised name -> tuple of places
+        self._sorted = None  # sorted normalised names, for prefix lookups
+        self._display = None  # normalised name -> name as written in the table
+        self._cjk_lengths = None  # lengths of CJK names, longest first
+        self._counters = {"lookups": 0, "resolved": 0, "ambiguous": 0, "uncovered": 0, "not_found": 0}
+
+    def _load(self):
+        with self._lock:
+            if self._index is not None:
+                return
+            places, index, display = [], {}, {}
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip() or line.startswith("#"):
+                        continue
+                    name, country, latitude, longitude, population, aliases = line.rstrip("\n").split("\t")
+                    place = Place(name, country, float(latitude), float(longitude), int(population))
+                    places.append(place)
+                    for alias in [name] + [a for a in aliases.split("|") if a]:
+                        key = normalize_name(alias)
+                        if place not in index.setdefault(key, []):
+                            index[key].append(place)
+                        display.setdefault(key, alias)
+            self._places = places
+            self._display = display
+            self._sorted = sorted(index)
+            self._cjk_lengths = sorted({len(k) for k in index if _CJK_RE.search(k)}, reverse=True)
+            self._index = {key: tuple(value) for key, value in index.items()}
+
+    def __len__(self):
+        self._load()
+        return len(self._places)
+
+    def lookup(self, name):
+        """
+        Places called exactly `name` (any listed spelling), biggest first
+        """
+        self._load()
+        return sorted(self._index.get(normalize_name(name), ()), key=lambda p: -p.population)
+
+    def complete(self, prefix, limit=10):
+        """
+        [(name, place)] for names starting with `prefix`, e.g. for autocomplete
+        """
+        self._load()
+        key = normalize_name(prefix)
+        if not key:
+            return []
+        results = []
+        for i in range(bisect.bisect_left(self._sorted, key), len(self._sorted)):
+            name = self._sorted[i]
+            if not name.startswith(key) or len(results) >= limit:
+                break
+            results.extend((self._display[name], place) for place in self._index[name])
+        return results[:limit]
+
+    def _candidates(self, text):
+        for run in _CJK_RUN_RE.finditer(text):
+            for length in self._cjk_lengths:
+                for start in range(run.start(), run.end() - length + 1):
+                    places = self._index.get(text[start:start + length])
+                    if places:
+                        yield Match(text[start:start + length], start, start + length, places)
+
+        words = [w for w in _WORD_RE.finditer(text) if not _CJK_RE.search(w.group())]
+        for n in range(min(MAX_WORDS, len(words)), 0, -1):
+            for i in range(len(words) - n + 1):
+                span = words[i:i + n]
+                key = " ".join(_fold(w.group()) for w in span)
+                places = self._index.get(key)
+                if not places:
+                    continue
+                written = text[span[0].start():span[-1].end()]
+                if (key in COMMON_WORDS or len(key) <= 3) and not written[0].isupper():
+                    continue
+                yield Match(written, span[0].start(), span[-1].end(), places)
+
+    def find(self, text):
+        """
+        Place names mentioned in `text`, longest first, never overlapping,
+        returned in the order they appear
+        """
+        self._load()
+        text = unicodedata.normalize("NFKC", text)
+        taken, matches = set(), []
+        for match in sorted(self._candidates(text), key=lambda m: -(m.end - m.start)):
+            span = set(range(match.start, match.end))
+            if span & taken:
+                continue
+            taken |= span
+            matches.append(match)
+        return sorted(matches, key=lambda m: m.start)
+
+    def uncovered(self, text, matches):
+        """
+        What in `text` might be a place that `matches` (from find()) do not
+        cover, or None
+        """
+        text = unicodedata.normalize("NFKC", text)
+        covered = set()
+        for match in matches:
+            covered.update(range(match.start, match.end))
+            qualifier = _QUALIFIER_RE.match(text, match.end)
+            if qualifier and qualifier.start(1) not in covered and _fold(qualifier.group(1)) not in QUERY_WORDS:
+                if not any(m.start == qualifier.start(1) for m in matches):
+                    return text[match.start:qualifier.end()]
+        for word in _WORD_RE.finditer(text):
+            if word.start() in covered or _CJK_RE.search(word.group()):
+                continue
+            if not word.group().isdigit() and _fold(word.group()) not in QUERY_WORDS:
+                return word.group()
+        leftover = "".join(" " if i in covered else c for i, c in enumerate(text))
+        for run in _CJK_RUN_RE.finditer(_CJK_QUERY_WORDS_RE.sub(" ", leftover)):
+            return run.group()
+        return None
+
+    def resolve_all(self, text):
+        """
+        One Match per place mentioned in `text`, in order, when every name
+        is unambiguous and nothing else in the text could be a place;
+        None means "ask the model"
+        """
+        matches = self.find(text)
+        with self._lock:
+            self._counters["lookups"] += 1
+            if not matches:
+                self._counters["not_found"] += 1
+                return None
+            if any(match.place is None for match in matches):
+                self._counters["ambiguous"] += 1
+                return None
+        if self.uncovered(text, matches) is not None:
+            with self._lock:
+                self._counters["uncovered"] += 1
+            return None
+        with self._lock:
+            self._counters["resolved"] += 1
+        seen = set()
+        return [m for m in matches if not (m.place in seen or seen.add(m.place))]
+
+    def resolve(self, text):
+        """
+        The Match when `text` mentions exactly one place, else None
+        """
+        matches = self.resolve_all(text)
+        return matches[0] if matches is not None and len(matches) == 1 else None
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, "places": len(self._places) if self._places is not None else None}
+
+
+def create_gazetteer_from_env():
+    """
+    Gazetteer over WEATHER_GAZETTEER_PATH, or None with WEATHER_GAZETTEER=false
+    """
+    if os.getenv("WEATHER_GAZETTEER", "true").lower() != "true":
+        return None
+    return Gazetteer(os.getenv("WEATHER_GAZETTEER_PATH", DEFAULT_PATH))
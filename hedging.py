@@ -0,0 +1,252 @@
+"""
+Hedged requests for tail latency.
+
+If a completion has not returned by the recent p95 (LLM_HEDGE_PERCENTILE) of
+that call's latency, a duplicate is sent and whichever succeeds first wins.
+With a pooled client (LLM_BACKENDS) the duplicate goes to a different backend,
+otherwise to LLM_HEDGE_DEPLOYMENT when set, else to the same deployment.
+
+HedgedClient / AsyncHedgedClient wrap any client from llm_clients and hedge
+non-streaming `...create(...)` / `...parse(...)` calls; everything else is
+passed straight through.
+"""
+import asyncio
+import bisect
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import reduce
+
+HEDGED_METHODS = ("create", "parse")
+
+
+class Hedger:
+    """
+    Per-call-type latency windows and the race between primary and hedge.
+
+    Latency samples are kept per key (method path and model), since a
+    classification and a long structured-output call have nothing in common.
+    No hedge is sent until `min_samples` latencies have been seen for a key.
+
+    Samples are the time the caller waited, measured from the start of the
+    call, so a hedge that wins counts its delay too. A cancelled loser is
+    recorded as the time it had run so far, a lower bound of its latency;
+    leaving it out would hide exactly the slow calls hedging is for.
+    """
+
+    def __init__(self, percentile=95.0, min_delay_ms=100.0, window=500, min_samples=20, max_workers=64):
+        self.percentile = percentile
+        self.min_delay = min_delay_ms / 1000
+        self.window = window
+        self.min_samples = min_samples
+        self._samples = {}  # key -> (deque in arrival order, sorted list)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+        self._counters = {"calls": 0, "hedges_fired": 0, "hedges_won": 0, "losers_cancelled": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def record(self, key, latency):
+        with self._lock:
+            recent, ordered = self._samples.setdefault(key, (deque(), []))
+            recent.append(latency)
+            bisect.insort(ordered, latency)
+            if len(recent) > self.window:
+                ordered.pop(bisect.bisect_left(ordered, recent.popleft()))
+
+    def delay(self, key):
+        """
+        Seconds to wait before hedging, None while there are too few samples
+        """
+        with self._lock:
+            _, ordered = self._samples.get(key, ((), []))
+            if len(ordered) < self.min_samples:
+                return None
+            index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+            return max(self.min_delay, ordered[index])
+
+    def reset_stats(self):
+        """
+        Zero the counters (latency samples are kept), e.g. after a warm-up
+        """
+        with self._lock:
+            self._counters = dict.fromkeys(self._counters, 0)
+
+    def _timed(self, key, fn, start):
+        result = fn()
+        self.record(key, time.monotonic() - start)
+        return result
+
+    async def _timed_async(self, key, fn, start):
+        result = await fn()
+        self.record(key, time.monotonic() - start)
+        return result
+
+    def call(self, key, primary, hedge):
+        """
+        Run primary(); if it is still running after delay(key), also run
+        hedge() and return the first successful result. A losing thread
+        cannot be interrupted, so its result is simply discarded.
+        """
+        self._count("calls")
+        start = time.monotonic()
+        delay = self.delay(key)
+        first = self._executor.submit(self._timed, key, primary, start)
+        if delay is None or wait([first], timeout=delay).done:
+            return first.result()
+
+        self._count("hedges_fired")
+        second = self._executor.submit(self._timed, key, hedge, start)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self._count("hedges_won")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def call_async(self, key, primary, hedge):
+        """
+        Same race for coroutines; the loser is cancelled, which aborts its
+        HTTP request
+        """
+        self._count("calls")
+        start = time.monotonic()
+        delay = self.delay(key)
+        first = asyncio.ensure_future(self._timed_async(key, primary, start))
+        if delay is None:
+            return await first
+
+        pending = {first}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return first.result()
+
+            self._count("hedges_fired")
+            second = asyncio.ensure_future(self._timed_async(key, hedge, start))
+            pending = {first, second}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self._count("hedges_won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                if not task.done():
+                    task.cancel()
+                    self._count("losers_cancelled")
+                    # Censored sample: the loser took at least this long
+                    self.record(key, time.monotonic() - start)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            keys = list(self._samples)
+        deadlines = {}
+        for key in keys:
+            delay = self.delay(key)
+            deadlines["/".join(key)] = round(delay * 1000, 1) if delay is not None else None
+        return {
+            "percentile": self.percentile,
+            **counters,
+            "hedge_rate": round(counters["hedges_fired"] / counters["calls"], 4) if counters["calls"] else 0.0,
+            "deadline_ms": deadlines,
+        }
+
+
+class _HedgedRoute:
+    def __init__(self, owner, path):
+        self._owner = owner
+        self._path = path
+
+    def __getattr__(self, name):
+        return _HedgedRoute(self._owner, self._path + (name,))
+
+    def __call__(self, *args, **kwargs):
+        return self._owner._invoke(self._path, args, kwargs)
+
+
+class HedgedClient:
+    """
+    Wraps an AzureOpenAI or PooledClient and hedges its completion calls
+    """
+
+    def __init__(self, client, hedger, hedge_model=None):
+        self.client = client
+        self.hedger = hedger
+        self.hedge_model = hedge_model
+        self.pool = getattr(client, "pool", None)
+
+    def __getattr__(self, name):
+        return _HedgedRoute(self, (name,))
+
+    def _calls(self, path, args, kwargs):
+        """
+        (primary, hedge) zero-argument callables for one request
+        """
+        if self.pool is not None:
+            # Backends are picked when each side actually starts, so the
+            # pool sees current load; the hedge avoids the primary's backend
+            chosen = []
+
+            def primary():
+                chosen.append(self.pool.pick())
+                return self.pool_call(path, *args, backend=chosen[0], **kwargs)
+
+            def hedge():
+                return self.pool_call(path, *args, backend=self.pool.pick(exclude=chosen), **kwargs)
+
+            return primary, hedge
+        method = reduce(getattr, path, self.client)
+        hedge_kwargs = {**kwargs, "model": self.hedge_model} if self.hedge_model else kwargs
+        return lambda: method(*args, **kwargs), lambda: method(*args, **hedge_kwargs)
+
+    @property
+    def pool_call(self):
+        return self.pool.call
+
+    def _invoke(self, path, args, kwargs):
+        if path[-1] not in HEDGED_METHODS or kwargs.get("stream"):
+            return reduce(getattr, path, self.client)(*args, **kwargs)
+        key = (".".join(path), str(kwargs.get("model", "")))
+        return self.hedger.call(key, *self._calls(path, args, kwargs))
+
+
+class AsyncHedgedClient(HedgedClient):
+    @property
+    def pool_call(self):
+        return self.pool.call_async
+
+    def _invoke(self, path, args, kwargs):
+        if path[-1] not in HEDGED_METHODS or kwargs.get("stream"):
+            return reduce(getattr, path, self.client)(*args, **kwargs)
+        key = (".".join(path), str(kwargs.get("model", "")))
+        return self.hedger.call_async(key, *self._calls(path, args, kwargs))
+
+
+def create_hedger_from_env():
+    """
+    Hedger configured from LLM_HEDGE_* variables, or None when LLM_HEDGE is
+    not enabled
+    """
+    if os.getenv("LLM_HEDGE", "false").lower() != "true":
+        return None
+    return Hedger(
+        percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "95")),
+        min_delay_ms=float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "100")),
+        window=int(os.getenv("LLM_HEDGE_WINDOW", "500")),
+    )
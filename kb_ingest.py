@@ -0,0 +1,185 @@
+"""
+Streaming ingestion of very large knowledge bases into sharded on-disk indexes.
+
+Records are read one at a time (JSONL or the kb.json shape) and indexed in
+shards of --shard-size records, so memory stays bounded by one shard however
+big the export is. Each shard directory entry holds:
+
+    shard-0000.records.jsonl   the records, one per line
+    shard-0000.offsets.npy     byte offset of every line
+    shard-0000.bm25*           BM25 postings (kb_search.BM25Index.save)
+    shard-0000.vectors.npy     embeddings, when built with --vectors
+
+ShardedIndex memory-maps all of it and searches every shard, merging the
+per-shard top-k; records are only read for the hits returned.
+
+    python kb_ingest.py build export.jsonl --out kb_index --shard-size 50000
+    python kb_ingest.py search kb_index "how do I return an item?"
+"""
+import argparse
+import json
+import mmap
+import os
+
+import numpy as np
+
+import kb_vectors
+from kb_search import BM25Index, iter_records, search_result
+
+MANIFEST = "manifest.json"
+
+
+class RecordFile:
+    """
+    Read-only, memory-mapped JSONL of one shard's records, indexable by row
+    """
+
+    def __init__(self, prefix):
+        self.offsets = np.load(f"{prefix}.offsets.npy", mmap_mode="r")
+        with open(f"{prefix}.records.jsonl", "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b""
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        return json.loads(self._map[self.offsets[row]:self.offsets[row + 1]])
+
+    @staticmethod
+    def write(prefix, records):
+        offsets = [0]
+        with open(f"{prefix}.records.jsonl", "wb") as f:
+            for record in records:
+                line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+                f.write(line)
+                offsets.append(offsets[-1] + len(line))
+        np.save(f"{prefix}.offsets.npy", np.asarray(offsets, dtype=np.int64))
+
+
+def _shards(records, size):
+    shard = []
+    for record in records:
+        shard.append(record)
+        if len(shard) == size:
+            yield shard
+            shard = []
+    if shard:
+        yield shard
+
+
+def ingest(source, directory, shard_size=50000, embedder=None, dtype="float32"):
+    """
+    Stream `source` into sharded indexes under `directory`; returns the manifest
+    """
+    os.makedirs(directory, exist_ok=True)
+    shards = []
+    for number, records in enumerate(_shards(iter_records(source), shard_size)):
+        name = f"shard-{number:04d}"
+        prefix = os.path.join(directory, name)
+        RecordFile.write(prefix, records)
+        BM25Index(records).save(prefix)
+        if embedder is not None:
+            matrix, scales = kb_vectors.encode(kb_vectors.embed_records(records, embedder), dtype)
+            kb_vectors.save(prefix, records, matrix, scales, embedder, dtype)
+        shards.append({"name": name, "count": len(records)})
+        print(f"📦 {name}: {len(records)} records")
+
+    manifest = {
+        "source": os.path.abspath(source),
+        "records": sum(s["count"] for s in shards),
+        "shards": shards,
+        "embedder": embedder.name if embedder is not None else None,
+        "dtype": dtype,
+    }
+    with open(os.path.join(directory, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+class ShardedIndex:
+    """
+    Search across the shards written by ingest(). Supports the same modes
+    as KnowledgeBase; vector and hybrid need the embedder used at ingest.
+    """
+
+    def __init__(self, directory, mode="bm25", embedder=None):
+        with open(os.path.join(directory, MANIFEST), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        # Shards are immutable until the next ingest rewrites the manifest
+        self.version = f"{os.stat(os.path.join(directory, MANIFEST)).st_mtime_ns:x}"
+        if mode != "bm25" and (embedder is None or embedder.name != self.manifest["embedder"]):
+            raise ValueError(f"mode {mode!r} needs the embedder the index was built with ({self.manifest['embedder']})")
+        self.mode = mode
+        self.embedder = embedder
+        self.shards = []
+        for shard in self.manifest["shards"]:
+            prefix = os.path.join(directory, shard["name"])
+            records = RecordFile(prefix)
+            vectors = None
+            if mode != "bm25":
+                matrix = np.load(f"{prefix}.vectors.npy", mmap_mode="r")
+                scales = np.load(f"{prefix}.scales.npy") if self.manifest["dtype"] == "int8" else None
+                vectors = kb_vectors.VectorIndex(records, matrix, scales, embedder)
+            self.shards.append((BM25Index.load(prefix, records), vectors))
+
+    def __len__(self):
+        return self.manifest["records"]
+
+    def _ranking(self, mode, query, n):
+        """
+        Best n (record, score) across all shards
+        """
+        query_vector = self.embedder.embed([query]) if mode == "vector" else None
+        hits = []
+        for bm25, vectors in self.shards:
+            if mode == "bm25":
+                hits.extend((bm25.records, row, score) for row, score in bm25.top_k(query, n))
+            else:
+                hits.extend((vectors.records, row, score) for row, score in vectors.top_k_batch(query_vector, n)[0])
+        hits.sort(key=lambda hit: -hit[2])
+        return [(records[row], score) for records, row, score in hits[:n]]
+
+    def search(self, query, k=3):
+        if self.mode != "hybrid":
+            return [search_result(record, score) for record, score in self._ranking(self.mode, query, k)]
+
+        records = {}
+        rankings = []
+        for mode in ("bm25", "vector"):
+            ranking = self._ranking(mode, query, max(20, k))
+            records.update((record["id"], record) for record, _ in ranking)
+            rankings.append([record["id"] for record, _ in ranking])
+        return [search_result(records[i], score) for i, score in kb_vectors.reciprocal_rank_fusion(rankings, k)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="stream a KB export into a sharded index")
+    build.add_argument("source", help="JSONL export or a kb.json-shaped file")
+    build.add_argument("--out", default="kb_index")
+    build.add_argument("--shard-size", type=int, default=50000)
+    build.add_argument("--vectors", action="store_true", help="also build vector shards (KB_EMBEDDER)")
+    build.add_argument("--dtype", choices=["float32", "int8"], default="float32")
+    search = commands.add_parser("search", help="query a sharded index")
+    search.add_argument("directory")
+    search.add_argument("query")
+    search.add_argument("-k", type=int, default=3)
+    search.add_argument("--mode", choices=["bm25", "vector", "hybrid"], default="bm25")
+    args = parser.parse_args()
+
+    embedder = None
+    if getattr(args, "vectors", False) or getattr(args, "mode", "bm25") != "bm25":
+        client = None
+        if os.getenv("KB_EMBEDDER", "hashing").lower() == "azure":
+            from llm_clients import create_client
+
+            client = create_client()
+        embedder = kb_vectors.create_embedder_from_env(client)
+
+    if args.command == "build":
+        manifest = ingest(args.source, args.out, args.shard_size, embedder, args.dtype)
+        print(f"✅ {manifest['records']} records in {len(manifest['shards'])} shards -> {args.out}")
+    else:
+        index = ShardedIndex(args.directory, args.mode, embedder)
+        print(json.dumps(index.search(args.query, args.k), ensure_ascii=False, indent=2))
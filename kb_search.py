@@ -0,0 +1,229 @@
+"""
+Keyword retrieval over the knowledge base (kb.json).
+
+BM25Index is an in-memory inverted index built once at load time. Postings
+are stored as flat NumPy arrays (CSR layout: one slice of doc ids and term
+frequencies per term), so a query only touches the postings of its own terms
+and never the records themselves.
+
+    index = BM25Index.from_file("kb.json")
+    index.search("how do I return an item?", k=3)
+    -> [{"id": 1, "question": ..., "answer": ..., "score": 7.41}, ...]
+"""
+import json
+import re
+from array import array
+
+import numpy as np
+
+_WORD_RE = re.compile(r"[^\W_]+", re.UNICODE)
+_SEPARATOR_RE = re.compile(r"[\s,]*")
+_CJK_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in is it me my of on or our "
+    "so that the this to was what when where which who why will with you your".split()
+)
+
+
+def _stem(word):
+    # Just enough to match "returns" with "return" and "policies" with "policy"
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    """
+    Case-folded, stemmed words without stopwords. Chinese/Japanese/Korean
+    runs have no spaces, so they become character unigrams and bigrams.
+    """
+    terms = []
+    for word in _WORD_RE.findall(text.casefold()):
+        if _CJK_RE.search(word):
+            terms.extend(word)
+            terms.extend(word[i:i + 2] for i in range(len(word) - 1))
+        elif word not in STOPWORDS:
+            terms.append(_stem(word))
+    return terms
+
+
+def search_result(record, score):
+    """
+    A hit as handed to the model: the record plus its score
+    """
+    return {
+        "id": record["id"],
+        "question": record["question"],
+        "answer": record["answer"],
+        "score": round(score, 4),
+    }
+
+
+def _iter_json_records(f, chunk_size=1 << 16):
+    """
+    Records of a {"records": [...]} document, decoded one at a time from
+    fixed-size reads instead of json.load-ing the whole file
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos = "", -1
+    while pos < 0:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            raise ValueError('no "records" array found')
+        buffer += chunk
+        key = buffer.find('"records"')
+        if key >= 0:
+            pos = buffer.find("[", key)
+    pos += 1
+    while True:
+        match = _SEPARATOR_RE.match(buffer, pos)
+        pos = match.end()
+        if buffer.startswith("]", pos):
+            return
+        try:
+            record, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                raise
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        yield record
+
+
+def iter_records(path):
+    """
+    Stream KB records from JSONL (one record per line) or from the
+    kb.json {"records": [...]} shape, without loading the whole file
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from _iter_json_records(f)
+
+
+def load_records(path):
+    return list(iter_records(path))
+
+
+class BM25Index:
+    """
+    Okapi BM25 over question + answer. Question terms count
+    `question_weight` times, since they are what customers paraphrase.
+    """
+
+    def __init__(self, records, k1=1.2, b=0.75, question_weight=2.0):
+        self.records = records
+        self.k1 = k1
+        self.b = b
+        self.question_weight = question_weight
+        self._build()
+
+    @classmethod
+    def from_file(cls, path, **options):
+        return cls(load_records(path), **options)
+
+    def _build(self):
+        vocabulary = {}
+        term_ids, doc_ids, freqs = array("q"), array("i"), array("f")
+        lengths = np.zeros(len(self.records), dtype=np.float32)
+        for doc, record in enumerate(self.records):
+            counts = {}
+            for term in tokenize(record.get("question", "")):
+                counts[term] = counts.get(term, 0.0) + self.question_weight
+            for term in tokenize(record.get("answer", "")):
+                counts[term] = counts.get(term, 0.0) + 1.0
+            for term, count in counts.items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                doc_ids.append(doc)
+                freqs.append(count)
+            lengths[doc] = sum(counts.values())
+
+        term_ids = np.frombuffer(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids, kind="stable")
+        self.vocabulary = vocabulary
+        self.doc_ids = np.frombuffer(doc_ids, dtype=np.int32)[order]
+        self.freqs = np.frombuffer(freqs, dtype=np.float32)[order]
+        self.offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)), out=self.offsets[1:])
+
+        n = len(self.records)
+        df = np.diff(self.offsets).astype(np.float32)
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        # Per-document length normalisation, precomputed once
+        avg_length = float(lengths.mean()) if n else 0.0
+        self.norms = (self.k1 * (1 - self.b + self.b * lengths / (avg_length or 1.0))).astype(np.float32)
+
+    _ARRAYS = ("doc_ids", "freqs", "offsets", "idf", "norms")
+
+    def save(self, prefix):
+        """
+        Write the postings as .npy files plus the vocabulary, so the index
+        can be reopened with load() without touching the records
+        """
+        for name in self._ARRAYS:
+            np.save(f"{prefix}.bm25-{name}.npy", getattr(self, name))
+        with open(f"{prefix}.bm25.json", "w", encoding="utf-8") as f:
+            json.dump({
+                "k1": self.k1,
+                "b": self.b,
+                "question_weight": self.question_weight,
+                "terms": sorted(self.vocabulary, key=self.vocabulary.get),
+            }, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, prefix, records):
+        """
+        Reopen a saved index with memory-mapped postings. `records` only
+        needs len() and indexing, e.g. a lazily-read record file.
+        """
+        with open(f"{prefix}.bm25.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls.__new__(cls)
+        index.records = records
+        index.k1, index.b, index.question_weight = meta["k1"], meta["b"], meta["question_weight"]
+        index.vocabulary = {term: i for i, term in enumerate(meta["terms"])}
+        for name in cls._ARRAYS:
+            setattr(index, name, np.load(f"{prefix}.bm25-{name}.npy", mmap_mode="r"))
+        return index
+
+    def __len__(self):
+        return len(self.records)
+
+    def scores(self, query):
+        """
+        BM25 score of every document for the query (zero when nothing matches)
+        """
+        scores = np.zeros(len(self.records), dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs, tf = self.doc_ids[start:end], self.freqs[start:end]
+            scores[docs] += self.idf[term_id] * tf * (self.k1 + 1) / (tf + self.norms[docs])
+        return scores
+
+    def top_k(self, query, k=3):
+        """
+        [(record index, score)] of the best k matches, best first
+        """
+        scores = self.scores(query)
+        k = min(k, int(np.count_nonzero(scores)))
+        if k <= 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(int(i), float(scores[i])) for i in best]
+
+    def search(self, query, k=3):
+        """
+        Top-k records (id, question, answer) with their scores
+        """
+        return [search_result(self.records[i], score) for i, score in self.top_k(query, k)]
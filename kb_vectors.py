@@ -0,0 +1,328 @@
+"""
+Dense-vector retrieval over the knowledge base.
+
+Each record is embedded once and the matrix is saved next to the KB as a
+NumPy file (float32, or int8 with one scale per row) plus a small JSON
+sidecar. Loading memory-maps the matrix, so startup does not re-embed or
+even read the whole file; search is a chunked matrix product and top-k.
+
+Embedders share one interface, `embed(texts) -> float32 array (n, dim)`
+with L2-normalized rows:
+    HashingEmbedder  local and offline (hashed word and character n-grams)
+    AzureEmbedder    an Azure OpenAI embeddings deployment
+
+    index = load_or_build(records, HashingEmbedder(), "kb")
+    index.search("can I send it back?", k=3)
+"""
+import hashlib
+import json
+import os
+import threading
+import zlib
+
+import numpy as np
+
+from kb_search import search_result, tokenize
+
+CHUNK_ROWS = 16384
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+class HashingEmbedder:
+    """
+    Signed feature hashing of words and character trigrams. Much weaker
+    than a learned embedding, but deterministic, instant and offline.
+    """
+
+    def __init__(self, dim=512, max_cached_features=1 << 20):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+        # Feature -> packed column and weight (see _hash). KB text repeats the same
+        # features a lot; once full, new (query) features are hashed on the
+        # fly instead of growing the cache. search_kb runs on several
+        # threads, so inserts take the lock.
+        self.max_cached_features = max_cached_features
+        self._features_cache = {}
+        self._lock = threading.Lock()
+
+    def _hash(self, feature):
+        """
+        column * 4 + 2 for word features (weight 2 rather than 1, word
+        features carry more meaning than single trigrams) + 1 for a
+        negative sign; one int per feature keeps embed() vectorized
+        """
+        h = zlib.crc32(feature.encode("utf-8"))
+        return (h % self.dim) * 4 + (2 if feature.startswith("w:") else 0) + (0 if h & 0x80000000 else 1)
+
+    def _feature(self, feature):
+        hashed = self._hash(feature)
+        if len(self._features_cache) < self.max_cached_features:
+            with self._lock:
+                if len(self._features_cache) < self.max_cached_features:
+                    self._features_cache[feature] = hashed
+        return hashed
+
+    def _features(self, text):
+        text = " ".join(text.casefold().split())
+        features = [f"w:{t}" for t in tokenize(text)]
+        padded = f" {text} "
+        features += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+        return features
+
+    def embed(self, texts):
+        cache = self._features_cache
+        hashed, counts = [], []
+        for text in texts:
+            features = self._features(text)
+            hashed.extend([cache[f] if f in cache else self._feature(f) for f in features])
+            counts.append(len(features))
+        hashed = np.asarray(hashed, dtype=np.int64)
+        rows = np.repeat(np.arange(len(texts), dtype=np.int64), counts)
+        cells = rows * self.dim + (hashed >> 2)
+        weights = np.where(hashed & 2, 2.0, 1.0) * np.where(hashed & 1, -1.0, 1.0)
+        vectors = np.bincount(cells, weights=weights, minlength=len(texts) * self.dim)
+        return _normalize(vectors.reshape(len(texts), self.dim))
+
+
+class AzureEmbedder:
+    """
+    Embeddings from an Azure OpenAI deployment (e.g. text-embedding-3-small)
+    """
+
+    def __init__(self, client, deployment, batch_size=64):
+        self.client = client
+        self.deployment = deployment
+        self.batch_size = batch_size
+        self.name = f"azure-{deployment}"
+
+    def embed(self, texts):
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            response = self.client.embeddings.create(model=self.deployment, input=texts[start:start + self.batch_size])
+            vectors.extend(item.embedding for item in sorted(response.data, key=lambda d: d.index))
+        return _normalize(np.asarray(vectors, dtype=np.float32))
+
+
+def record_text(record):
+    return f"{record.get('question', '')}\n{record.get('answer', '')}"
+
+
+def record_hash(record):
+    """
+    Content hash of one record (id included), used to spot edited records
+    """
+    raw = json.dumps(record, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def quantize(vectors):
+    """
+    Symmetric per-row int8 quantization: vectors ~= q * scale[:, None]
+    """
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    q = np.round(vectors / scales[:, None]).astype(np.int8)
+    return q, scales.astype(np.float32)
+
+
+def encode(vectors, dtype="float32"):
+    """
+    (matrix, scales) in the storage dtype; scales is None for float32
+    """
+    if dtype == "int8":
+        return quantize(vectors)
+    return vectors.astype(np.float32, copy=False), None
+
+
+def embed_records(records, embedder, batch_size=1024):
+    vectors = None
+    for start in range(0, len(records), batch_size):
+        batch = embedder.embed([record_text(r) for r in records[start:start + batch_size]])
+        if vectors is None:
+            vectors = np.zeros((len(records), batch.shape[1]), dtype=np.float32)
+        vectors[start:start + len(batch)] = batch
+    if vectors is None:
+        vectors = np.zeros((0, getattr(embedder, "dim", 1)), dtype=np.float32)
+    return vectors
+
+
+class VectorIndex:
+    def __init__(self, records, matrix, scales=None, embedder=None):
+        self.records = records
+        self.matrix = matrix
+        self.scales = scales
+        self.embedder = embedder
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def scores_batch(self, queries):
+        """
+        Cosine similarity of every record to each query row, computed in
+        chunks so an int8 or memory-mapped matrix is never fully expanded
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        scores = np.empty((queries.shape[0], len(self)), dtype=np.float32)
+        for start in range(0, len(self), CHUNK_ROWS):
+            chunk = np.asarray(self.matrix[start:start + CHUNK_ROWS], dtype=np.float32)
+            block = queries @ chunk.T
+            if self.scales is not None:
+                block *= self.scales[start:start + CHUNK_ROWS]
+            scores[:, start:start + CHUNK_ROWS] = block
+        return scores
+
+    def top_k_batch(self, queries, k=3):
+        """
+        [[(record index, score)], ...] for each query vector, best first
+        """
+        scores = self.scores_batch(queries)
+        k = min(k, len(self))
+        if k <= 0:
+            return [[] for _ in range(len(scores))]
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in zip(scores, best):
+            candidates = candidates[np.argsort(-row[candidates], kind="stable")]
+            results.append([(int(i), float(row[i])) for i in candidates])
+        return results
+
+    def top_k(self, query, k=3):
+        return self.top_k_batch(self.embedder.embed([query]), k)[0]
+
+    def search(self, query, k=3):
+        """
+        Top-k records (id, question, answer) with cosine scores
+        """
+        return [search_result(self.records[i], score) for i, score in self.top_k(query, k)]
+
+
+def _paths(base):
+    return f"{base}.vectors.npy", f"{base}.scales.npy", f"{base}.vectors.json"
+
+
+def _save_array(path, array):
+    # Write aside and rename, so an index memory-mapping the old file keeps working
+    with open(f"{path}.tmp", "wb") as f:
+        np.save(f, array)
+    os.replace(f"{path}.tmp", path)
+
+
+def save(base, records, matrix, scales, embedder, dtype="float32"):
+    """
+    Write the index files for `base`; the sidecar keeps one content hash per
+    row so a later load can tell which records changed
+    """
+    vectors_path, scales_path, meta_path = _paths(base)
+    _save_array(vectors_path, matrix)
+    if scales is not None:
+        _save_array(scales_path, scales)
+    elif os.path.exists(scales_path):
+        os.remove(scales_path)
+    with open(f"{meta_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump({
+            "embedder": embedder.name,
+            "dtype": dtype,
+            "count": len(records),
+            "dim": int(matrix.shape[1]),
+            "hashes": [record_hash(r) for r in records],
+        }, f)
+    os.replace(f"{meta_path}.tmp", meta_path)
+
+
+def build(records, embedder, base, dtype="float32"):
+    """
+    Embed every record and write the index files for `base`
+    """
+    matrix, scales = encode(embed_records(records, embedder), dtype)
+    save(base, records, matrix, scales, embedder, dtype)
+    return VectorIndex(records, matrix, scales, embedder)
+
+
+def _read(base, embedder, dtype):
+    """
+    (meta, memory-mapped matrix, scales) of a stored index built with this
+    embedder and dtype, or None
+    """
+    vectors_path, scales_path, meta_path = _paths(base)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if (meta.get("embedder"), meta.get("dtype")) != (embedder.name, dtype) or "hashes" not in meta:
+            return None
+        matrix = np.load(vectors_path, mmap_mode="r")
+        scales = np.load(scales_path) if dtype == "int8" else None
+    except (OSError, ValueError):
+        return None
+    return meta, matrix, scales
+
+
+def load(records, embedder, base, dtype="float32"):
+    """
+    Memory-map an existing index, or None if it is missing or was built
+    from different records, a different embedder or dtype
+    """
+    stored = _read(base, embedder, dtype)
+    if stored is None or stored[0]["hashes"] != [record_hash(r) for r in records]:
+        return None
+    _, matrix, scales = stored
+    return VectorIndex(records, matrix, scales, embedder)
+
+
+def load_or_build(records, embedder, base, dtype="float32"):
+    """
+    Memory-map the stored index when it is current. Otherwise reuse the rows
+    of unchanged records and embed only new or edited ones.
+    """
+    stored = _read(base, embedder, dtype)
+    if stored is None:
+        return build(records, embedder, base, dtype)
+    meta, matrix, scales = stored
+    hashes = [record_hash(r) for r in records]
+    if hashes == meta["hashes"]:
+        return VectorIndex(records, matrix, scales, embedder)
+
+    previous = {h: row for row, h in enumerate(meta["hashes"])}
+    new_matrix = np.empty((len(records), matrix.shape[1]), dtype=matrix.dtype)
+    new_scales = np.empty(len(records), dtype=np.float32) if scales is not None else None
+    reused = [(i, previous[h]) for i, h in enumerate(hashes) if h in previous]
+    if reused:
+        target, source = (np.array(rows) for rows in zip(*reused))
+        new_matrix[target] = matrix[source]
+        if scales is not None:
+            new_scales[target] = scales[source]
+    missing = [i for i, h in enumerate(hashes) if h not in previous]
+    if missing:
+        embedded, embedded_scales = encode(embed_records([records[i] for i in missing], embedder), dtype)
+        new_matrix[missing] = embedded
+        if scales is not None:
+            new_scales[missing] = embedded_scales
+    del matrix
+    save(base, records, new_matrix, new_scales, embedder, dtype)
+    return VectorIndex(records, new_matrix, new_scales, embedder)
+
+
+def reciprocal_rank_fusion(rankings, k=3, rrf_k=60):
+    """
+    Merge several rankings (lists of keys, best first) into the top k
+    (key, score): keyword hits stay on top, and paraphrases BM25 misses
+    still come through from the vector ranking
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(fused.items(), key=lambda item: -item[1])[:k]
+
+
+def create_embedder_from_env(client=None):
+    """
+    KB_EMBEDDER=hashing (default) or azure, using KB_EMBEDDING_DEPLOYMENT
+    """
+    if os.getenv("KB_EMBEDDER", "hashing").lower() == "azure":
+        return AzureEmbedder(client, os.getenv("KB_EMBEDDING_DEPLOYMENT", "text-embedding-3-small"))
+    return HashingEmbedder(int(os.getenv("KB_EMBEDDING_DIM", "512")))
@@ -0,0 +1,258 @@
+"""
+Live knowledge base behind search_kb: indexes that follow kb.json edits.
+
+The indexes are kept as immutable segments. Each segment holds a BM25 index,
+an optional vector index, and an "alive" mask for its records. When the file
+changes (size/mtime), records are diffed by id and content hash:
+
+- deleted or edited records are masked out of the segment that holds them
+- new and edited records go into a new small segment; only these are embedded
+- when there are too many segments or too many dead rows, the segments are
+  compacted into one. The BM25 index is rebuilt, but vectors are copied
+  rather than re-embedded.
+
+Every change produces a new snapshot (tuple of segments) that replaces the
+old one with a single reference assignment, so a query running during a
+refresh keeps using the complete snapshot it started with.
+"""
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+
+import kb_vectors
+from kb_search import BM25Index, load_records, search_result
+
+SEARCH_MODES = ("bm25", "vector", "hybrid")
+
+
+class Segment:
+    def __init__(self, records, bm25, vectors=None, alive=None):
+        self.records = records
+        self.bm25 = bm25
+        self.vectors = vectors
+        self.alive = alive if alive is not None else np.ones(len(records), dtype=bool)
+
+    def without(self, rows):
+        """
+        Copy of this segment with `rows` masked out (indexes are shared)
+        """
+        alive = self.alive.copy()
+        alive[rows] = False
+        return Segment(self.records, self.bm25, self.vectors, alive)
+
+    @property
+    def live_count(self):
+        return int(self.alive.sum())
+
+
+class _Snapshot:
+    def __init__(self, segments, hashes):
+        self.segments = tuple(segments)
+        self.hashes = hashes  # record id -> content hash
+        # Changes whenever any record does; for cache keys
+        self.version = hashlib.sha256(
+            "\n".join(f"{i}:{h}" for i, h in sorted(hashes.items(), key=lambda item: str(item[0]))).encode("utf-8")
+        ).hexdigest()[:16]
+        # record id -> (segment number, row) for live records
+        self.locations = {
+            segment.records[row]["id"]: (number, row)
+            for number, segment in enumerate(self.segments)
+            for row in np.flatnonzero(segment.alive)
+        }
+
+
+class KnowledgeBase:
+    """
+    Search over kb.json that picks up edits with refresh() (or watch())
+    without rebuilding from scratch
+    """
+
+    def __init__(self, path, mode="bm25", embedder=None, vector_dtype="float32", max_segments=8, max_dead=0.25):
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"mode must be one of {SEARCH_MODES}")
+        if mode != "bm25" and embedder is None:
+            raise ValueError(f"mode {mode!r} needs an embedder")
+        self.path = path
+        self.mode = mode
+        self.embedder = embedder
+        self.vector_dtype = vector_dtype
+        self.vector_base = os.path.splitext(path)[0]
+        self.max_segments = max_segments
+        self.max_dead = max_dead
+        self._lock = threading.Lock()  # one writer; readers never take it
+        self._counters = {"refreshes": 0, "added": 0, "updated": 0, "deleted": 0, "compactions": 0}
+        self._last_refresh_ms = None
+        self._last_error = None
+
+        self._stamp = self._file_stamp()
+        records = load_records(path)
+        vectors = None
+        if self.mode != "bm25":
+            vectors = kb_vectors.load_or_build(records, embedder, self.vector_base, vector_dtype)
+        self._snapshot = _Snapshot(
+            [Segment(records, BM25Index(records), vectors)],
+            {r["id"]: kb_vectors.record_hash(r) for r in records},
+        )
+
+    def _file_stamp(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    @property
+    def version(self):
+        """
+        Content hash of the live records; changes with every applied edit
+        """
+        return self._snapshot.version
+
+    def record_hash(self, record_id):
+        """
+        Content hash of a live record, None if it does not exist
+        """
+        return self._snapshot.hashes.get(record_id)
+
+    # -- search --
+
+    def _ranking(self, snapshot, mode, query, n):
+        """
+        Best n live (record, score) across all segments
+        """
+        query_vector = self.embedder.embed([query]) if mode == "vector" else None
+        hits = []
+        for segment in snapshot.segments:
+            if mode == "bm25":
+                scores = segment.bm25.scores(query)
+                rows = np.flatnonzero(segment.alive & (scores > 0))
+            else:
+                scores = segment.vectors.scores_batch(query_vector)[0]
+                rows = np.flatnonzero(segment.alive)
+            if len(rows) > n:
+                rows = rows[np.argpartition(-scores[rows], n - 1)[:n]]
+            hits.extend((segment.records[row], float(scores[row])) for row in rows)
+        hits.sort(key=lambda hit: -hit[1])
+        return hits[:n]
+
+    def search(self, query, k=3):
+        """
+        Top-k live records (id, question, answer, score), best first
+        """
+        snapshot = self._snapshot
+        if self.mode != "hybrid":
+            return [search_result(record, score) for record, score in self._ranking(snapshot, self.mode, query, k)]
+
+        pool = max(20, k)
+        records = {}
+        rankings = []
+        for mode in ("bm25", "vector"):
+            ranking = self._ranking(snapshot, mode, query, pool)
+            records.update((record["id"], record) for record, _ in ranking)
+            rankings.append([record["id"] for record, _ in ranking])
+        return [search_result(records[i], score) for i, score in kb_vectors.reciprocal_rank_fusion(rankings, k)]
+
+    # -- updates --
+
+    def _segment(self, records):
+        vectors = None
+        if self.mode != "bm25":
+            matrix, scales = kb_vectors.encode(kb_vectors.embed_records(records, self.embedder), self.vector_dtype)
+            vectors = kb_vectors.VectorIndex(records, matrix, scales, self.embedder)
+        return Segment(records, BM25Index(records), vectors)
+
+    def refresh(self, force=False):
+        """
+        Apply the changes in the KB file since the last refresh. Returns
+        True if the indexes changed.
+        """
+        with self._lock:
+            stamp = self._file_stamp()
+            if stamp == self._stamp and not force:
+                return False
+            start = time.monotonic()
+            records = load_records(self.path)
+            old = self._snapshot
+            hashes = {r["id"]: kb_vectors.record_hash(r) for r in records}
+            changed = [r for r in records if old.hashes.get(r["id"]) != hashes[r["id"]]]
+            deleted = [i for i in old.hashes if i not in hashes]
+            self._stamp = stamp
+            if not changed and not deleted:
+                return False
+
+            # Mask out the old versions of edited records and the deleted ones
+            dead_rows = {}
+            for record_id in [r["id"] for r in changed] + deleted:
+                if record_id in old.locations:
+                    number, row = old.locations[record_id]
+                    dead_rows.setdefault(number, []).append(row)
+            segments = [
+                segment.without(dead_rows[number]) if number in dead_rows else segment
+                for number, segment in enumerate(old.segments)
+            ]
+            segments = [segment for segment in segments if segment.live_count]
+            if changed:
+                segments.append(self._segment(changed))
+            if self._needs_compaction(segments):
+                segments = [self._compact(segments)]
+
+            self._snapshot = _Snapshot(segments, hashes)
+            updated = sum(r["id"] in old.hashes for r in changed)
+            self._counters["refreshes"] += 1
+            self._counters["added"] += len(changed) - updated
+            self._counters["updated"] += updated
+            self._counters["deleted"] += len(deleted)
+            self._last_refresh_ms = round((time.monotonic() - start) * 1000, 1)
+            return True
+
+    def _needs_compaction(self, segments):
+        total = sum(len(segment.records) for segment in segments)
+        live = sum(segment.live_count for segment in segments)
+        return len(segments) > self.max_segments or (total and (total - live) / total > self.max_dead)
+
+    def _compact(self, segments):
+        """
+        One segment with every live record; vectors are copied, not re-embedded
+        """
+        records = [segment.records[row] for segment in segments for row in np.flatnonzero(segment.alive)]
+        vectors = None
+        if self.mode != "bm25":
+            matrix = np.concatenate([np.asarray(s.vectors.matrix[s.alive]) for s in segments])
+            scales = None
+            if self.vector_dtype == "int8":
+                scales = np.concatenate([s.vectors.scales[s.alive] for s in segments])
+            kb_vectors.save(self.vector_base, records, matrix, scales, self.embedder, self.vector_dtype)
+            vectors = kb_vectors.VectorIndex(records, matrix, scales, self.embedder)
+        self._counters["compactions"] += 1
+        return Segment(records, BM25Index(records), vectors)
+
+    def watch(self, interval=2.0):
+        """
+        Poll the KB file every `interval` seconds in a daemon thread
+        """
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.refresh()
+                    self._last_error = None
+                except Exception as e:
+                    # A half-written file or bad JSON: keep serving the last good snapshot
+                    self._last_error = str(e)
+
+        thread = threading.Thread(target=loop, daemon=True, name="kb-watch")
+        thread.start()
+        return thread
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "mode": self.mode,
+            "version": snapshot.version,
+            "records": len(snapshot.locations),
+            "segments": len(snapshot.segments),
+            "dead_rows": sum(len(s.records) - s.live_count for s in snapshot.segments),
+            **self._counters,
+            "last_refresh_ms": self._last_refresh_ms,
+            "last_error": self._last_error,
+        }
@@ -0,0 +1,177 @@
+"""
+Azure OpenAI client construction shared by the apps and scripts.
+
+Connection pooling is configured here so that every caller gets keep-alive
+connections sized from the environment instead of the SDK defaults.
+"""
+import os
+
+import httpx
+from openai import AsyncAzureOpenAI, AzureOpenAI
+
+from hedging import AsyncHedgedClient, HedgedClient, create_hedger_from_env
+from llm_pool import AsyncPooledClient, PooledClient, create_pool, load_backends_from_env
+from rate_governor import AsyncGovernedTransport, GovernedTransport, create_registry_from_env
+
+API_VERSION = "2025-01-01-preview"
+
+# Process-wide rate governors (LLM_GOVERNOR=true), shared by every client.
+# Built on first use so scripts can load .env after importing this module.
+_governors = None
+_governors_loaded = False
+_hedger = None
+_hedger_loaded = False
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, default))
+
+
+def azure_settings():
+    """
+    Endpoint, deployment and key from the environment
+    """
+    return {
+        "endpoint": os.getenv("ENDPOINT_URL", "https://ai-<endpoint>.openai.azure.com/"),
+        "deployment": os.getenv("DEPLOYMENT_NAME", "gpt-4"),
+        "api_key": os.getenv("AZURE_API_KEY"),
+    }
+
+
+def http_limits():
+    """
+    Connection pool limits for the underlying httpx client.
+
+    LLM_MAX_CONNECTIONS caps concurrent sockets per process; it should be at
+    least the number of in-flight calls you expect, otherwise requests queue
+    inside httpx waiting for a free connection.
+    """
+    return httpx.Limits(
+        max_connections=_env_int("LLM_MAX_CONNECTIONS", 100),
+        max_keepalive_connections=_env_int("LLM_MAX_KEEPALIVE_CONNECTIONS", 20),
+        keepalive_expiry=_env_float("LLM_KEEPALIVE_EXPIRY", 30.0),
+    )
+
+
+def http_timeout():
+    return httpx.Timeout(
+        _env_float("LLM_TIMEOUT", 60.0),
+        connect=_env_float("LLM_CONNECT_TIMEOUT", 5.0),
+    )
+
+
+def governors():
+    global _governors, _governors_loaded
+    if not _governors_loaded:
+        _governors = create_registry_from_env()
+        _governors_loaded = True
+    return _governors
+
+
+def _http_client():
+    transport = httpx.HTTPTransport(limits=http_limits())
+    if governors() is not None:
+        transport = GovernedTransport(governors(), transport)
+    return httpx.Client(transport=transport, timeout=http_timeout())
+
+
+def _async_http_client():
+    transport = httpx.AsyncHTTPTransport(limits=http_limits())
+    if governors() is not None:
+        transport = AsyncGovernedTransport(governors(), transport)
+    return httpx.AsyncClient(transport=transport, timeout=http_timeout())
+
+
+def hedger():
+    global _hedger, _hedger_loaded
+    if not _hedger_loaded:
+        _hedger = create_hedger_from_env()
+        _hedger_loaded = True
+    return _hedger
+
+
+def _hedged(client, wrapper):
+    if hedger() is None:
+        return client
+    return wrapper(client, hedger(), hedge_model=os.getenv("LLM_HEDGE_DEPLOYMENT") or None)
+
+
+def governor_stats():
+    """
+    Queue depth, wait time and throttling per deployment (None when disabled)
+    """
+    return governors().stats() if governors() is not None else None
+
+
+def create_client(endpoint=None, api_key=None, **kwargs):
+    """
+    Synchronous AzureOpenAI client with a pooled keep-alive http client.
+
+    When LLM_BACKENDS is configured this returns a PooledClient routing each
+    call to the fastest healthy backend instead; endpoint is then ignored and
+    the `model` of each call is replaced by the backend's deployment.
+    With LLM_HEDGE=true the client is wrapped in a HedgedClient.
+    """
+    settings = azure_settings()
+    backends = load_backends_from_env()
+    if backends:
+        factory = lambda url, key: AzureOpenAI(
+            azure_endpoint=url, api_key=key, api_version=API_VERSION, http_client=_http_client(), **kwargs
+        )
+        client = PooledClient(create_pool(backends, factory, api_key or settings["api_key"]))
+        return _hedged(client, HedgedClient)
+
+    client = AzureOpenAI(
+        azure_endpoint=endpoint or settings["endpoint"],
+        api_key=api_key or settings["api_key"],
+        api_version=API_VERSION,
+        http_client=_http_client(),
+        **kwargs,
+    )
+    return _hedged(client, HedgedClient)
+
+
+def create_async_client(endpoint=None, api_key=None, **kwargs):
+    """
+    AsyncAzureOpenAI client with a pooled keep-alive http client.
+
+    Create it once per event loop and share it: the pool is what lets one
+    process keep hundreds of classifications in flight over a few sockets.
+    Returns an AsyncPooledClient when LLM_BACKENDS is configured.
+    """
+    settings = azure_settings()
+    backends = load_backends_from_env()
+    if backends:
+        factory = lambda url, key: AsyncAzureOpenAI(
+            azure_endpoint=url, api_key=key, api_version=API_VERSION, http_client=_async_http_client(), **kwargs
+        )
+        client = AsyncPooledClient(create_pool(backends, factory, api_key or settings["api_key"]))
+        return _hedged(client, AsyncHedgedClient)
+
+    client = AsyncAzureOpenAI(
+        azure_endpoint=endpoint or settings["endpoint"],
+        api_key=api_key or settings["api_key"],
+        api_version=API_VERSION,
+        http_client=_async_http_client(),
+        **kwargs,
+    )
+    return _hedged(client, AsyncHedgedClient)
+
+
+def hedge_stats():
+    """
+    Hedges fired/won and current deadlines (None when disabled)
+    """
+    return hedger().stats() if hedger() is not None else None
+
+
+def backend_stats(client):
+    """
+    Per-backend routing stats for a pooled client, None for a plain client
+    """
+    pool = getattr(client, "pool", None)
+    return pool.stats() if pool is not None else None
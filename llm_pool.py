@@ -0,0 +1,277 @@
+"""
+Latency-aware routing across several Azure OpenAI endpoints/deployments.
+
+BackendPool tracks an EWMA of latency and error rate per backend, sends each
+call to the backend with the best weighted score, and temporarily ejects
+backends that keep failing. PooledClient / AsyncPooledClient expose the same
+`client.chat.completions.create(...)` / `client.beta.chat.completions.parse(...)`
+surface as AzureOpenAI, so existing call sites keep working; the `model`
+argument is replaced by the chosen backend's deployment.
+
+Configure with LLM_BACKENDS (JSON) or LLM_BACKENDS_FILE (path to JSON):
+    [{"endpoint": "https://eastus2.../", "deployment": "gpt-4.1", "weight": 2},
+     {"endpoint": "https://swedencentral.../", "deployment": "gpt-4.1", "api_key": "..."}]
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from functools import reduce
+
+import openai
+
+EWMA_ALPHA = 0.2
+EXPLORE_PROBABILITY = 0.05
+EJECT_AFTER_FAILURES = 3
+EJECT_BASE_SECONDS = 10.0
+EJECT_MAX_SECONDS = 300.0
+# A failed call counts as this many times the slowest healthy backend's
+# latency (FAILURE_LATENCY_SECONDS while none is measured), so a backend
+# that only fails never looks fast
+FAILURE_LATENCY_FACTOR = 4.0
+FAILURE_LATENCY_SECONDS = 2.0
+
+
+def is_backend_failure(error):
+    """
+    Errors that say something about the backend (and are worth retrying
+    elsewhere), as opposed to a bad request from the caller
+    """
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+class Backend:
+    def __init__(self, endpoint, deployment, client, weight=1.0):
+        self.endpoint = endpoint
+        self.deployment = deployment
+        self.client = client
+        self.weight = weight
+        self.latency = None  # EWMA seconds; None until the first sample
+        self.error_rate = 0.0
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+    @property
+    def name(self):
+        return f"{self.endpoint.rstrip('/')}/{self.deployment}"
+
+    def score(self):
+        """
+        Lower is better: expected latency, inflated by queueing and errors,
+        divided by weight. Unmeasured backends score 0 so they get tried;
+        pick() sends them one probe at a time.
+        """
+        if self.latency is None:
+            return 0.0
+        return self.latency * (1 + self.in_flight) * (1 + 4 * self.error_rate) / self.weight
+
+
+class BackendPool:
+    def __init__(self, backends, max_failover=1):
+        self.backends = backends
+        self.max_failover = max_failover
+        self._lock = threading.Lock()
+
+    def pick(self, exclude=()):
+        with self._lock:
+            now = time.monotonic()
+            candidates = [b for b in self.backends if b not in exclude and b.ejected_until <= now]
+            if not candidates:
+                # Everything is ejected: use whichever comes back first
+                remaining = [b for b in self.backends if b not in exclude] or self.backends
+                candidates = [min(remaining, key=lambda b: b.ejected_until)]
+            # Until its first result, a backend gets one probe at a time
+            ready = [b for b in candidates if b.latency is not None or b.in_flight == 0] or candidates
+            if len(ready) > 1 and random.random() < EXPLORE_PROBABILITY:
+                backend = random.choices(ready, weights=[b.weight for b in ready])[0]
+            else:
+                backend = min(ready, key=lambda b: (b.score(), b.in_flight))
+            backend.in_flight += 1
+            return backend
+
+    def record(self, backend, latency, failed):
+        with self._lock:
+            backend.in_flight -= 1
+            backend.requests += 1
+            backend.error_rate += EWMA_ALPHA * ((1.0 if failed else 0.0) - backend.error_rate)
+            if failed:
+                # Penalty relative to backends whose last call succeeded, so
+                # failing backends do not inflate each other
+                healthy = [b.latency for b in self.backends
+                           if b is not backend and b.latency is not None and b.consecutive_failures == 0]
+                penalty = FAILURE_LATENCY_FACTOR * max(healthy) if healthy else FAILURE_LATENCY_SECONDS
+                latency = max(latency, penalty)
+                if backend.latency is None:
+                    backend.latency = latency
+                else:
+                    backend.latency += EWMA_ALPHA * (latency - backend.latency)
+                backend.failures += 1
+                backend.consecutive_failures += 1
+                if backend.consecutive_failures >= EJECT_AFTER_FAILURES:
+                    backend.ejections += 1
+                    cooldown = min(EJECT_MAX_SECONDS, EJECT_BASE_SECONDS * 2 ** (backend.ejections - 1))
+                    backend.ejected_until = time.monotonic() + cooldown
+                    backend.consecutive_failures = 0
+                return
+            backend.consecutive_failures = 0
+            if backend.latency is None:
+                backend.latency = latency
+            else:
+                backend.latency += EWMA_ALPHA * (latency - backend.latency)
+
+    def release(self, backend):
+        """
+        Give back a pick() whose call was abandoned without an outcome
+        """
+        with self._lock:
+            backend.in_flight -= 1
+
+    def call(self, path, *args, backend=None, **kwargs):
+        """
+        Invoke e.g. path=("chat", "completions", "create") on the best backend,
+        failing over to another one on connection errors, 5xx and 429
+        """
+        tried = []
+        while True:
+            current = backend or self.pick(exclude=tried)
+            backend = None
+            tried.append(current)
+            method = reduce(getattr, path, current.client)
+            start = time.monotonic()
+            try:
+                result = method(*args, **{**kwargs, "model": current.deployment})
+            except Exception as e:
+                failed = is_backend_failure(e)
+                self.record(current, time.monotonic() - start, failed)
+                if failed and len(tried) <= self.max_failover and len(tried) < len(self.backends):
+                    continue
+                raise
+            self.record(current, time.monotonic() - start, False)
+            return result
+
+    async def call_async(self, path, *args, backend=None, **kwargs):
+        tried = []
+        while True:
+            current = backend or self.pick(exclude=tried)
+            backend = None
+            tried.append(current)
+            method = reduce(getattr, path, current.client)
+            start = time.monotonic()
+            try:
+                result = await method(*args, **{**kwargs, "model": current.deployment})
+            except asyncio.CancelledError:
+                # e.g. the losing side of a hedged request
+                self.release(current)
+                raise
+            except Exception as e:
+                failed = is_backend_failure(e)
+                self.record(current, time.monotonic() - start, failed)
+                if failed and len(tried) <= self.max_failover and len(tried) < len(self.backends):
+                    continue
+                raise
+            self.record(current, time.monotonic() - start, False)
+            return result
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                b.name: {
+                    "weight": b.weight,
+                    "ewma_latency_ms": round(b.latency * 1000, 1) if b.latency is not None else None,
+                    "error_rate": round(b.error_rate, 4),
+                    "in_flight": b.in_flight,
+                    "requests": b.requests,
+                    "failures": b.failures,
+                    "ejected_for": round(max(0.0, b.ejected_until - now), 1),
+                }
+                for b in self.backends
+            }
+
+
+class _Route:
+    """
+    Attribute path on the pooled client, e.g. client.chat.completions.create
+    """
+
+    def __init__(self, pool, path, is_async):
+        self._pool = pool
+        self._path = path
+        self._is_async = is_async
+
+    def __getattr__(self, name):
+        return _Route(self._pool, self._path + (name,), self._is_async)
+
+    def __call__(self, *args, **kwargs):
+        if self._is_async:
+            return self._pool.call_async(self._path, *args, **kwargs)
+        return self._pool.call(self._path, *args, **kwargs)
+
+
+class PooledClient:
+    """
+    Stand-in for AzureOpenAI that routes every call through a BackendPool
+    """
+
+    _is_async = False
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def __getattr__(self, name):
+        return _Route(self.pool, (name,), self._is_async)
+
+    def close(self):
+        for backend in self.pool.backends:
+            backend.client.close()
+
+
+class AsyncPooledClient(PooledClient):
+    _is_async = True
+
+    async def close(self):
+        for backend in self.pool.backends:
+            await backend.client.close()
+
+
+def load_backends_from_env():
+    """
+    Backend definitions from LLM_BACKENDS / LLM_BACKENDS_FILE, or None
+    """
+    raw = os.getenv("LLM_BACKENDS")
+    path = os.getenv("LLM_BACKENDS_FILE")
+    if not raw and path:
+        with open(path, "r", encoding="utf-8") as f:
+            raw = f.read()
+    if not raw:
+        return None
+    backends = json.loads(raw)
+    if not isinstance(backends, list) or not backends:
+        raise ValueError("LLM_BACKENDS must be a non-empty JSON list")
+    return backends
+
+
+def create_pool(definitions, client_factory, default_api_key=None):
+    """
+    BackendPool with one client per definition, built by client_factory(endpoint, api_key)
+    """
+    backends = [
+        Backend(
+            endpoint=d["endpoint"],
+            deployment=d["deployment"],
+            client=client_factory(d["endpoint"], d.get("api_key") or default_api_key),
+            weight=float(d.get("weight", 1.0)),
+        )
+        for d in definitions
+    ]
+    return BackendPool(backends, max_failover=int(os.getenv("LLM_MAX_FAILOVER", "1")))
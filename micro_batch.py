@@ -0,0 +1,187 @@
+"""
+Micro-batching of classification calls.
+
+Short tickets are dominated by per-call overhead (system prompt, tool schema,
+round trip). The batchers hold each ticket for up to `max_wait_ms` or until
+`max_items` tickets with the same language are waiting, send them as one
+completion and hand every caller its own answer. If the combined answer
+cannot be split back reliably, each ticket is retried as a single call.
+
+MicroBatcher is for threads (Flask), AsyncMicroBatcher for asyncio (ASGI).
+Both take:
+    batch_fn(queries, language)  -> list of results, raises ValueError on a bad split
+    single_fn(query, language)   -> result
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from customer_care import error_result
+
+
+class _Counters:
+    def __init__(self):
+        self.items = 0
+        self.batches = 0
+        self.singles = 0
+        self.fallbacks = 0
+
+    def stats(self, max_items, max_wait_ms):
+        return {
+            "max_items": max_items,
+            "max_wait_ms": max_wait_ms,
+            "items": self.items,
+            "batches": self.batches,
+            "single_calls": self.singles,
+            "fallbacks": self.fallbacks,
+            "avg_batch_size": round(self.items / (self.batches + self.singles), 2)
+            if self.batches + self.singles else 0.0,
+        }
+
+
+class MicroBatcher:
+    def __init__(self, batch_fn, single_fn, max_items=8, max_wait_ms=20, max_workers=32):
+        self.batch_fn = batch_fn
+        self.single_fn = single_fn
+        self.max_items = max_items
+        self.max_wait_ms = max_wait_ms
+        self._pending = {}  # language -> (deadline, [(query, future)])
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="microbatch")
+        # Separate pool so fallbacks never wait on the workers that submitted them
+        self._fallback_executor = ThreadPoolExecutor(max_workers=max_items, thread_name_prefix="microbatch-fallback")
+        self._counters = _Counters()
+        threading.Thread(target=self._collect, daemon=True, name="microbatch-collector").start()
+
+    def submit(self, query, language="English"):
+        """
+        Queue a ticket and block until its result is available
+        """
+        future = Future()
+        with self._cond:
+            _, items = self._pending.setdefault(
+                language, (time.monotonic() + self.max_wait_ms / 1000, [])
+            )
+            items.append((query, future))
+            self._cond.notify()
+        return future.result()
+
+    def _collect(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    ready = [
+                        language for language, (deadline, items) in self._pending.items()
+                        if len(items) >= self.max_items or deadline <= now
+                    ]
+                    if ready:
+                        break
+                    deadlines = [deadline for deadline, _ in self._pending.values()]
+                    self._cond.wait(timeout=min(deadlines) - now if deadlines else None)
+                groups = []
+                for language in ready:
+                    _, items = self._pending.pop(language)
+                    groups.append((language, items[:self.max_items]))
+                    # Anything beyond a full batch starts the next window
+                    if items[self.max_items:]:
+                        self._pending[language] = (now + self.max_wait_ms / 1000, items[self.max_items:])
+            for language, items in groups:
+                self._executor.submit(self._dispatch, language, items)
+
+    def _dispatch(self, language, items):
+        try:
+            results = self._call(language, [query for query, _ in items])
+            for (_, future), result in zip(items, results):
+                future.set_result(result)
+        except BaseException as e:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+
+    def _call(self, language, queries):
+        with self._cond:
+            self._counters.items += len(queries)
+            if len(queries) == 1:
+                self._counters.singles += 1
+            else:
+                self._counters.batches += 1
+
+        if len(queries) == 1:
+            return [self.single_fn(queries[0], language)]
+        try:
+            return self.batch_fn(queries, language)
+        except ValueError:
+            with self._cond:
+                self._counters.fallbacks += 1
+            return list(self._fallback_executor.map(lambda q: self.single_fn(q, language), queries))
+        except Exception as e:
+            return [error_result(f"Error: {e}")] * len(queries)
+
+    def stats(self):
+        with self._cond:
+            return self._counters.stats(self.max_items, self.max_wait_ms)
+
+
+class AsyncMicroBatcher:
+    def __init__(self, batch_fn, single_fn, max_items=8, max_wait_ms=20):
+        self.batch_fn = batch_fn
+        self.single_fn = single_fn
+        self.max_items = max_items
+        self.max_wait_ms = max_wait_ms
+        self._pending = {}  # language -> [(query, future)]
+        self._timers = {}
+        self._tasks = set()
+        self._counters = _Counters()
+
+    async def submit(self, query, language="English"):
+        future = asyncio.get_running_loop().create_future()
+        items = self._pending.setdefault(language, [])
+        items.append((query, future))
+        if len(items) >= self.max_items:
+            self._flush(language)
+        elif len(items) == 1:
+            self._timers[language] = asyncio.get_running_loop().call_later(
+                self.max_wait_ms / 1000, self._flush, language
+            )
+        return await future
+
+    def _flush(self, language):
+        timer = self._timers.pop(language, None)
+        if timer is not None:
+            timer.cancel()
+        items = self._pending.pop(language, [])
+        if items:
+            task = asyncio.ensure_future(self._dispatch(language, items))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, language, items):
+        try:
+            results = await self._call(language, [query for query, _ in items])
+            for (_, future), result in zip(items, results):
+                if not future.done():
+                    future.set_result(result)
+        except BaseException as e:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def _call(self, language, queries):
+        self._counters.items += len(queries)
+        if len(queries) == 1:
+            self._counters.singles += 1
+            return [await self.single_fn(queries[0], language)]
+
+        self._counters.batches += 1
+        try:
+            return await self.batch_fn(queries, language)
+        except ValueError:
+            self._counters.fallbacks += 1
+            return await asyncio.gather(*(self.single_fn(q, language) for q in queries))
+        except Exception as e:
+            return [error_result(f"Error: {e}")] * len(queries)
+
+    def stats(self):
+        return self._counters.stats(self.max_items, self.max_wait_ms)
@@ -0,0 +1,167 @@
+"""
+Local stand-in for the Open-Meteo forecast API.
+
+Used by bench_weather.py and for trying the weather assistant offline.
+Answers GET /v1/forecast with deterministic weather derived from the
+coordinates, after latency_ms +/- jitter_ms. Comma-separated coordinate
+lists are answered with a list, one entry per location. Only the `current`
+and `hourly` variables are implemented; `hourly` returns a week of values
+per variable, like the real API, so the cost of requesting it is visible.
+
+Run standalone:
+    python mock_open_meteo.py --port 8002 --latency-ms 80
+
+then set OPEN_METEO_URL=http://127.0.0.1:8002/v1/forecast
+"""
+import argparse
+import asyncio
+import datetime
+import random
+import threading
+import time
+import zlib
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+UNITS = {
+    "temperature_2m": "°C",
+    "relative_humidity_2m": "%",
+    "wind_speed_10m": "km/h",
+    "weather_code": "wmo code",
+    "apparent_temperature": "°C",
+    "precipitation": "mm",
+}
+HOURLY_HOURS = 7 * 24
+
+
+def weather_value(variable, latitude, longitude, hour=0):
+    """
+    Plausible, repeatable value of `variable` at the coordinates
+    """
+    seed = zlib.crc32(f"{latitude:.4f},{longitude:.4f},{variable},{hour}".encode("ascii"))
+    rng = random.Random(seed)
+    if variable in ("temperature_2m", "apparent_temperature"):
+        return round(28 - abs(latitude) * 0.45 + rng.uniform(-4, 4), 1)
+    if variable == "relative_humidity_2m":
+        return rng.randrange(25, 95)
+    if variable == "wind_speed_10m":
+        return round(rng.uniform(0, 30), 1)
+    if variable == "weather_code":
+        return rng.choice([0, 1, 2, 3, 45, 61, 63, 71, 80, 95])
+    if variable == "precipitation":
+        return round(max(0.0, rng.uniform(-2, 3)), 1)
+    return None
+
+
+def forecast(latitude, longitude, current, hourly):
+    now = datetime.datetime.now(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+    payload = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "generationtime_ms": 0.1,
+        "utc_offset_seconds": 0,
+        "timezone": "GMT",
+        "elevation": 40.0,
+    }
+    if current:
+        payload["current_units"] = {"time": "iso8601", "interval": "seconds", **{v: UNITS.get(v, "") for v in current}}
+        payload["current"] = {
+            "time": now.strftime("%Y-%m-%dT%H:%M"),
+            "interval": 900,
+            **{v: weather_value(v, latitude, longitude) for v in current},
+        }
+    if hourly:
+        times = [(now + datetime.timedelta(hours=h)).strftime("%Y-%m-%dT%H:%M") for h in range(HOURLY_HOURS)]
+        payload["hourly_units"] = {"time": "iso8601", **{v: UNITS.get(v, "") for v in hourly}}
+        payload["hourly"] = {
+            "time": times,
+            **{v: [weather_value(v, latitude, longitude, h) for h in range(HOURLY_HOURS)] for v in hourly},
+        }
+    return payload
+
+
+def _split(value):
+    return [part for part in (value or "").split(",") if part]
+
+
+def create_app(latency_ms=80.0, jitter_ms=0.0, failure_rate=0.0):
+    """
+    Build the mock ASGI app. A failure_rate fraction of requests is answered
+    with 503 to exercise client retries.
+    """
+    stats = {"requests": 0, "failed": 0, "locations": 0, "bytes": 0, "in_flight": 0, "max_in_flight": 0}
+
+    async def get_forecast(request):
+        params = request.query_params
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            await asyncio.sleep(max(0.0, latency_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000)
+            if random.random() < failure_rate:
+                stats["failed"] += 1
+                return JSONResponse({"error": True, "reason": "Service unavailable"}, status_code=503)
+            try:
+                latitudes = [float(v) for v in _split(params["latitude"])]
+                longitudes = [float(v) for v in _split(params["longitude"])]
+            except (KeyError, ValueError):
+                latitudes = longitudes = []
+            if not latitudes or len(latitudes) != len(longitudes):
+                return JSONResponse({"error": True, "reason": "latitude and longitude must have the same length"},
+                                    status_code=400)
+            stats["locations"] += len(latitudes)
+            current, hourly = _split(params.get("current")), _split(params.get("hourly"))
+            payloads = [forecast(lat, lon, current, hourly) for lat, lon in zip(latitudes, longitudes)]
+            # Like Open-Meteo: one location -> object, several -> list
+            response = JSONResponse(payloads[0] if len(payloads) == 1 else payloads)
+            stats["bytes"] += len(response.body)
+            return response
+        finally:
+            stats["in_flight"] -= 1
+
+    async def get_stats(request):
+        return JSONResponse(stats)
+
+    app = Starlette(
+        routes=[
+            Route("/v1/forecast", get_forecast),
+            Route("/stats", get_stats),
+        ]
+    )
+    app.state.stats = stats
+    return app
+
+
+def serve_in_thread(port, **options):
+    """
+    Start the mock server on 127.0.0.1:port in a daemon thread.
+
+    Returns the uvicorn Server; set `server.should_exit = True` to stop it.
+    """
+    config = uvicorn.Config(create_app(**options), host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock Open-Meteo forecast server")
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    print(f"🧪 Mock Open-Meteo listening on http://127.0.0.1:{args.port}/v1/forecast")
+    uvicorn.run(
+        create_app(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, failure_rate=args.failure_rate),
+        host="127.0.0.1",
+        port=args.port,
+        log_level="warning",
+    )
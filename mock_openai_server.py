@@ -0,0 +1,293 @@
+"""
+Local stand-in for the Azure OpenAI chat completions endpoint.
+
+Used by the benchmarks so throughput and latency can be measured offline
+with a fixed, configurable upstream latency. Only the parts of the API the
+samples use are implemented.
+
+Run standalone:
+    python mock_openai_server.py --port 8001 --latency-ms 300
+
+then point ENDPOINT_URL at http://127.0.0.1:8001/ (any AZURE_API_KEY works).
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+CATEGORY_KEYWORDS = {
+    "billing": ["bill", "invoice", "charge", "refund", "payment", "账单", "付款", "退款"],
+    "break-fix": ["broken", "error", "crash", "not working", "fail", "down", "故障", "坏", "无法"],
+}
+
+
+def guess_category(text):
+    lowered = text.lower()
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        if any(keyword in lowered for keyword in keywords):
+            return category
+    return "advisory"
+
+
+def last_user_message(messages):
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            return message.get("content") or ""
+    return ""
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def chat_arguments(body):
+    query = last_user_message(body.get("messages", []))
+    return {
+        "category": guess_category(query),
+        "content": f"Thanks for reaching out about: {query[:80]}",
+    }
+
+
+def chat_batch_arguments(body):
+    tickets = json.loads(last_user_message(body.get("messages", [])))
+    return {
+        "tickets": [
+            {
+                "id": ticket["id"],
+                "category": guess_category(ticket["query"]),
+                "content": f"Thanks for reaching out about: {ticket['query'][:80]}",
+            }
+            for ticket in tickets
+        ]
+    }
+
+
+TOOL_ARGUMENTS = {"chat": chat_arguments, "chat_batch": chat_batch_arguments}
+
+
+def usage(body, message):
+    prompt_tokens = estimate_tokens(json.dumps(body.get("messages", []), ensure_ascii=False))
+    prompt_tokens += estimate_tokens(json.dumps(body.get("tools", []), ensure_ascii=False))
+    completion_tokens = estimate_tokens(json.dumps(message, ensure_ascii=False))
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def completion_payload(body, message, finish_reason):
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+        "usage": usage(body, message),
+    }
+
+
+def tool_call_message(name, arguments):
+    return {
+        "role": "assistant",
+        "content": None,
+        "tool_calls": [
+            {
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {"name": name, "arguments": json.dumps(arguments, ensure_ascii=False)},
+            }
+        ],
+    }
+
+
+def chunk_payload(body, delta, finish_reason=None):
+    return {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+async def stream_message(body, message, finish_reason, token_ms, fragment_chars=4):
+    """
+    SSE chunks for `message`, one small fragment every token_ms
+    """
+    def event(payload):
+        return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    if message.get("tool_calls"):
+        call = message["tool_calls"][0]
+        head = {"index": 0, "id": call["id"], "type": "function",
+                "function": {"name": call["function"]["name"], "arguments": ""}}
+        yield event(chunk_payload(body, {"role": "assistant", "tool_calls": [head]}))
+        text = call["function"]["arguments"]
+        for i in range(0, len(text), fragment_chars):
+            await asyncio.sleep(token_ms / 1000)
+            piece = {"index": 0, "function": {"arguments": text[i:i + fragment_chars]}}
+            yield event(chunk_payload(body, {"tool_calls": [piece]}))
+    else:
+        yield event(chunk_payload(body, {"role": "assistant", "content": ""}))
+        text = message["content"]
+        for i in range(0, len(text), fragment_chars):
+            await asyncio.sleep(token_ms / 1000)
+            yield event(chunk_payload(body, {"content": text[i:i + fragment_chars]}))
+
+    yield event(chunk_payload(body, {}, finish_reason))
+    yield "data: [DONE]\n\n"
+
+
+class RateLimiter:
+    """
+    Fixed one-second windows sized from a requests-per-minute quota, answering
+    like Azure: 429 + retry-after-ms when exceeded, remaining quota otherwise
+    """
+
+    def __init__(self, requests_per_minute):
+        self.per_window = max(1, int(requests_per_minute / 60))
+        self.window = int(time.monotonic())
+        self.used = 0
+
+    def check(self):
+        now = time.monotonic()
+        if int(now) != self.window:
+            self.window, self.used = int(now), 0
+        if self.used >= self.per_window:
+            retry_ms = int((self.window + 1 - now) * 1000) + 1
+            return False, {"retry-after-ms": str(retry_ms), "x-ratelimit-remaining-requests": "0"}
+        self.used += 1
+        return True, {"x-ratelimit-remaining-requests": str(self.per_window - self.used)}
+
+
+def create_app(
+    latency_ms=300.0,
+    jitter_ms=0.0,
+    token_ms=20.0,
+    rate_limit_rpm=None,
+    output_token_ms=0.0,
+    tail_probability=0.0,
+    tail_ms=0.0,
+):
+    """
+    Build the mock ASGI app.
+
+    Every completion sleeps latency_ms +/- jitter_ms before answering, which
+    is what makes the serving modes distinguishable in a benchmark. Streamed
+    completions (stream=true) send their first chunk after that delay and
+    then one small fragment every token_ms. Non-streamed completions also
+    take output_token_ms per generated token, so longer answers cost time.
+    With rate_limit_rpm set, requests over the quota are rejected with 429
+    like Azure does. A tail_probability fraction of requests is slowed down
+    by an extra tail_ms to simulate the occasional slow completion.
+    """
+    stats = {
+        "requests": 0, "throttled": 0, "in_flight": 0, "max_in_flight": 0,
+        "prompt_tokens": 0, "completion_tokens": 0,
+    }
+    limiter = RateLimiter(rate_limit_rpm) if rate_limit_rpm else None
+
+    async def chat_completions(request):
+        body = await request.json()
+        headers = {}
+        if limiter is not None:
+            allowed, headers = limiter.check()
+            if not allowed:
+                stats["throttled"] += 1
+                error = {"error": {"code": "429", "message": "Rate limit is exceeded."}}
+                return JSONResponse(error, status_code=429, headers=headers)
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            tool_choice = body.get("tool_choice")
+            name = tool_choice["function"]["name"] if isinstance(tool_choice, dict) else None
+            if name in TOOL_ARGUMENTS:
+                message, finish_reason = tool_call_message(name, TOOL_ARGUMENTS[name](body)), "tool_calls"
+            else:
+                message, finish_reason = {"role": "assistant", "content": "OK"}, "stop"
+            tokens = usage(body, message)
+            stats["prompt_tokens"] += tokens["prompt_tokens"]
+            stats["completion_tokens"] += tokens["completion_tokens"]
+
+            delay = latency_ms + random.uniform(-jitter_ms, jitter_ms)
+            if random.random() < tail_probability:
+                delay += tail_ms
+            if not body.get("stream"):
+                delay += output_token_ms * tokens["completion_tokens"]
+            await asyncio.sleep(max(0.0, delay) / 1000)
+
+            if body.get("stream"):
+                return StreamingResponse(
+                    stream_message(body, message, finish_reason, token_ms),
+                    media_type="text/event-stream",
+                    headers=headers,
+                )
+            return JSONResponse(completion_payload(body, message, finish_reason), headers=headers)
+        finally:
+            stats["in_flight"] -= 1
+
+    async def get_stats(request):
+        return JSONResponse(stats)
+
+    app = Starlette(
+        routes=[
+            Route("/openai/deployments/{deployment}/chat/completions", chat_completions, methods=["POST"]),
+            Route("/stats", get_stats),
+        ]
+    )
+    app.state.stats = stats
+    return app
+
+
+def serve_in_thread(port, **options):
+    """
+    Start the mock server on 127.0.0.1:port in a daemon thread.
+
+    Returns the uvicorn Server; set `server.should_exit = True` to stop it.
+    """
+    config = uvicorn.Config(create_app(**options), host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock Azure OpenAI chat completions server")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--token-ms", type=float, default=20.0, help="delay between streamed chunks")
+    parser.add_argument("--rate-limit-rpm", type=float, help="reject requests over this quota with 429")
+    parser.add_argument("--output-token-ms", type=float, default=0.0, help="time per generated token")
+    parser.add_argument("--tail-probability", type=float, default=0.0, help="fraction of slow requests")
+    parser.add_argument("--tail-ms", type=float, default=0.0, help="extra delay of a slow request")
+    args = parser.parse_args()
+
+    print(f"🧪 Mock Azure OpenAI listening on http://127.0.0.1:{args.port}/")
+    uvicorn.run(
+        create_app(
+            latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms,
+            token_ms=args.token_ms,
+            rate_limit_rpm=args.rate_limit_rpm,
+            output_token_ms=args.output_token_ms,
+            tail_probability=args.tail_probability,
+            tail_ms=args.tail_ms,
+        ),
+        host="127.0.0.1",
+        port=args.port,
+        log_level="warning",
+    )
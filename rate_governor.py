@@ -0,0 +1,351 @@
+"""
+Adaptive outbound concurrency governor for Azure OpenAI.
+
+Sits in the httpx transport under the OpenAI SDK, so every call (create,
+parse, streaming) from a client built by llm_clients is governed without
+changing call sites. Per deployment it combines:
+
+- token buckets for requests/minute and tokens/minute, kept in line with the
+  x-ratelimit-remaining-* headers Azure returns
+- an AIMD concurrency limit: +1 per window of successes, halved on a 429
+- Retry-After / retry-after-ms handling: a 429 pauses the deployment and the
+  request is queued and re-sent instead of failing
+
+Callers wait in a queue rather than failing; queue depth and wait times are
+reported by stats().
+"""
+import asyncio
+import email.utils
+import json
+import os
+import threading
+import time
+
+import httpx
+
+DEFAULT_RETRY_AFTER = 1.0
+
+
+class TokenBucket:
+    """
+    Reservation-based token bucket. reserve() always succeeds and returns how
+    long the caller must wait for its tokens, so waiters are served in order.
+    """
+
+    def __init__(self, per_minute, burst_seconds=10.0):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount, now):
+        self._refill(now)
+        self.tokens -= amount
+        return max(0.0, -self.tokens / self.rate)
+
+    def sync(self, remaining, now):
+        """
+        Never believe we have more quota left than the server says
+        """
+        self._refill(now)
+        self.tokens = min(self.tokens, float(remaining))
+
+
+def parse_retry_after(headers):
+    """
+    Seconds to wait from retry-after-ms / Retry-After (seconds or HTTP date)
+    """
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(value)
+        return max(0.0, parsed.timestamp() - time.time())
+
+
+def estimate_request_tokens(content):
+    """
+    Rough token cost of a chat request: ~4 bytes per prompt token plus the
+    requested completion budget
+    """
+    prompt_tokens = len(content) // 4
+    try:
+        body = json.loads(content) if content else {}
+    except ValueError:
+        body = {}
+    completion_tokens = body.get("max_completion_tokens") or body.get("max_tokens") or 256
+    return prompt_tokens + completion_tokens
+
+
+class RateGovernor:
+    """
+    Admission control for one deployment, usable from threads and asyncio
+    """
+
+    def __init__(
+        self,
+        requests_per_minute=None,
+        tokens_per_minute=None,
+        initial_concurrency=8,
+        min_concurrency=1,
+        max_concurrency=64,
+    ):
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._async_waiters = []
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self._limit = float(initial_concurrency)
+        self._in_flight = 0
+        self._waiting = 0
+        self._paused_until = 0.0
+        self._counters = {"requests": 0, "throttled": 0, "retried": 0, "wait_total": 0.0, "wait_max": 0.0}
+
+    # -- state transitions (caller holds self._lock) --
+
+    def _try_enter(self, tokens):
+        """
+        Take a concurrency slot if one is free; returns the rate-limit delay
+        to sleep before sending, or None when the caller must keep queueing
+        """
+        if self._in_flight >= max(1, int(self._limit)):
+            return None
+        self._in_flight += 1
+        now = time.monotonic()
+        delay = max(0.0, self._paused_until - now)
+        if self.request_bucket:
+            delay = max(delay, self.request_bucket.reserve(1, now))
+        if self.token_bucket:
+            delay = max(delay, self.token_bucket.reserve(tokens, now))
+        return delay
+
+    def _wake(self):
+        self._cond.notify_all()
+        for loop, future in self._async_waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+        self._async_waiters.clear()
+
+    def _record_wait(self, waited):
+        with self._lock:
+            self._counters["requests"] += 1
+            self._counters["wait_total"] += waited
+            self._counters["wait_max"] = max(self._counters["wait_max"], waited)
+
+    # -- public API --
+
+    def acquire(self, tokens=0):
+        """
+        Block until the request may be sent; returns the time spent queued
+        """
+        start = time.monotonic()
+        with self._cond:
+            self._waiting += 1
+            try:
+                while (delay := self._try_enter(tokens)) is None:
+                    self._cond.wait()
+            finally:
+                self._waiting -= 1
+        if delay:
+            time.sleep(delay)
+        waited = time.monotonic() - start
+        self._record_wait(waited)
+        return waited
+
+    async def acquire_async(self, tokens=0):
+        start = time.monotonic()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._waiting += 1
+        try:
+            while True:
+                with self._lock:
+                    delay = self._try_enter(tokens)
+                    if delay is not None:
+                        break
+                    future = loop.create_future()
+                    self._async_waiters.append((loop, future))
+                await future
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        if delay:
+            try:
+                await asyncio.sleep(delay)
+            except BaseException:
+                # Cancelled while holding a slot: give it back
+                self.release()
+                raise
+        waited = time.monotonic() - start
+        self._record_wait(waited)
+        return waited
+
+    def release(self, status_code=None, headers=None):
+        """
+        Return the slot and adapt to the response (None status = transport error)
+        """
+        headers = headers or {}
+        now = time.monotonic()
+        with self._lock:
+            self._in_flight -= 1
+            if status_code == 429:
+                self._counters["throttled"] += 1
+                # Halve once per throttling episode, not once per rejected request
+                if now >= self._paused_until:
+                    self._limit = max(self.min_concurrency, self._limit / 2)
+                retry_after = parse_retry_after(headers)
+                self._paused_until = max(self._paused_until, now + (retry_after or DEFAULT_RETRY_AFTER))
+            elif status_code is not None and status_code < 400:
+                self._limit = min(self.max_concurrency, self._limit + 1 / self._limit)
+
+            remaining_requests = headers.get("x-ratelimit-remaining-requests")
+            if self.request_bucket and remaining_requests is not None:
+                self.request_bucket.sync(remaining_requests, now)
+            remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+            if self.token_bucket and remaining_tokens is not None:
+                self.token_bucket.sync(remaining_tokens, now)
+            self._wake()
+
+    def count_retry(self):
+        with self._lock:
+            self._counters["retried"] += 1
+
+    def stats(self):
+        with self._lock:
+            requests = self._counters["requests"]
+            return {
+                "concurrency_limit": round(self._limit, 2),
+                "in_flight": self._in_flight,
+                "queue_depth": self._waiting,
+                "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 3),
+                "requests": requests,
+                "throttled": self._counters["throttled"],
+                "retried": self._counters["retried"],
+                "avg_wait": round(self._counters["wait_total"] / requests, 4) if requests else 0.0,
+                "max_wait": round(self._counters["wait_max"], 4),
+            }
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class GovernorRegistry:
+    """
+    One RateGovernor per (host, deployment), created on first use
+    """
+
+    def __init__(self, **governor_options):
+        self.governor_options = governor_options
+        self._governors = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(url):
+        parts = url.path.split("/")
+        deployment = parts[parts.index("deployments") + 1] if "deployments" in parts else ""
+        return f"{url.host}/{deployment}"
+
+    def for_request(self, request):
+        key = self._key(request.url)
+        with self._lock:
+            governor = self._governors.get(key)
+            if governor is None:
+                governor = self._governors[key] = RateGovernor(**self.governor_options)
+            return governor
+
+    def stats(self):
+        with self._lock:
+            governors = dict(self._governors)
+        return {key: governor.stats() for key, governor in governors.items()}
+
+
+class GovernedTransport(httpx.BaseTransport):
+    """
+    httpx transport that admits requests through the registry's governors and
+    re-sends 429s after the server's Retry-After instead of failing them.
+
+    The slot is released once response headers arrive, so a long streamed
+    body does not count against the concurrency limit.
+    """
+
+    def __init__(self, registry, transport=None, max_retries=5):
+        self.registry = registry
+        self.transport = transport or httpx.HTTPTransport()
+        self.max_retries = max_retries
+
+    def handle_request(self, request):
+        governor = self.registry.for_request(request)
+        tokens = estimate_request_tokens(request.read())
+        for attempt in range(self.max_retries + 1):
+            governor.acquire(tokens)
+            try:
+                response = self.transport.handle_request(request)
+            except Exception:
+                governor.release()
+                raise
+            governor.release(response.status_code, response.headers)
+            if response.status_code != 429 or attempt == self.max_retries:
+                return response
+            response.close()
+            governor.count_retry()
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncGovernedTransport(httpx.AsyncBaseTransport):
+    def __init__(self, registry, transport=None, max_retries=5):
+        self.registry = registry
+        self.transport = transport or httpx.AsyncHTTPTransport()
+        self.max_retries = max_retries
+
+    async def handle_async_request(self, request):
+        governor = self.registry.for_request(request)
+        tokens = estimate_request_tokens(await request.aread())
+        for attempt in range(self.max_retries + 1):
+            await governor.acquire_async(tokens)
+            try:
+                response = await self.transport.handle_async_request(request)
+            except BaseException:
+                governor.release()
+                raise
+            governor.release(response.status_code, response.headers)
+            if response.status_code != 429 or attempt == self.max_retries:
+                return response
+            await response.aclose()
+            governor.count_retry()
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def create_registry_from_env():
+    """
+    GovernorRegistry configured from LLM_GOVERNOR_* variables, or None when
+    LLM_GOVERNOR is not enabled
+    """
+    if os.getenv("LLM_GOVERNOR", "false").lower() != "true":
+        return None
+    rpm = os.getenv("LLM_GOVERNOR_RPM")
+    tpm = os.getenv("LLM_GOVERNOR_TPM")
+    return GovernorRegistry(
+        requests_per_minute=float(rpm) if rpm else None,
+        tokens_per_minute=float(tpm) if tpm else None,
+        initial_concurrency=int(os.getenv("LLM_GOVERNOR_CONCURRENCY", "8")),
+        max_concurrency=int(os.getenv("LLM_GOVERNOR_MAX_CONCURRENCY", "64")),
+    )
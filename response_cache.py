@@ -0,0 +1,234 @@
+"""
+Response caches for LLM results.
+
+Two interchangeable backends with the same get/set/stats interface:
+
+- LRUCache: in-process, TTL + entry-count + byte-size eviction
+- SQLiteCache: a file on disk that several worker processes can share
+
+Values must be JSON-serializable (they are the result dicts the apps return).
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_text(text):
+    """
+    Canonical form used for cache keys: NFKC, case-folded, whitespace collapsed
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def make_key(*parts):
+    """
+    Stable hash of any JSON-serializable key parts
+    """
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache with per-entry TTL.
+
+    Entries are evicted least-recently-used first once either max_entries or
+    max_bytes (serialized JSON size) is exceeded; expired entries are dropped
+    lazily when they are read.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=None, ttl=300.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            expires_at, size, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._bytes -= size
+                self._counters["expirations"] += 1
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        size = len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (expires_at, size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._counters["evictions"] += 1
+
+    def delete(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                "backend": "memory",
+                **self._counters,
+                "hit_ratio": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+
+class SQLiteCache:
+    """
+    Cache stored in a SQLite file so multiple worker processes share entries.
+
+    Uses WAL mode and one connection per thread. Eviction is LRU by last
+    access time once max_entries is exceeded. Hit/miss counters are per
+    process; entry counts come from the shared table. Several caches can
+    share one file under different `table` names.
+    """
+
+    def __init__(self, path="classify_cache.sqlite3", max_entries=100_000, ttl=300.0, table="cache"):
+        if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", table):
+            raise ValueError(f"Invalid table name: {table!r}")
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+        with self._connection() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed_at)")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def get(self, key):
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute(f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+        value, expires_at = row
+        if expires_at <= now:
+            with conn:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._count("expirations")
+            self._count("misses")
+            return None
+        with conn:
+            conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+        self._count("hits")
+        return json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires_at, now),
+            )
+            excess = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN"
+                    f" (SELECT key FROM {self.table} ORDER BY accessed_at LIMIT ?)",
+                    (excess,),
+                )
+                self._count("evictions", excess)
+
+    def delete(self, key):
+        conn = self._connection()
+        with conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self):
+        conn = self._connection()
+        with conn:
+            conn.execute(f"DELETE FROM {self.table}")
+
+    def stats(self):
+        entries = self._connection().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                "backend": "sqlite",
+                **self._counters,
+                "hit_ratio": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": entries,
+                "path": self.path,
+                "table": self.table,
+            }
+
+
+def create_cache_from_env(prefix="CLASSIFY_CACHE", default_path="classify_cache.sqlite3", default_backend="off",
+                          default_ttl=300.0):
+    """
+    Build a cache from <prefix>, <prefix>_TTL, <prefix>_MAX_ENTRIES,
+    <prefix>_MAX_BYTES and <prefix>_PATH. Returns None when caching is off.
+    """
+    backend = os.getenv(prefix, default_backend).lower()
+    ttl = float(os.getenv(f"{prefix}_TTL", default_ttl))
+    max_entries = int(os.getenv(f"{prefix}_MAX_ENTRIES", "1024"))
+
+    if backend == "memory":
+        max_bytes = os.getenv(f"{prefix}_MAX_BYTES")
+        return LRUCache(max_entries=max_entries, max_bytes=int(max_bytes) if max_bytes else None, ttl=ttl)
+    if backend == "sqlite":
+        return SQLiteCache(path=os.getenv(f"{prefix}_PATH", default_path), max_entries=max_entries, ttl=ttl)
+    if backend in ("off", "none", ""):
+        return None
+    raise ValueError(f"Unknown {prefix} backend: {backend!r} (expected memory, sqlite or off)")
@@ -0,0 +1,102 @@
+"""
+Single-flight request coalescing.
+
+While a call for a key is in flight, further calls with the same key wait for
+it and receive the same result (or exception) instead of starting their own.
+SingleFlight is for threads (Flask), AsyncSingleFlight for asyncio (ASGI).
+"""
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Counters:
+    def __init__(self):
+        self.calls = 0
+        self.executions = 0
+        self.collapsed = 0
+
+    def stats(self, in_flight):
+        return {
+            "calls": self.calls,
+            "upstream_calls": self.executions,
+            "collapsed": self.collapsed,
+            "collapse_ratio": round(self.collapsed / self.calls, 4) if self.calls else 0.0,
+            "in_flight": in_flight,
+        }
+
+
+class SingleFlight:
+    """
+    Thread-based coalescing: the first caller for a key runs fn(), later
+    callers block until it finishes and share its outcome.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._counters = _Counters()
+
+    def do(self, key, fn):
+        with self._lock:
+            self._counters.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._counters.executions += 1
+            else:
+                self._counters.collapsed += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return self._counters.stats(len(self._calls))
+
+
+class AsyncSingleFlight:
+    """
+    asyncio coalescing: the upstream call runs as its own task, so a caller
+    being cancelled (e.g. client disconnect) does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+        self._counters = _Counters()
+
+    async def do(self, key, coro_fn):
+        self._counters.calls += 1
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+            self._counters.executions += 1
+        else:
+            self._counters.collapsed += 1
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return self._counters.stats(len(self._tasks))
@@ -0,0 +1,109 @@
+"""
+Token budgets for tool results.
+
+Tool output is pasted into the next prompt verbatim, so a generous search
+result costs prompt tokens and latency on the follow-up call. fit_records()
+keeps ranked KB hits within a token budget. Records are kept whole while
+they fit. The first record that does not fit is cut down to the answer
+sentences that best match the question, and everything after it is dropped.
+
+Token counts use tiktoken when it is installed and ~4 characters per token
+otherwise.
+"""
+import json
+import re
+
+from kb_search import tokenize
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+MIN_SNIPPET_TOKENS = 24
+
+_SENTENCE_RE = re.compile(r"[^.!?。！？]+[.!?。！？]*")
+_encoding = None
+
+
+def _encoder():
+    global _encoding
+    if _encoding is None and tiktoken is not None:
+        _encoding = tiktoken.get_encoding("o200k_base")
+    return _encoding
+
+
+def count_tokens(text):
+    encoding = _encoder()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def truncate_tokens(text, limit):
+    encoding = _encoder()
+    if encoding is not None:
+        tokens = encoding.encode(text)
+        return text if len(tokens) <= limit else encoding.decode(tokens[:limit]) + "…"
+    return text if len(text) <= limit * 4 else text[:limit * 4] + "…"
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+def snippet(text, question, limit):
+    """
+    The sentences of `text` sharing most terms with the question, in their
+    original order, within `limit` tokens
+    """
+    sentences = [s.strip() for s in _SENTENCE_RE.findall(text) if s.strip()]
+    terms = set(tokenize(question))
+    ranked = sorted(
+        range(len(sentences)),
+        key=lambda i: (-len(terms.intersection(tokenize(sentences[i]))), i),
+    )
+    chosen, used = [], 0
+    for i in ranked:
+        cost = count_tokens(sentences[i]) + 1
+        if used + cost > limit:
+            continue
+        chosen.append(i)
+        used += cost
+    if not chosen:
+        return truncate_tokens(sentences[ranked[0]] if sentences else text, limit)
+    return " ".join(sentences[i] for i in sorted(chosen))
+
+
+def fit_records(records, question, budget):
+    """
+    Trim ranked search hits so json.dumps({"records": ...}) fits in
+    `budget` tokens. Returns (records, report) where the report has the
+    token counts before/after and what was cut.
+    """
+    before = count_tokens(_dumps({"records": records}))
+    report = {"budget": budget, "tokens_before": before, "tokens_after": before, "tokens_saved": 0,
+              "snippeted": 0, "dropped": 0}
+    if budget is None or before <= budget:
+        return records, report
+
+    kept = []
+    used = count_tokens(_dumps({"records": []}))
+    for position, record in enumerate(records):
+        cost = count_tokens(_dumps(record)) + 1
+        if used + cost <= budget:
+            kept.append(record)
+            used += cost
+            continue
+        # Room for a snippet of this one, then stop
+        overhead = count_tokens(_dumps({**record, "answer": "", "truncated": True})) + 1
+        room = budget - used - overhead
+        if room >= MIN_SNIPPET_TOKENS:
+            kept.append({**record, "answer": snippet(record["answer"], question, room), "truncated": True})
+            report["snippeted"] = 1
+        report["dropped"] = len(records) - len(kept)
+        break
+
+    after = count_tokens(_dumps({"records": kept}))
+    report.update(tokens_after=after, tokens_saved=before - after)
+    return kept, report
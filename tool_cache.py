@@ -0,0 +1,118 @@
+"""
+Result caches for tool functions.
+
+The same search_kb questions come up again and again across conversations
+(weather lookups are cached by weather_client instead). @cached_tool() memoises a tool function on its
+name plus the canonical JSON of its bound arguments (positional and keyword
+forms, argument order and defaults all give the same key), with a TTL and an
+LRU bound per tool:
+
+    @cached_tool(ttl=600)
+    def search_kb(question): ...
+
+The backend comes from TOOL_CACHE: memory (default), sqlite (one table per
+tool in TOOL_CACHE_PATH, shared by processes and kept across restarts) or
+off. TOOL_CACHE_TTL_<TOOL> overrides a tool's TTL, e.g.
+TOOL_CACHE_TTL_SEARCH_KB=60. None results are not cached, so a failed
+lookup is retried next time. Concurrent calls with the same key run once.
+"""
+import inspect
+import os
+import re
+from functools import update_wrapper
+
+from response_cache import LRUCache, SQLiteCache, make_key
+from singleflight import SingleFlight
+
+_cached_tools = {}  # tool name -> CachedTool
+
+
+class CachedTool:
+    """
+    A tool function behind a cache. `version` is an optional callable whose
+    value is part of every key (e.g. the KB version), so results computed
+    against old data are never returned. `normalize` may rewrite the bound
+    arguments dict before it is hashed (e.g. case-fold a question).
+    """
+
+    def __init__(self, func, cache, name=None, version=None, normalize=None):
+        self.func = func
+        self.cache = cache
+        self.name = name or func.__name__
+        self.version = version
+        self.normalize = normalize
+        self._signature = inspect.signature(func)
+        self._inflight = SingleFlight()
+        update_wrapper(self, func)
+
+    def key(self, *args, **kwargs):
+        bound = self._signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        if self.normalize is not None:
+            arguments = self.normalize(arguments)
+        return make_key(self.name, self.version() if self.version is not None else None, arguments)
+
+    def __call__(self, *args, **kwargs):
+        key = self.key(*args, **kwargs)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        def compute():
+            result = self.func(*args, **kwargs)
+            if result is not None:
+                self.cache.set(key, result)
+            return result
+
+        return self._inflight.do(key, compute)
+
+    def stats(self):
+        inflight = self._inflight.stats()
+        return {**self.cache.stats(), "ttl": self.cache.ttl, "executions": inflight["upstream_calls"],
+                "collapsed": inflight["collapsed"]}
+
+
+def create_tool_cache(name, ttl=300.0, max_entries=None):
+    """
+    Cache for one tool from TOOL_CACHE, TOOL_CACHE_TTL_<NAME>,
+    TOOL_CACHE_MAX_ENTRIES and TOOL_CACHE_PATH. None when caching is off.
+    """
+    backend = os.getenv("TOOL_CACHE", "memory").lower()
+    ttl = float(os.getenv(f"TOOL_CACHE_TTL_{re.sub(r'[^A-Za-z0-9]', '_', name).upper()}", ttl))
+    if max_entries is None:
+        max_entries = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "1024"))
+
+    if backend == "memory":
+        return LRUCache(max_entries=max_entries, ttl=ttl)
+    if backend == "sqlite":
+        table = "tool_" + re.sub(r"[^A-Za-z0-9_]", "_", name)
+        return SQLiteCache(path=os.getenv("TOOL_CACHE_PATH", "tool_cache.sqlite3"), max_entries=max_entries,
+                           ttl=ttl, table=table)
+    if backend in ("off", "none", ""):
+        return None
+    raise ValueError(f"Unknown TOOL_CACHE backend: {backend!r} (expected memory, sqlite or off)")
+
+
+def cached_tool(name=None, ttl=300.0, max_entries=None, version=None, normalize=None, cache=None):
+    """
+    Decorator caching a tool function's results (see CachedTool). Pass
+    `cache` to use a specific LRUCache/SQLiteCache instead of TOOL_CACHE.
+    With caching off the function is returned unchanged.
+    """
+    def decorator(func):
+        tool_name = name or func.__name__
+        tool_cache = cache if cache is not None else create_tool_cache(tool_name, ttl, max_entries)
+        if tool_cache is None:
+            return func
+        wrapped = CachedTool(func, tool_cache, tool_name, version, normalize)
+        _cached_tools[tool_name] = wrapped
+        return wrapped
+    return decorator
+
+
+def tool_cache_stats():
+    """
+    Per-tool cache statistics, including the hit ratio
+    """
+    return {name: tool.stats() for name, tool in _cached_tools.items()}
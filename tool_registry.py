@@ -0,0 +1,112 @@
+"""
+Tool registry and concurrent dispatch of tool calls.
+
+A model turn can ask for several tools at once (e.g. three search_kb lookups
+for a compound question). ToolRegistry maps tool names to Python functions
+and runs all calls of a turn concurrently on a thread pool, returning the
+"tool" messages in the order the model asked for them, ready to append to
+the conversation.
+
+A tool that raises, is unknown or gets malformed arguments does not abort
+the turn: its message carries {"error": ...} so the model can recover.
+"""
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ToolRegistry:
+    """
+    name -> function. Functions take the tool's arguments as keyword
+    arguments and return something json.dumps can serialise.
+    """
+
+    def __init__(self, max_workers=8):
+        self.max_workers = max_workers
+        self._tools = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._counters = {"turns": 0, "calls": 0, "concurrent_turns": 0, "max_calls_per_turn": 0, "errors": 0}
+
+    def register(self, name, func):
+        self._tools[name] = func
+        return func
+
+    def tool(self, name=None):
+        """
+        Decorator form of register(), named after the function by default
+        """
+        def decorator(func):
+            return self.register(name or func.__name__, func)
+        return decorator
+
+    def names(self):
+        return list(self._tools)
+
+    def __contains__(self, name):
+        return name in self._tools
+
+    def _count(self, calls, errors):
+        with self._lock:
+            self._counters["turns"] += 1
+            self._counters["calls"] += calls
+            self._counters["errors"] += errors
+            if calls > 1:
+                self._counters["concurrent_turns"] += 1
+            self._counters["max_calls_per_turn"] = max(self._counters["max_calls_per_turn"], calls)
+
+    def call(self, name, arguments):
+        """
+        Run one tool. `arguments` is the model's JSON string or a dict.
+        """
+        func = self._tools.get(name)
+        if func is None:
+            raise LookupError(f"unknown tool {name!r}")
+        if isinstance(arguments, str):
+            arguments = json.loads(arguments) if arguments.strip() else {}
+        return func(**arguments)
+
+    @staticmethod
+    def _message(tool_call, result=None, error=None):
+        content = {"error": f"{type(error).__name__}: {error}"} if error is not None else result
+        return {
+            "role": "tool",
+            "tool_call_id": tool_call.id,
+            "content": json.dumps(content, ensure_ascii=False),
+        }
+
+    def _run_one(self, tool_call):
+        try:
+            return self._message(tool_call, self.call(tool_call.function.name, tool_call.function.arguments)), 0
+        except Exception as e:
+            print(f"❌ Tool {tool_call.function.name} failed: {e}")
+            return self._message(tool_call, error=e), 1
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool")
+            return self._executor
+
+    def run_tool_calls(self, tool_calls):
+        """
+        Execute every tool call of one assistant message concurrently and
+        return the tool messages in tool-call order
+        """
+        tool_calls = list(tool_calls or [])
+        if len(tool_calls) <= 1 or self.max_workers <= 1:
+            outcomes = [self._run_one(tool_call) for tool_call in tool_calls]
+        else:
+            outcomes = list(self._pool().map(self._run_one, tool_calls))
+        self._count(len(tool_calls), sum(errors for _, errors in outcomes))
+        return [message for message, _ in outcomes]
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, "tools": self.names(), "max_workers": self.max_workers}
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
@@ -0,0 +1,272 @@
+"""
+Sentence-pipelined text-to-speech.
+
+text_to_speech used to synthesize the whole reply into a temp WAV file,
+save it again to a fixed path and load it back before anything was
+audible. TTSPipeline instead:
+
+- splits the reply into sentences on Chinese and English punctuation
+- synthesizes sentence N+1 on a worker thread while sentence N plays
+- passes audio as in-memory WAV bytes, never touching the filesystem
+
+so the first sound comes after one sentence's synthesis, not the whole
+reply's. Synthesizers and players are small classes with one method each;
+StubSynthesizer and NullPlayer run the pipeline offline, without Azure
+Speech or an audio device.
+
+    pipeline = TTSPipeline(StubSynthesizer(), NullPlayer())
+    pipeline.speak("北京：温度 3.2°C。上海：温度 8.1°C。", "zh-CN")
+    -> {"chunks": 2, "first_audio_ms": 121.4, ...}
+"""
+import io
+import math
+import os
+import queue
+import re
+import struct
+import threading
+import time
+import wave
+
+# Voice per language; Azure neural voices
+VOICES = {
+    "zh-CN": "zh-CN-XiaoxiaoNeural",  # 中文女声 (温柔)
+    "en-US": "en-US-JennyNeural",     # 英文女声 (友好)
+    "en-GB": "en-GB-SoniaNeural",     # 英式英语女声
+}
+DEFAULT_VOICE = "en-US-JennyNeural"
+
+# A sentence ends after CJK end punctuation, or after . ! ? ; followed by a
+# space or the end of the text (not inside "3.5°C"), or at a line break
+_SENTENCE_END_RE = re.compile(r"(?<=[。！？；…])|(?<=[.!?;])(?=\s|$)|\n+")
+_CLAUSE_END_RE = re.compile(r"(?<=[，、,：:])")
+
+
+def split_sentences(text, max_chars=120):
+    """
+    Sentences of `text` with their punctuation, in order. Sentences longer
+    than max_chars are split further at commas.
+    """
+    chunks = []
+    for sentence in _SENTENCE_END_RE.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(sentence) <= max_chars:
+            chunks.append(sentence)
+            continue
+        current = ""
+        for clause in _CLAUSE_END_RE.split(sentence):
+            if current and len(current) + len(clause) > max_chars:
+                chunks.append(current.strip())
+                current = ""
+            current += clause
+        if current.strip():
+            chunks.append(current.strip())
+    return chunks
+
+
+def wav_duration(audio):
+    """
+    Length in seconds of WAV bytes
+    """
+    with wave.open(io.BytesIO(audio), "rb") as w:
+        return w.getnframes() / w.getframerate()
+
+
+class Synthesizer:
+    """
+    Turns one sentence into WAV bytes. Subclasses implement synthesize().
+    """
+
+    def synthesize(self, text, language):
+        raise NotImplementedError
+
+
+class AzureSynthesizer(Synthesizer):
+    """
+    Azure Speech neural voices, synthesized to memory (no audio file)
+    """
+
+    def __init__(self, key, region="eastus2", voices=VOICES):
+        import azure.cognitiveservices.speech as speechsdk
+
+        self._speechsdk = speechsdk
+        self.voices = voices
+        self._config = speechsdk.SpeechConfig(subscription=key, region=region)
+        self._config.set_speech_synthesis_output_format(
+            speechsdk.SpeechSynthesisOutputFormat.Riff16Khz16BitMonoPcm
+        )
+        self._synthesizers = {}
+        self._lock = threading.Lock()
+
+    def _synthesizer(self, voice):
+        # One synthesizer per voice, reused so its connection stays open
+        with self._lock:
+            if voice not in self._synthesizers:
+                self._config.speech_synthesis_voice_name = voice
+                self._synthesizers[voice] = self._speechsdk.SpeechSynthesizer(
+                    speech_config=self._config, audio_config=None
+                )
+            return self._synthesizers[voice]
+
+    def synthesize(self, text, language):
+        result = self._synthesizer(self.voices.get(language, DEFAULT_VOICE)).speak_text_async(text).get()
+        if result.reason != self._speechsdk.ResultReason.SynthesizingAudioCompleted:
+            details = getattr(result, "cancellation_details", None)
+            raise RuntimeError(f"Speech synthesis failed: {getattr(details, 'error_details', result.reason)}")
+        return result.audio_data
+
+
+class StubSynthesizer(Synthesizer):
+    """
+    Offline stand-in: a quiet tone as long as reading the text would take,
+    after a fixed synthesis delay
+    """
+
+    def __init__(self, latency_ms=100.0, chars_per_second=12.0, sample_rate=16000):
+        self.latency_ms = latency_ms
+        self.chars_per_second = chars_per_second
+        self.sample_rate = sample_rate
+
+    def synthesize(self, text, language):
+        time.sleep(self.latency_ms / 1000)
+        frames = int(self.sample_rate * len(text) / self.chars_per_second)
+        samples = (int(2000 * math.sin(2 * math.pi * 440 * i / self.sample_rate)) for i in range(frames))
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(self.sample_rate)
+            w.writeframes(struct.pack(f"<{frames}h", *samples))
+        return buffer.getvalue()
+
+
+class PygamePlayer:
+    """
+    Plays WAV bytes with pygame.mixer, blocking until the chunk finishes
+    """
+
+    def __init__(self):
+        import pygame
+
+        self._pygame = pygame
+        if not pygame.mixer.get_init():
+            pygame.mixer.init()
+
+    def play(self, audio):
+        sound = self._pygame.mixer.Sound(file=io.BytesIO(audio))
+        channel = sound.play()
+        while channel is not None and channel.get_busy():
+            time.sleep(0.01)
+
+
+class NullPlayer:
+    """
+    Plays nothing but takes as long as the audio, for offline runs
+    """
+
+    def play(self, audio):
+        time.sleep(wav_duration(audio))
+
+
+class TTSPipeline:
+    """
+    Speaks text sentence by sentence. While one sentence plays, the next is
+    synthesized, and up to `lookahead` finished sentences wait their turn.
+    """
+
+    def __init__(self, synthesizer, player, lookahead=1, max_chars=120):
+        self.synthesizer = synthesizer
+        self.player = player
+        self.lookahead = lookahead
+        self.max_chars = max_chars
+        self._lock = threading.Lock()
+        self._counters = {"replies": 0, "chunks": 0, "errors": 0, "first_audio_ms": 0.0, "synth_ms": 0.0}
+
+    @staticmethod
+    def _put(out, stop, item):
+        # Blocks while the queue is full, unless speak() has given up
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, chunks, language, out, stop):
+        try:
+            for chunk in chunks:
+                start = time.perf_counter()
+                audio = self.synthesizer.synthesize(chunk, language)
+                if not self._put(out, stop, (audio, (time.perf_counter() - start) * 1000)):
+                    return
+            self._put(out, stop, None)
+        except Exception as e:
+            self._put(out, stop, e)
+
+    def speak(self, text, language):
+        """
+        Synthesize and play `text`; returns timings of this reply. Raises
+        the synthesizer's or player's exception, after stopping the worker.
+        """
+        chunks = split_sentences(text, self.max_chars)
+        start = time.perf_counter()
+        timings = {"chunks": len(chunks), "first_audio_ms": None, "synth_ms": 0.0, "total_ms": 0.0}
+        out, stop = queue.Queue(maxsize=self.lookahead), threading.Event()
+        worker = threading.Thread(target=self._produce, args=(chunks, language, out, stop), daemon=True)
+        worker.start()
+        try:
+            while True:
+                item = out.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                audio, synth_ms = item
+                timings["synth_ms"] += synth_ms
+                if timings["first_audio_ms"] is None:
+                    timings["first_audio_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                self.player.play(audio)
+        except Exception:
+            self._count(errors=1)
+            raise
+        finally:
+            stop.set()
+            worker.join()
+        timings["synth_ms"] = round(timings["synth_ms"], 1)
+        timings["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        self._count(replies=1, chunks=len(chunks), first_audio_ms=timings["first_audio_ms"] or 0.0,
+                    synth_ms=timings["synth_ms"])
+        return timings
+
+    def _count(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                self._counters[name] += amount
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        replies = counters["replies"]
+        counters["avg_first_audio_ms"] = round(counters.pop("first_audio_ms") / replies, 1) if replies else 0.0
+        counters["synth_ms"] = round(counters["synth_ms"], 1)
+        return {"lookahead": self.lookahead, **counters}
+
+
+def create_tts_pipeline_from_env():
+    """
+    TTSPipeline from TTS_SYNTHESIZER (azure or stub), TTS_PLAYER (pygame or
+    null) and TTS_LOOKAHEAD, or None when Azure is chosen without
+    AZURE_SPEECH_KEY
+    """
+    if os.getenv("TTS_SYNTHESIZER", "azure").lower() == "stub":
+        synthesizer = StubSynthesizer()
+    else:
+        speech_key = os.getenv("AZURE_SPEECH_KEY")
+        if not speech_key:
+            return None
+        synthesizer = AzureSynthesizer(speech_key, os.getenv("AZURE_SPEECH_REGION", "eastus2"))
+    player = NullPlayer() if os.getenv("TTS_PLAYER", "pygame").lower() == "null" else PygamePlayer()
+    return TTSPipeline(synthesizer, player, lookahead=int(os.getenv("TTS_LOOKAHEAD", "1")))
@@ -0,0 +1,375 @@
+"""
+Open-Meteo client behind get_weather.
+
+- one pooled requests.Session, so repeat lookups reuse the TCP/TLS connection
+- only the `current` variables the weather report uses are requested (the
+  hourly series was a week of data per variable that was thrown away)
+- connect/read timeouts, and retries with backoff on connection errors,
+  429 and 5xx
+- a TTL cache keyed on coordinates rounded to `precision` decimals (2 is
+  about 1 km): weather does not change per second, and the model rarely
+  produces the same coordinates to the last digit twice
+- concurrent lookups of the same rounded location make one request
+- current_many() fetches several locations ("Beijing, Shanghai and Tokyo")
+  in one request with comma-separated coordinates
+- stale-while-revalidate: the last good result of a location is kept for
+  `stale_ttl` seconds and served when the API fails after retries
+- lookups are counted per location with exponential decay, and
+  WeatherRefresher re-fetches the hottest ones shortly before their cache
+  entry expires, so popular cities never wait on the API
+
+    client = WeatherClient()
+    client.current(39.9042, 116.4074)
+    -> {"temperature": 3.2, "wind_speed": 11.5, "humidity": 41, "weather_code": 1}
+"""
+import heapq
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from response_cache import LRUCache
+from singleflight import SingleFlight
+
+OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
+
+# Open-Meteo variable -> field of the report
+CURRENT_FIELDS = {
+    "temperature_2m": "temperature",
+    "wind_speed_10m": "wind_speed",
+    "relative_humidity_2m": "humidity",
+    "weather_code": "weather_code",
+}
+# Locations per request; Open-Meteo takes comma-separated coordinate lists
+MAX_BATCH = 100
+# What the report shows when the API leaves a field out
+FIELD_DEFAULTS = {"humidity": "N/A", "weather_code": 0}
+
+
+class WeatherClient:
+    def __init__(self, base_url=OPEN_METEO_URL, timeout=(3.05, 10.0), retries=2, backoff=0.3, cache_ttl=600.0,
+                 precision=2, max_entries=1024, pool_size=16, stale_ttl=3600.0, half_life=1800.0):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.precision = precision
+        self.cache_ttl = cache_ttl
+        self.max_entries = max_entries
+        self.half_life = half_life
+        self.cache = LRUCache(max_entries=max_entries, ttl=cache_ttl) if cache_ttl > 0 else None
+        # key -> {"weather", "fetched_at"}: fallback when the API is down, and the age of cached entries
+        self.last_good = LRUCache(max_entries=max_entries, ttl=cache_ttl + stale_ttl) if stale_ttl > 0 else None
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._inflight = SingleFlight()
+        self._lock = threading.Lock()
+        self._popularity = {}  # key -> (decayed lookup count, monotonic time of last update)
+        self._prefetched = set()  # keys refreshed ahead of expiry and not read since
+        self._counters = {"lookups": 0, "upstream_requests": 0, "upstream_locations": 0, "upstream_errors": 0,
+                          "upstream_ms": 0.0, "stale_served": 0, "prefetch_hits": 0}
+
+    def location_key(self, latitude, longitude):
+        return round(float(latitude), self.precision), round(float(longitude), self.precision)
+
+    def _count(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                self._counters[name] += amount
+
+    def _score(self, key, now):
+        score, updated_at = self._popularity.get(key, (0.0, now))
+        return score * 0.5 ** ((now - updated_at) / self.half_life)
+
+    def _track(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                self._popularity[key] = (self._score(key, now) + 1, now)
+            if len(self._popularity) > 2 * self.max_entries:
+                keep = heapq.nlargest(self.max_entries, self._popularity, key=lambda k: self._score(k, now))
+                self._popularity = {k: self._popularity[k] for k in keep}
+
+    def hottest(self, n, min_score=0.0):
+        """
+        The n most looked-up location keys, recent lookups weighing most,
+        leaving out those whose decayed lookup count is below min_score
+        """
+        now = time.monotonic()
+        with self._lock:
+            scores = {key: self._score(key, now) for key in self._popularity}
+        return heapq.nlargest(n, [key for key, score in scores.items() if score >= min_score], key=scores.get)
+
+    def age(self, key):
+        """
+        Seconds since the location was last fetched, or None
+        """
+        entry = self.last_good.get(key) if self.last_good is not None else None
+        return time.monotonic() - entry["fetched_at"] if entry is not None else None
+
+    def _store(self, key, weather):
+        if self.cache is not None:
+            self.cache.set(key, weather)
+        if self.last_good is not None:
+            self.last_good.set(key, {"weather": weather, "fetched_at": time.monotonic()})
+
+    def _cached(self, key):
+        weather = self.cache.get(key) if self.cache is not None else None
+        if weather is not None:
+            with self._lock:
+                if key in self._prefetched:
+                    self._prefetched.discard(key)
+                    self._counters["prefetch_hits"] += 1
+        return weather
+
+    def _stale(self, key):
+        entry = self.last_good.get(key) if self.last_good is not None else None
+        return entry["weather"] if entry is not None else None
+
+    def fetch_many(self, locations):
+        """
+        Current weather for several (latitude, longitude) pairs in one API
+        request per MAX_BATCH locations, bypassing the cache. Raises
+        requests.RequestException once retries are used up.
+        """
+        results = []
+        for i in range(0, len(locations), MAX_BATCH):
+            batch = locations[i:i + MAX_BATCH]
+            start = time.perf_counter()
+            try:
+                response = self.session.get(
+                    self.base_url,
+                    params={
+                        "latitude": ",".join(str(latitude) for latitude, _ in batch),
+                        "longitude": ",".join(str(longitude) for _, longitude in batch),
+                        "current": ",".join(CURRENT_FIELDS),
+                    },
+                    timeout=self.timeout,
+                )
+                response.raise_for_status()
+                data = response.json()
+            except requests.RequestException:
+                self._count(upstream_requests=1, upstream_errors=1, upstream_ms=(time.perf_counter() - start) * 1000)
+                raise
+            self._count(upstream_requests=1, upstream_locations=len(batch),
+                        upstream_ms=(time.perf_counter() - start) * 1000)
+            # One location comes back as an object, several as a list
+            for item in data if isinstance(data, list) else [data]:
+                current = item["current"]
+                results.append({field: current.get(variable, FIELD_DEFAULTS.get(field))
+                                for variable, field in CURRENT_FIELDS.items()})
+        return results
+
+    def fetch(self, latitude, longitude):
+        return self.fetch_many([(latitude, longitude)])[0]
+
+    def current(self, latitude, longitude):
+        """
+        Current weather at the rounded coordinates, from the cache when
+        fresh, or the last good result when the API fails
+        """
+        self._count(lookups=1)
+        key = self.location_key(latitude, longitude)
+        self._track([key])
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+
+        def load():
+            try:
+                weather = self.fetch(*key)
+            except requests.RequestException:
+                stale = self._stale(key)
+                if stale is None:
+                    raise
+                self._count(stale_served=1)
+                return stale
+            self._store(key, weather)
+            return weather
+
+        return self._inflight.do(key, load)
+
+    def current_many(self, locations):
+        """
+        current() for a list of (latitude, longitude), in the same order.
+        Whatever is not cached is fetched in a single batched request. If
+        that request fails, the others keep their cached or last good result
+        and the rest get None; the error is raised only when no location has
+        any result at all.
+        """
+        self._count(lookups=len(locations))
+        keys = [self.location_key(latitude, longitude) for latitude, longitude in locations]
+        self._track(keys)
+        found, missing = {}, []
+        for key in dict.fromkeys(keys):
+            cached = self._cached(key)
+            if cached is not None:
+                found[key] = cached
+            else:
+                missing.append(key)
+        if missing:
+            try:
+                fetched = self.fetch_many(missing)
+            except requests.RequestException:
+                fetched = [self._stale(key) for key in missing]
+                served = sum(weather is not None for weather in fetched)
+                if not found and not served:
+                    raise
+                self._count(stale_served=served)
+            else:
+                for key, weather in zip(missing, fetched):
+                    self._store(key, weather)
+            found.update(zip(missing, fetched))
+        return [found[key] for key in keys]
+
+    def refresh(self, keys):
+        """
+        Re-fetch location keys in one batched request and reset their TTL
+        """
+        for key, weather in zip(keys, self.fetch_many(keys)):
+            self._store(key, weather)
+        with self._lock:
+            self._prefetched.update(keys)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        requests_made = counters["upstream_requests"]
+        counters["upstream_avg_ms"] = round(counters.pop("upstream_ms") / requests_made, 1) if requests_made else 0.0
+        return {
+            **counters,
+            "precision": self.precision,
+            "tracked_locations": len(self._popularity),
+            "cache": self.cache.stats() if self.cache is not None else None,
+        }
+
+    def close(self):
+        self.session.close()
+
+
+class WeatherRefresher:
+    """
+    Background refresh-ahead for the client's hottest locations.
+
+    Every `interval` seconds the `top_n` most looked-up locations whose
+    entry expires within `ahead` seconds are re-fetched, all in one batched
+    request. Only locations with a decayed lookup count of at least
+    `min_score` count as hot: with the default 1, a location looked up once
+    is never refreshed, and one looked up twice stays warm for about one
+    half-life of the client's popularity counts. A failed refresh is
+    retried on the next tick; lookups meanwhile are served from the cache
+    and, past expiry, from the last good result.
+    """
+
+    def __init__(self, client, top_n=20, ahead=60.0, interval=10.0, min_score=1.0):
+        self.client = client
+        self.top_n = top_n
+        self.min_score = min_score
+        self.ahead = ahead
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._counters = {"runs": 0, "refreshed": 0, "requests": 0, "errors": 0, "refresh_ms": 0.0}
+
+    def due(self):
+        """
+        Hot location keys whose cache entry expires within `ahead` seconds
+        """
+        due = []
+        for key in self.client.hottest(self.top_n, self.min_score):
+            age = self.client.age(key)
+            if age is not None and age >= self.client.cache_ttl - self.ahead:
+                due.append(key)
+        return due
+
+    def run_once(self):
+        keys = self.due()
+        with self._lock:
+            self._counters["runs"] += 1
+        if not keys:
+            return 0
+        start = time.perf_counter()
+        try:
+            self.client.refresh(keys)
+        except requests.RequestException:
+            refreshed, errors = 0, 1
+        else:
+            refreshed, errors = len(keys), 0
+        with self._lock:
+            self._counters["refreshed"] += refreshed
+            self._counters["errors"] += errors
+            self._counters["requests"] += (len(keys) + MAX_BATCH - 1) // MAX_BATCH
+            self._counters["refresh_ms"] += (time.perf_counter() - start) * 1000
+        return refreshed
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="weather-refresher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        client = self.client.stats()
+        counters["refresh_ms"] = round(counters["refresh_ms"], 1)
+        # Share of refreshed entries that were read before expiring again
+        counters["useful_ratio"] = round(client["prefetch_hits"] / counters["refreshed"], 4) if counters["refreshed"] else 0.0
+        counters["hit_ratio"] = client["cache"]["hit_ratio"] if client["cache"] else 0.0
+        counters["stale_served"] = client["stale_served"]
+        return {"top_n": self.top_n, "ahead": self.ahead, "interval": self.interval, **counters}
+
+
+def create_weather_client_from_env():
+    """
+    WeatherClient from OPEN_METEO_URL, WEATHER_CACHE_TTL (0 disables the
+    cache), WEATHER_STALE_TTL, WEATHER_COORD_PRECISION, WEATHER_TIMEOUT and
+    WEATHER_RETRIES
+    """
+    return WeatherClient(
+        base_url=os.getenv("OPEN_METEO_URL", OPEN_METEO_URL),
+        timeout=(3.05, float(os.getenv("WEATHER_TIMEOUT", "10"))),
+        retries=int(os.getenv("WEATHER_RETRIES", "2")),
+        cache_ttl=float(os.getenv("WEATHER_CACHE_TTL", "600")),
+        precision=int(os.getenv("WEATHER_COORD_PRECISION", "2")),
+        stale_ttl=float(os.getenv("WEATHER_STALE_TTL", "3600")),
+    )
+
+
+def create_weather_refresher_from_env(client):
+    """
+    Started WeatherRefresher from WEATHER_REFRESH_TOP_N (0 disables),
+    WEATHER_REFRESH_AHEAD, WEATHER_REFRESH_INTERVAL and
+    WEATHER_REFRESH_MIN_SCORE, or None
+    """
+    top_n = int(os.getenv("WEATHER_REFRESH_TOP_N", "20"))
+    if top_n <= 0 or client.cache is None:
+        return None
+    return WeatherRefresher(
+        client,
+        top_n=top_n,
+        ahead=float(os.getenv("WEATHER_REFRESH_AHEAD", "60")),
+        interval=float(os.getenv("WEATHER_REFRESH_INTERVAL", "10")),
+        min_score=float(os.getenv("WEATHER_REFRESH_MIN_SCORE", "1")),
+    ).start()